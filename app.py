@@ -1,10 +1,26 @@
 import streamlit as st
 import pandas as pd
-import itertools
-from collections import defaultdict
+import numpy as np
 from datetime import timedelta, date
 import textwrap
 
+from genetics import (
+    GENE_DB, GENE_INDEX, GENE_ORDER, NAME_TO_ID_MAP, OTHER_LABEL, PairingCache,
+    encode_genotype, decode_genotype, code_to_token, token_to_code,
+    get_pairing_result, get_row_geno, generate_mm_links, format_outcome_labels,
+    get_combo_hit_probability, get_visual_probability, get_lethal_probability,
+    validate_genotype,
+)
+from planner import plan_breeding
+from simulation import simulate_clutches
+from projection import SCHEME_BACKCROSS, SCHEME_SIBLING, project_generations
+from batch import PAIRING_COLUMNS, VALUE_COLUMNS, iter_pairing_matrix, load_animals_csv, rank_pairings
+from pricing import DEFAULT_CLUTCH_SIZE, load_price_table
+from holdbacks import compute_holdback_matrix, expand_to_outcomes
+from profiling import NULL_PROFILER, StageProfiler
+from query import get_phenotype_tier_probs, get_query_probability, get_query_tiers, parse_query, query_from_targets
+from inventory import DEFAULT_DB_PATH, FEMALE, MALE, Inventory
+
 # ================= 0. 基础配置 =================
 st.set_page_config(page_title="球蟒繁育系统 Ultimate", layout="wide")
 
@@ -48,239 +64,166 @@ st.markdown(textwrap.dedent("""
 </style>
 """), unsafe_allow_html=True)
 
-# ================= 1. 核心数据库 =================
-GENE_DB = {
-    # --- 1. 显性/不完全显性 ---
-    # [BEL Complex]
-    "Mojave": {"cn": "莫哈维", "type": "显性", "group": "BEL"},
-    "Lesser": {"cn": "白金", "type": "显性", "group": "BEL"},
-    "Butter": {"cn": "黄油", "type": "显性", "group": "BEL"},
-    "Bamboo": {"cn": "竹子", "type": "显性", "group": "BEL"},
-    "Russo": {"cn": "卢瑟", "type": "显性", "group": "BEL"},
-    "Phantom": {"cn": "幻影", "type": "显性", "group": "BEL"},
-    "Mystic": {"cn": "神秘", "type": "显性", "group": "BEL"},
-    "Special": {"cn": "特别", "type": "显性", "group": "BEL"},
-    "Mocha": {"cn": "摩卡", "type": "显性", "group": "BEL"},
-
-    # [ALS Complex]
-    "Black Pastel": {"cn": "黑蜡笔", "type": "显性", "group": "ALS"},
-    "Cinnamon": {"cn": "肉桂", "type": "显性", "group": "ALS"},
-    "Het Red Axanthic": {"cn": "HRA (红缺黄)", "type": "显性", "group": "ALS"},
-
-    # [Yellow Belly Complex]
-    "Yellow Belly": {"cn": "黄腹", "type": "显性", "group": "YB"},
-    "Asphalt": {"cn": "沥青", "type": "显性", "group": "YB"},
-    "Gravel": {"cn": "碎石", "type": "显性", "group": "YB"},
-    "Spark": {"cn": "火花", "type": "显性", "group": "YB"},
-    "Specter": {"cn": "幽灵(Specter)", "type": "显性", "group": "YB"},
-
-    # [Spider Complex]
-    "Spider": {"cn": "蜘蛛", "type": "显性", "group": "Spider"},
-    "Spotnose": {"cn": "斑鼻", "type": "显性", "group": "Spider"},
-    "Woma": {"cn": "沃玛", "type": "显性", "group": "Spider"},
-    "Hidden Gene Woma": {"cn": "HGW (隐沃玛)", "type": "显性", "group": "Spider"},
-    "Champagne": {"cn": "香槟", "type": "显性", "group": "Spider"},
-
-    # [Acid Complex]
-    "Acid": {"cn": "酸 (Acid)", "type": "显性", "group": "Acid"},
-    "Confusion": {"cn": "困惑 (Confusion)", "type": "显性", "group": "Acid"},
-
-    # [High-End / Hype]
-    "Stranger": {"cn": "陌客 (Stranger)", "type": "显性"},
-    "Mahogany": {"cn": "红木", "type": "显性"},
-    "Red Stripe": {"cn": "红条", "type": "显性"},
-    "Bongo": {"cn": "邦戈 (Bongo)", "type": "显性"},
-    "Cypress": {"cn": "柏树", "type": "显性"},
-    "Leopard": {"cn": "豹纹", "type": "显性"},
-    "Blackhead": {"cn": "黑头", "type": "显性"},
-    "Enchi": {"cn": "安奇", "type": "显性"},
-    "Orange Dream": {"cn": "橙梦 (OD)", "type": "显性"},
-    "Fire": {"cn": "火", "type": "显性"},
-    "Vanilla": {"cn": "香草", "type": "显性"},
-    "Disco": {"cn": "迪斯科", "type": "显性"},
-    "Thunder": {"cn": "雷电", "type": "显性"},
-    "Banana": {"cn": "香蕉", "type": "显性"},
-    "Pastel": {"cn": "蜡笔", "type": "显性"},
-    "Pinstripe": {"cn": "细纹", "type": "显性"},
-    "GHI": {"cn": "GHI", "type": "显性"},
-    "Blade": {"cn": "刀锋", "type": "显性"},
-
-    # --- 2. 隐性 ---
-    "Clown": {"cn": "小丑", "type": "隐性"},
-    "Pied": {"cn": "派 (Piebald)", "type": "隐性"},
-    "Desert Ghost": {"cn": "沙幽 (DG)", "type": "隐性"},
-    "Sunset": {"cn": "日落 (Sunset)", "type": "隐性"},
-    "Monsoon": {"cn": "季风 (Monsoon)", "type": "隐性"},
-    "Puzzle": {"cn": "拼图 (Puzzle)", "type": "隐性"},
-    "Tri-Stripe": {"cn": "三条纹", "type": "隐性"},
-    "Ultramel": {"cn": "超焦 (Ultramel)", "type": "隐性"},
-    "Lavender Albino": {"cn": "薰衣草白化", "type": "隐性"},
-    "Albino": {"cn": "白化", "type": "隐性"},
-    "Axanthic (VPI)": {"cn": "缺黄 (VPI)", "type": "隐性"},
-    "Axanthic (TSK)": {"cn": "缺黄 (TSK)", "type": "隐性"},
-    "Ghost": {"cn": "幽灵/衰退 (Hypo)", "type": "隐性"},
-    "Genetic Stripe": {"cn": "遗传直线", "type": "隐性"},
-    "Toy": {"cn": "玩具 (Toy)", "type": "隐性"},
-}
-
-# 映射表
-NAME_TO_ID_MAP = {}
-for k, v in GENE_DB.items():
-    display_name = f"{k} ({v['cn']})"
-    NAME_TO_ID_MAP[display_name] = k
-
-RISK_DB = {
-    "Black Pastel": {2: "风险提示: Super Black Pastel 极易出现脊柱弯曲 (Kinking) 和鸭嘴畸形。"},
-    "Cinnamon": {2: "风险提示: Super Cinnamon 极易出现脊柱弯曲 (Kinking) 和鸭嘴畸形。"},
-    "Spider": {1: "注意: 蜘蛛基因携带神经系统问题 (Wobble)。", 2: "致死风险: Super Spider 为致死基因。"},
-    "Woma": {1: "注意: 沃玛基因可能携带神经问题 (Wobble)。", 2: "致死风险: Super Woma 通常无法存活。"},
-    "Hidden Gene Woma": {1: "注意: HGW 基因可能携带神经问题。", 2: "致死风险: Super HGW 为致死基因。"},
-    "Champagne": {2: "致死风险: Super Champagne 为致死基因。"},
-    "Spotnose": {2: "风险: Super Spotnose (Powerball) 可能伴随严重神经问题。"},
-    "GHI": {2: "风险: Super GHI 生长缓慢且可能存在致死风险。"},
-}
-
+# ================= 1. 基因型选项 =================
 OPT_WILD = "无"
 OPT_HET = "单显/杂合 (Het)"
 OPT_SUPER = "超级/纯合 (Super/Visual)"
 STATUS_MAP = {OPT_WILD: 0, OPT_HET: 1, OPT_SUPER: 2}
-
-# ================= 2. 核心算法 =================
-
-def check_genetic_risks(df, active_gene_ids):
-    warnings = set()
-    for idx, row in df.iterrows():
-        if row['概率'] <= 0: continue
-        geno_dict = dict(row['_geno_dict'])
-        for gid in active_gene_ids:
-            score = geno_dict.get(gid, 0)
-            if gid in RISK_DB and score in RISK_DB[gid]:
-                warnings.add(RISK_DB[gid][score])
-    return list(warnings)
-
-def apply_combo_rules(active_genes_dict):
-    bel_count = 0
-    for gid, score in active_genes_dict.items():
-        if score > 0 and GENE_DB.get(gid, {}).get("group") == "BEL":
-            bel_count += score
-    if bel_count >= 2: return "BEL (蓝眼白路复合组)"
-    
-    yb_count = 0
-    for gid, score in active_genes_dict.items():
-        if score > 0 and GENE_DB.get(gid, {}).get("group") == "YB":
-            yb_count += score
-    if yb_count >= 2: return "Ivory/Highway (黄腹复合组超级体)"
-    
-    als_count = 0
-    for gid, score in active_genes_dict.items():
-        if score > 0 and GENE_DB.get(gid, {}).get("group") == "ALS":
-            als_count += score
-    if als_count >= 2: return "8-Ball Complex (ALS超级体 - 高风险)"
-    return None
-
-# --- 核心修改：生成更智能的 MorphMarket 链接 ---
-def generate_mm_link(active_genes_dict):
-    search_terms = []
-    for gid, score in active_genes_dict.items():
-        if score == 0: continue
-        
-        # 获取基因类型 (显性/隐性)
-        gene_info = GENE_DB.get(gid, {})
-        g_type = gene_info.get("type", "显性")
-        
-        term = gid
-        # 显性处理
-        if "显性" in g_type:
-            if score == 2:
-                # 显性纯合 -> Super Gene
-                term = f"Super {gid}"
-            else:
-                # 显性杂合 -> Gene
-                term = gid
-        # 隐性处理
-        elif "隐性" in g_type:
-            if score == 1:
-                # 隐性杂合 -> Het Gene
-                term = f"Het {gid}"
-            else:
-                # 隐性纯合 -> Gene (Visual)
-                term = gid
-        
-        search_terms.append(term)
-
-    if not search_terms:
-        # 原色
-        return "https://www.morphmarket.com/us/c/reptiles/pythons/ball-pythons?trait_form=Normal"
-    
-    # 使用 'q' 参数进行关键词搜索，比 'genes' 参数更智能，能识别 "Super", "Het" 等修饰词
-    query_str = "+".join(search_terms)
-    return f"https://www.morphmarket.com/us/c/reptiles/pythons/ball-pythons?q={query_str}"
-
-def get_gametes(genotype_dict):
-    gene_options = []
-    gene_ids = sorted(genotype_dict.keys())
-    for gene in gene_ids:
-        score = genotype_dict[gene]
-        if score == 2: options = [1]
-        elif score == 1: options = [0, 1]
-        else: options = [0]
-        gene_options.append([(gene, val) for val in options])
-    return list(itertools.product(*gene_options))
-
-def calculate_offspring(parent_a_geno, parent_b_geno):
-    gametes_a = get_gametes(parent_a_geno)
-    gametes_b = get_gametes(parent_b_geno)
-    total = len(gametes_a) * len(gametes_b)
-    outcome_counts = defaultdict(int)
-    for g_a in gametes_a:
-        for g_b in gametes_b:
-            child_temp = defaultdict(int)
-            for gene, val in g_a: child_temp[gene] += val
-            for gene, val in g_b: child_temp[gene] += val
-            outcome_counts[tuple(sorted(child_temp.items()))] += 1
-    results = []
-    for genotype_tuple, count in outcome_counts.items():
-        row = dict(genotype_tuple)
-        row['概率'] = (count / total) * 100
-        row['_geno_dict'] = genotype_tuple
-        
-        # 基因计数
-        gene_count = sum(1 for gene, val in genotype_tuple if val > 0)
-        row['_gene_count'] = gene_count
-        
-        results.append(row)
-    return pd.DataFrame(results).sort_values(['概率', '_gene_count'], ascending=[False, False]).reset_index(drop=True)
-
-def format_label_with_combo(row, active_gene_ids, simplified=False):
-    geno_dict = dict(row['_geno_dict'])
-    combo_name = apply_combo_rules(geno_dict)
-    
-    if simplified:
-        if combo_name: return f"{combo_name} (All Variants)"
-    
-    parts = []
-    for gene_id in active_gene_ids:
-        val = geno_dict.get(gene_id, 0)
-        if val == 0: continue
-        
-        gene_info = GENE_DB.get(gene_id, {"type": "隐性"})
-        prefix = ""
-        suffix = ""
-        
-        if "隐性" in gene_info["type"]:
-            if val == 2: suffix = "(Visual)" 
-            else: suffix = "(Het)"
-        else: # 显性
-            if val == 2: prefix = "[Super]"
-            
-        label = f"{prefix} {gene_id} {suffix}"
-        parts.append(label.strip())
-        
-    base_label = " + ".join(parts) if parts else "Wild Type (原色)"
-    
-    if combo_name: 
-        return f"{combo_name} >>> {base_label}"
-    return base_label
+SCORE_TO_OPTION = {v: k for k, v in STATUS_MAP.items()}
+EDITOR_URL_PARAMS = {"公蛇": "m", "母蛇 A": "a", "母蛇 B": "b", "母蛇 C": "c"}  # 编辑表列 -> URL 参数
+
+# ================= 2. 页面辅助 =================
+
+SIM_CLUTCHES = 20000  # 整窝模拟的抽样窝数
+RESULT_PAGE_ROWS = 100  # 结果表每页行数: 只有当前页会被构建并发送到浏览器
+INVENTORY_ROWS = 200  # 库存筛选结果最多列出的条数
+HOLDBACK_MATRIX_ROWS = 200  # 留种矩阵最多列出的留种状态数
+SEX_LABELS = {MALE: "公", FEMALE: "母"}
+
+@st.cache_resource
+def get_pairing_cache():
+    # 所有会话共享同一个缓存实例
+    return PairingCache()
+
+@st.cache_resource
+def get_inventory():
+    return Inventory(DEFAULT_DB_PATH)
+
+def format_genes(genotype):
+    return " ".join(f"{gid}{'' if s == 1 else '×2'}" for gid, s in genotype.items()) or "原色"
+
+def format_animal(animal):
+    return f"{animal.id} ({SEX_LABELS[animal.sex]}) {format_genes(animal.genotype)}"
+
+def build_display_frame(result, rows, include_other=False, probs=None):
+    # 展示用 DataFrame: 仅包含实际渲染的行 (标签取自缓存, 链接只为这些行生成); include_other 时追加「其他」汇总行
+    # probs: 按行覆盖显示的概率 (表现型分层时一行只计本层的部分), 默认为结果表概率
+    rows = np.asarray(rows, dtype=np.intp)
+    df = pd.DataFrame({
+        '表现型': result.labels[rows],
+        '概率': (result.table.prob if probs is None else probs)[rows] * 100,
+        '链接': generate_mm_links(result.table, rows),
+    })
+    if include_other and result.other_prob > 0:
+        other_row = pd.DataFrame({'表现型': [OTHER_LABEL], '概率': [result.other_prob * 100], '链接': [None]})
+        df = pd.concat([df, other_row], ignore_index=True)
+    return df
+
+def read_url_state():
+    # 分享链接: ?genes=<基因序号>.<基因序号>&m=<公蛇>&a=&b=&c= , 均为 base-36 紧凑编码; 参数无效时忽略
+    params = st.query_params
+    try:
+        indices = [token_to_code(t) for t in params.get("genes", "").split(".") if t]
+        # 负数序号 ("-1") 也能被 int(..., 36) 解析, 作为列表下标会从末尾取基因, 需显式检查范围
+        if not all(0 <= i < len(GENE_ORDER) for i in indices):
+            raise ValueError("基因序号超出范围")
+        gene_ids = [GENE_ORDER[i] for i in indices]
+        genotypes = {col: decode_genotype(token_to_code(params[p])) for col, p in EDITOR_URL_PARAMS.items() if p in params}
+    except ValueError:
+        return [], {}
+    return gene_ids, genotypes
+
+def write_url_state(gene_ids, genotypes):
+    st.query_params["genes"] = ".".join(code_to_token(GENE_INDEX[gid]) for gid in gene_ids)
+    for col, p in EDITOR_URL_PARAMS.items():
+        st.query_params[p] = code_to_token(encode_genotype(genotypes[col]))
+
+def render_risk_alerts(risks, loci):
+    # 每条风险附出现概率; 有致死风险时再给出整窝的致死比例 (各位点合计)
+    for r in risks:
+        st.markdown(f"<div class='risk-alert'>{r.message} (约 {r.probability * 100:.1f}% 的后代)</div>", unsafe_allow_html=True)
+    if any(r.lethal for r in risks):
+        st.markdown(f"<div class='risk-alert'>合计致死比例: {get_lethal_probability(loci) * 100:.1f}%</div>", unsafe_allow_html=True)
+
+def get_profiler():
+    # 性能调试: 仅在 URL 带 ?debug=1 且侧边栏开启后记录, 否则为空操作
+    return st.session_state.get("profiler", NULL_PROFILER)
+
+def sync_profiler(enabled, track_memory):
+    profiler = st.session_state.get("profiler")
+    if profiler is not None and (not enabled or profiler.track_memory != track_memory):
+        profiler.close()
+        del st.session_state["profiler"]
+    if enabled and "profiler" not in st.session_state:
+        # 切换内存统计时沿用已有记录
+        new_profiler = StageProfiler(track_memory)
+        if profiler is not None:
+            new_profiler.records.extend(profiler.records)
+            new_profiler.run = profiler.run
+        st.session_state["profiler"] = new_profiler
+
+def render_inventory_panel(inventory):
+    # 库存: CSV 导入, 按条件筛选, 把选中的个体载入繁殖组 (覆盖对应列并补齐基因池)
+    with st.expander(f"🗃 动物库存 ({inventory.count()} 条)", expanded=False):
+        uploaded = st.file_uploader("导入动物表 CSV (列: id, sex, 基因英文名..., 可选 sire, dam, clutch; 按 id 覆盖)",
+                                    type=["csv"], key="inventory_upload")
+        if uploaded is not None and st.button("导入", key="inventory_import"):
+            try:
+                st.success(f"已导入 {inventory.import_csv(uploaded)} 条")
+            except ValueError as e:
+                st.error(str(e))
+        f1, f2 = st.columns([3, 1])
+        query_text = f1.text_input("筛选条件:", key="inventory_query", placeholder="例: Clown=1 AND Stranger (留空为全部)")
+        sex = f2.radio("性别:", [None, MALE, FEMALE], format_func=lambda s: SEX_LABELS.get(s, "全部"), horizontal=True, key="inventory_sex")
+        try:
+            animals = inventory.find(query_text.strip() or None, sex, limit=INVENTORY_ROWS)
+        except ValueError as e:
+            st.error(f"条件无法解析: {e}")
+            return
+        st.dataframe(
+            pd.DataFrame([{"id": a.id, "性别": SEX_LABELS[a.sex], "基因": format_genes(a.genotype),
+                           "父": a.sire, "母": a.dam, "窝": a.clutch} for a in animals]),
+            width="stretch", hide_index=True, height=220,
+        )
+        if len(animals) == INVENTORY_ROWS: st.caption(f"仅列出前 {INVENTORY_ROWS} 条, 请收窄条件。")
+
+        by_sex = {s: [None] + [a.id for a in animals if a.sex == s] for s in (MALE, FEMALE)}
+        cols = st.columns(len(EDITOR_URL_PARAMS))
+        chosen = {col: c.selectbox(col, by_sex[MALE if col == "公蛇" else FEMALE], format_func=lambda i: i or "—", key=f"inventory_slot_{p}")
+                  for c, (col, p) in zip(cols, EDITOR_URL_PARAMS.items())}
+        if st.button("载入繁殖组", key="inventory_load", disabled=not any(chosen.values())):
+            loaded = {col: inventory.get(i) for col, i in chosen.items() if i}
+            st.session_state["genotypes"].update({col: a.genotype for col, a in loaded.items()})
+            st.session_state["group_animals"] = {**st.session_state.get("group_animals", {}), **loaded}
+            gene_ids = st.session_state["selected_gene_ids"]
+            st.session_state["default_gene_ids"] = gene_ids + sorted({g for a in loaded.values() for g in a.genotype} - set(gene_ids), key=GENE_INDEX.get)
+            st.rerun()
+
+def render_result_frame(result, rows, scope, page_key, include_other=False, probs=None, **dataframe_kwargs):
+    # 服务端分页: 每次只构建并发送一页, 「其他」汇总行放在末页; 构建展示表与发送到浏览器 (序列化) 分别计时
+    n_pages = max(1, -(-len(rows) // RESULT_PAGE_ROWS))
+    page = 1
+    if n_pages > 1:
+        key = f"page_{page_key}"
+        if st.session_state.get(key, 1) > n_pages: st.session_state[key] = n_pages  # 结果变少时停在末页
+        p1, p2 = st.columns([1, 4], vertical_alignment="center")
+        page = p1.number_input("页码", min_value=1, max_value=n_pages, step=1, key=key, label_visibility="collapsed")
+        p2.caption(f"第 {page} / {n_pages} 页 · 共 {len(rows)} 种结果, 每页 {RESULT_PAGE_ROWS} 种")
+    page_rows = rows[(page - 1) * RESULT_PAGE_ROWS:page * RESULT_PAGE_ROWS]
+    profiler = get_profiler()
+    with profiler.stage("build_frame", scope):
+        df = build_display_frame(result, page_rows, include_other and page == n_pages, probs)
+    with profiler.stage("render_dataframe", scope):
+        st.dataframe(df, **dataframe_kwargs)
+
+def render_debug_panel(profiler):
+    with st.expander("🛠 性能调试面板", expanded=True):
+        st.caption(f"已记录 {profiler.run} 次整页重跑 / {len(profiler.records)} 条阶段记录 (毫秒)。"
+                   "fragment 内的交互只追加记录, 整页重跑后此处刷新。")
+        view = st.radio("统计范围:", ["本次重跑", "全部重跑"], horizontal=True, key="debug_view")
+        summary = profiler.summary(last_run_only=view == "本次重跑")
+        if summary.empty:
+            st.info("暂无记录")
+            return
+        st.dataframe(summary, column_config={c: st.column_config.NumberColumn(format="%.2f") for c in summary.columns[3:]},
+                     width="stretch", hide_index=True)
+        records = profiler.to_frame()
+        d1, d2, d3 = st.columns(3)
+        d1.download_button("导出 JSON", records.to_json(orient="records", force_ascii=False), "stage_profile.json", "application/json")
+        d2.download_button("导出 CSV", records.to_csv(index=False), "stage_profile.csv", "text/csv")
+        if d3.button("清空记录", key="debug_clear"):
+            profiler.clear()
+            st.rerun()
 
 # ================= 3. 界面布局 =================
 
@@ -328,14 +271,27 @@ with st.sidebar:
 <div class="copyright">© 2025 Project Ball_Python_Calc. All Rights Reserved.</div>
 """, unsafe_allow_html=True)
 
+    if st.query_params.get("debug") == "1":
+        st.markdown("---")
+        profile_on = st.toggle("🛠 性能调试 (按阶段计时)", key="debug_profile")
+        track_memory = st.checkbox("统计内存分配 (tracemalloc, 较慢)", key="debug_memory", disabled=not profile_on)
+        sync_profiler(profile_on, track_memory)
+    else:
+        sync_profiler(False, False)
+
+get_profiler().start_run()
+
 
 # --- 1. 繁殖组设定 ---
 st.markdown("#### 1. 繁殖组设定")
 
+# 首次打开时从分享链接恢复基因池与基因型; 之后 genotypes 记录最近一次的填写, 基因池变化时保留已填的值
+if "genotypes" not in st.session_state:
+    url_gene_ids, st.session_state["genotypes"] = read_url_state()
+    st.session_state["default_gene_ids"] = url_gene_ids or [k for k in ["Stranger", "Clown"] if k in GENE_DB]
+
 all_display_names = list(NAME_TO_ID_MAP.keys())
-default_names = []
-for k in ["Stranger", "Clown"]:
-    if k in GENE_DB: default_names.append(f"{k} ({GENE_DB[k]['cn']})")
+default_names = [f"{k} ({GENE_DB[k]['cn']})" for k in st.session_state["default_gene_ids"]]
 
 selected_display_names = st.multiselect(
     "添加基因池:", 
@@ -343,212 +299,490 @@ selected_display_names = st.multiselect(
     default=default_names, 
     label_visibility="collapsed"
 )
-if not selected_display_names: st.stop()
-
 selected_gene_ids = [NAME_TO_ID_MAP[name] for name in selected_display_names]
+st.session_state["selected_gene_ids"] = selected_gene_ids
+render_inventory_panel(get_inventory())
+if not selected_display_names: st.stop()
 
+known_genotypes = st.session_state["genotypes"]
 table_data = []
 for gid in selected_gene_ids:
     group_tag = f" [{GENE_DB[gid]['group']}]" if 'group' in GENE_DB[gid] else ""
-    table_data.append({"Gene": gid, "中文名": GENE_DB[gid]["cn"] + group_tag, "公蛇": OPT_WILD, "母蛇 A": OPT_WILD, "母蛇 B": OPT_WILD, "母蛇 C": OPT_WILD})
+    row = {"Gene": gid, "中文名": GENE_DB[gid]["cn"] + group_tag}
+    row.update({col: SCORE_TO_OPTION[known_genotypes.get(col, {}).get(gid, 0)] for col in EDITOR_URL_PARAMS})
+    table_data.append(row)
 
 df_input_source = pd.DataFrame(table_data).set_index("Gene")
 col_conf = st.column_config.SelectboxColumn(options=[OPT_WILD, OPT_HET, OPT_SUPER], width="small", required=True)
 
-edited_df = st.data_editor(df_input_source, column_config={"中文名": st.column_config.TextColumn(disabled=True), "公蛇": col_conf, "母蛇 A": col_conf, "母蛇 B": col_conf, "母蛇 C": col_conf}, use_container_width=True)
+edited_df = st.data_editor(df_input_source, column_config={"中文名": st.column_config.TextColumn(disabled=True), "公蛇": col_conf, "母蛇 A": col_conf, "母蛇 B": col_conf, "母蛇 C": col_conf}, width="stretch")
 
 male_geno = {gid: STATUS_MAP[edited_df.loc[gid, "公蛇"]] for gid in selected_gene_ids}
 females_geno = {k: {gid: STATUS_MAP[edited_df.loc[gid, f"母蛇 {k}"]] for gid in selected_gene_ids} for k in ["A", "B", "C"]}
 
+st.session_state["genotypes"] = {"公蛇": male_geno, **{f"母蛇 {k}": g for k, g in females_geno.items()}}
+write_url_state(selected_gene_ids, st.session_state["genotypes"])
+# 从库存载入的个体: 该列被改动后不再视为同一条蛇 (系谱随之失效)
+group_animals = {col: animal for col, animal in st.session_state.get("group_animals", {}).items()
+                 if animal.genotype == {gid: s for gid, s in st.session_state["genotypes"][col].items() if s}}
+st.session_state["group_animals"] = group_animals
+
+# 复合组基因为同一位点的等位基因, 每条蛇在该位点最多两个
+genotype_errors = [f"{name}: {err}" for name, geno in [("公蛇", male_geno)] + [(f"母蛇 {k}", g) for k, g in females_geno.items()]
+                   for err in validate_genotype(geno)]
+if genotype_errors:
+    for err in genotype_errors: st.error(err)
+    st.stop()
+
 # --- 2. 核心分析区 ---
 st.divider()
 st.markdown("#### 2. 遗传计算结果")
 
 female_names = {"A": "母蛇 A", "B": "母蛇 B", "C": "母蛇 C"}
-tabs = st.tabs([f"{female_names['A']}", f"{female_names['B']}", f"{female_names['C']}"])
-f1_dfs = {}
 
-for i, key in enumerate(["A", "B", "C"]):
-    with tabs[i]:
-        # 1. 计算
-        df = calculate_offspring(male_geno, females_geno[key])
-        f1_dfs[key] = df 
+# 页面按阶段拆分为 fragment: 组件交互只重跑所在的 fragment,
+# 基因型编辑触发整页重跑时, 未变化的配对各阶段直接命中缓存。
+@st.fragment
+def render_f1_tab(key, male_geno, female_geno, selected_gene_ids, phenotype_mode=False):
+    profiler = get_profiler()
+    # 1. 计算
+    with profiler.stage("pairing_result", scope=key):
+        result = get_pairing_result(get_pairing_cache(), male_geno, female_geno, selected_gene_ids, profiler,
+                                    phenotype=phenotype_mode)
+    loci, table, other_prob = result.loci, result.table, result.other_prob
+    
+    # 2. 风控
+    render_risk_alerts(result.risks, loci)
+        
+    if len(table.prob):
+        # ================= 统计区域 =================
+        c_stat_title, c_stat_sel = st.columns([0.5, 0.5])
+        with c_stat_title:
+            st.markdown("##### 核心概率统计")
+        with c_stat_sel:
+            target_combo = st.multiselect(
+                "设定目标组合 (支持多选):", 
+                options=selected_gene_ids,
+                default=[], 
+                key=f"kpi_combo_{key}",
+                placeholder="例如: Stranger + Clown (用于智能分层筛选)"
+            )
+            target_query = st.text_input(
+                "高级条件 (可选, 填写后代替上方多选):",
+                key=f"kpi_query_{key}",
+                placeholder="例如: Clown:visual AND (Pied OR any(2, Pastel, Enchi, Mojave)) AND NOT Spider",
+                help="支持 AND / OR / NOT、Pastel=2 (超级)、Clown:het / Clown:visual、any(N, ...)、combo(BEL)。",
+            )
+
+        # 目标条件编译为查询树: KPI 直接由各位点分布求概率, 分层在结果表上一次向量化求出
+        query_node, query_text = None, None
+        if target_query.strip():
+            try:
+                query_node, query_text = parse_query(target_query), target_query.strip()
+            except ValueError as e:
+                st.error(f"条件无法解析: {e}")
+        elif target_combo:
+            query_node, query_text = query_from_targets(target_combo), " + ".join(target_combo)
+
+        kpi_c1, kpi_c2, kpi_c3 = st.columns(3)
+        
+        help_hit = "指完美遗传了您选定的所有目标基因，且均为成体/超级体表现 (Visual/Super)。"
+        help_proj = "指携带了您选定的目标基因 (可能含 Het)，适合留种作为下一代繁育种源。"
+        help_jackpot = "指这一窝中所有能直观看出基因变异个体 (显性超级体 + 隐性成体) 的总概率。"
+        
+        with profiler.stage("kpi", scope=key):
+            prob_jackpot = get_visual_probability(loci) * 100
+            if query_node is not None:
+                prob_hit = get_query_probability(query_node, loci, "strict") * 100
+                prob_proj = get_query_probability(query_node, loci, "loose") * 100
+        
+        if query_node is None:
+            # 默认显示
+            kpi_c1.metric("任意极品/超级体", f"{prob_jackpot:.1f}%", help=help_hit)
+            kpi_c2.metric("请选择目标组合 ↗", "--", help="在右上方选择目标基因组合后，此处将显示该组合的特定概率。")
+        else:
+            # 组合计算
+            combo_name = query_text
+            if len(combo_name) > 15: combo_name = "目标组合" 
+
+            kpi_c1.metric(f"完美成体 ({combo_name})", f"{prob_hit:.1f}%", help=help_hit)
+            kpi_c2.metric(f"项目个体 (含 Het)", f"{prob_proj:.1f}%", help=help_proj)
+
+        kpi_c3.metric("超级/成体综合概率 (Total Super/Visual)", f"{prob_jackpot:.1f}%", help=help_jackpot)
         
-        # 2. 风控
-        risks = check_genetic_risks(df, selected_gene_ids)
-        if risks:
-            for r in risks: st.markdown(f"<div class='risk-alert'>{r}</div>", unsafe_allow_html=True)
-            
-        if not df.empty:
-            # 3. 基础列生成
-            df['链接'] = df.apply(lambda row: generate_mm_link(dict(row['_geno_dict'])), axis=1)
-            df['表现型_Full'] = df.apply(lambda row: format_label_with_combo(row, selected_gene_ids, simplified=False), axis=1)
-            df['表现型_Group'] = df.apply(lambda row: format_label_with_combo(row, selected_gene_ids, simplified=True), axis=1)
-            
-            # ================= 统计区域 =================
-            c_stat_title, c_stat_sel = st.columns([0.5, 0.5])
-            with c_stat_title:
-                st.markdown("##### 核心概率统计")
-            with c_stat_sel:
-                target_combo = st.multiselect(
-                    "设定目标组合 (支持多选):", 
-                    options=selected_gene_ids,
-                    default=[], 
-                    key=f"kpi_combo_{key}",
-                    placeholder="例如: Stranger + Clown (用于智能分层筛选)"
+        st.markdown("---")
+        
+        if phenotype_mode:
+            st.caption(f"表现型模式: 共 {len(table.prob)} 种肉眼可见的表现型 (隐性 Het 并入野生型)。"
+                       "同一表现型可能同时出现在多个分组中, 各组只计其中属于该组的概率。")
+        if other_prob > 0:
+            st.caption(f"结果组合过多: 仅列出概率最高的 {len(table.prob)} 种, 其余 {other_prob * 100:.2f}% 归入「其他」。统计卡片为全量精确值。")
+        
+        # ================= 列表展示 (智能分层 Smart Tiering) =================
+        
+        common_config = {
+            "概率": st.column_config.NumberColumn(format="%.1f%%", width="small"),
+            "表现型": st.column_config.Column("基因表现型 (Visual/Super 为成体/超级体)", width="large"),
+            "链接": st.column_config.LinkColumn("图鉴", display_text="MorphMarket", width="small"),
+        }
+        
+        def render_tier(tier, title, rows, expanded, probs=None):
+            # 分组懒加载: 折叠的分组不构建也不发送表格, 展开时只重跑本 fragment 再渲染
+            expander = st.expander(f"{title} - {len(rows)} 种结果", expanded=expanded, key=f"tier{tier}_{key}", on_change="rerun")
+            if expander.open:
+                with expander:
+                    render_result_frame(result, rows, key, f"tier{tier}_{key}", probs=probs,
+                                        column_config=common_config, width="stretch", hide_index=True)
+
+        # 如果没有选目标，就直接显示大列表
+        if query_node is None:
+            render_result_frame(result, np.arange(len(table.prob)), key, f"all_{key}", include_other=True,
+                                column_config=common_config, width="stretch", hide_index=True)
+        else:
+            # 选了目标，进行三层分级 (一次向量化划分)
+            # 1. 完美组 (Strict Hit) / 2. 项目组 (Loose Hit but not Strict) / 3. 其他组
+            with profiler.stage("tiers", scope=key):
+                if phenotype_mode:
+                    # 表现型行内混有 Het 与原色, 按基因型位点分布拆分每行在各组中的概率, 组内按该部分降序
+                    split = get_phenotype_tier_probs(query_node, loci, table)
+                    tier_probs = [split[:, t] for t in range(3)]
+                    tier_rows = [np.flatnonzero(p > 0) for p in tier_probs]
+                    tier_rows = [rows[np.argsort(-p[rows], kind="stable")] for rows, p in zip(tier_rows, tier_probs)]
+                else:
+                    tiers = get_query_tiers(query_node, table)
+                    tier_rows = [np.flatnonzero(tiers == t) for t in (1, 2, 3)]
+                    tier_probs = [None] * 3
+
+            titles = ["🎯 完美目标组 (Perfect Hits)", "🧬 核心项目组 (Project Makers)", "📂 其他副产物 (Others)"]
+            for t, (title, rows, probs) in enumerate(zip(titles, tier_rows, tier_probs), 1):
+                # Tier 3 默认折叠
+                if len(rows): render_tier(t, title, rows, expanded=t < 3, probs=probs)
+
+        # ================= 整窝模拟 =================
+        # 折叠时不模拟, 展开后才在本 fragment 内计算 (与分组表格同样懒加载)
+        sim_expander = st.expander("🎲 整窝模拟 (Monte Carlo)", expanded=False, key=f"sim_{key}", on_change="rerun")
+        if sim_expander.open:
+            with sim_expander:
+                sc1, sc2, sc3 = st.columns(3)
+                with sc1:
+                    clutch_size = st.number_input("每窝蛋数", min_value=1, max_value=15, value=6, key=f"sim_clutch_{key}")
+                with sc2:
+                    season_clutches = st.number_input("每季窝数", min_value=1, max_value=200, value=40, key=f"sim_season_{key}")
+                with sc3:
+                    sim_seed = st.number_input("随机种子", min_value=0, value=0, key=f"sim_seed_{key}")
+                with profiler.stage("simulation", scope=key):
+                    stats = simulate_clutches(male_geno, female_geno, clutch_size=clutch_size, n_clutches=SIM_CLUTCHES,
+                                              season_clutches=season_clutches, seed=sim_seed, query=query_node)
+
+                m1, m2, m3 = st.columns(3)
+                if query_node is not None:
+                    m1.metric("整窝至少 1 条完美成体", f"{stats.hits['p_any'] * 100:.1f}%", help=f"基于 {SIM_CLUTCHES} 窝模拟; 致死个体不计入。")
+                    m2.metric("每窝完美成体期望", f"{stats.hits['mean']:.2f} 条")
+                else:
+                    m1.metric("整窝至少 1 条成体/超级体", f"{stats.visuals['p_any'] * 100:.1f}%", help=f"基于 {SIM_CLUTCHES} 窝模拟; 致死个体不计入。")
+                    m2.metric("每窝成体/超级体期望", f"{stats.visuals['mean']:.2f} 条")
+                m3.metric("每窝致死损失期望", f"{stats.lethal['mean']:.2f} 枚", help=f"整窝出现致死损失的概率: {stats.lethal['p_any'] * 100:.1f}%")
+
+                sim_rows = {"每窝完美成体": stats.hits, "每窝成体/超级体": stats.visuals, "每窝出壳数": stats.survivors}
+                if stats.season:
+                    sim_rows.update({"每季完美成体": stats.season["hits"], "每季成体/超级体": stats.season["visuals"]})
+                if query_node is None:
+                    sim_rows = {k: v for k, v in sim_rows.items() if "完美" not in k}
+                st.dataframe(
+                    pd.DataFrame({name: {"期望": s["mean"], **{f"P{int(q * 100)}": v for q, v in s["quantiles"].items()}}
+                                  for name, s in sim_rows.items()}).T,
+                    width="stretch",
                 )
 
-            kpi_c1, kpi_c2, kpi_c3 = st.columns(3)
-            
-            help_hit = "指完美遗传了您选定的所有目标基因，且均为成体/超级体表现 (Visual/Super)。"
-            help_proj = "指携带了您选定的目标基因 (可能含 Het)，适合留种作为下一代繁育种源。"
-            help_jackpot = "指这一窝中所有能直观看出基因变异个体 (显性超级体 + 隐性成体) 的总概率。"
-            
-            if not target_combo:
-                # 默认显示
-                prob_super = df[
-                    (df['表现型_Full'].str.contains("BEL")) | 
-                    (df['表现型_Full'].str.contains("Super")) |
-                    (df['表现型_Full'].str.contains("Visual")) 
-                ]['概率'].sum()
-                kpi_c1.metric("任意极品/超级体", f"{prob_super:.1f}%", help=help_hit)
-                kpi_c2.metric("请选择目标组合 ↗", "--", help="在右上方选择目标基因组合后，此处将显示该组合的特定概率。")
-            else:
-                # 组合计算
-                def check_combo_hit(row_geno, targets, mode="strict"):
-                    for t in targets:
-                        val = row_geno.get(t, 0)
-                        if val == 0: return False
-                        g_type = GENE_DB.get(t, {}).get("type", "显性")
-                        if mode == "strict":
-                            # 严格模式：隐性必须2，显性必须>=1 (含2)
-                            if "隐性" in g_type and val < 2: return False
-                    return True
-
-                prob_hit = df[df['_geno_dict'].apply(lambda g: check_combo_hit(dict(g), target_combo, "strict"))]['概率'].sum()
-                prob_proj = df[df['_geno_dict'].apply(lambda g: check_combo_hit(dict(g), target_combo, "loose"))]['概率'].sum()
-                
-                combo_name = " + ".join(target_combo)
-                if len(combo_name) > 15: combo_name = "目标组合" 
-
-                kpi_c1.metric(f"完美成体 ({combo_name})", f"{prob_hit:.1f}%", help=help_hit)
-                kpi_c2.metric(f"项目个体 (含 Het)", f"{prob_proj:.1f}%", help=help_proj)
-
-            prob_jackpot = df[
-                (df['表现型_Full'].str.contains("BEL")) | 
-                (df['表现型_Full'].str.contains("Super")) | 
-                (df['表现型_Full'].str.contains("Visual")) 
-            ]['概率'].sum()
-            kpi_c3.metric("超级/成体综合概率 (Total Super/Visual)", f"{prob_jackpot:.1f}%", help=help_jackpot)
-            
-            st.markdown("---")
-            
-            # ================= 列表展示 (智能分层 Smart Tiering) =================
-            
-            common_config = {
-                "概率": st.column_config.NumberColumn(format="%.1f%%", width="small"),
-                "表现型": st.column_config.Column("基因表现型 (Visual/Super 为成体/超级体)", width="large"),
-                "链接": st.column_config.LinkColumn("图鉴", display_text="MorphMarket", width="small"),
-                "_gene_count": None # 隐藏辅助列
-            }
-            
-            # 如果没有选目标，就直接显示大列表
-            if not target_combo:
-                st.dataframe(df[['表现型_Full', '概率', '链接', '_gene_count']].rename(columns={'表现型_Full': '表现型'}), 
-                             column_config=common_config, use_container_width=True, hide_index=True)
-            else:
-                # 选了目标，进行三层分级
-                
-                # 1. 完美组 (Strict Hit)
-                df_tier1 = df[df['_geno_dict'].apply(lambda g: check_combo_hit(dict(g), target_combo, "strict"))]
-                # 2. 项目组 (Loose Hit but not Strict)
-                df_tier2 = df[
-                    (df['_geno_dict'].apply(lambda g: check_combo_hit(dict(g), target_combo, "loose"))) & 
-                    (~df.index.isin(df_tier1.index))
-                ]
-                # 3. 其他组
-                df_tier3 = df[~df.index.isin(df_tier1.index) & ~df.index.isin(df_tier2.index)]
-                
-                # 渲染 Tier 1
-                if not df_tier1.empty:
-                    with st.expander(f"🎯 完美目标组 (Perfect Hits) - {len(df_tier1)} 种结果", expanded=True):
-                        st.dataframe(df_tier1[['表现型_Full', '概率', '链接', '_gene_count']].rename(columns={'表现型_Full': '表现型'}),
-                                     column_config=common_config, use_container_width=True, hide_index=True)
-                
-                # 渲染 Tier 2
-                if not df_tier2.empty:
-                    with st.expander(f"🧬 核心项目组 (Project Makers) - {len(df_tier2)} 种结果", expanded=True):
-                        st.dataframe(df_tier2[['表现型_Full', '概率', '链接', '_gene_count']].rename(columns={'表现型_Full': '表现型'}),
-                                     column_config=common_config, use_container_width=True, hide_index=True)
-                        
-                # 渲染 Tier 3 (默认折叠)
-                if not df_tier3.empty:
-                    with st.expander(f"📂 其他副产物 (Others) - {len(df_tier3)} 种结果", expanded=False):
-                        st.dataframe(df_tier3[['表现型_Full', '概率', '链接', '_gene_count']].rename(columns={'表现型_Full': '表现型'}),
-                                     column_config=common_config, use_container_width=True, hide_index=True)
+result_view = st.radio("结果展示:", ["基因型 (全部组合)", "表现型 (肉眼可见, 隐性 Het 合并)"], horizontal=True, key="result_view")
+phenotype_mode = result_view.startswith("表现型")
+
+tabs = st.tabs([f"{female_names['A']}", f"{female_names['B']}", f"{female_names['C']}"])
+for i, key in enumerate(["A", "B", "C"]):
+    with tabs[i]:
+        render_f1_tab(key, male_geno, females_geno[key], selected_gene_ids, phenotype_mode)
 
 # --- 3. F2 选育推演 ---
 st.divider()
 st.markdown("#### 3. F2 选育推演 (回交/近亲)")
 
-if not any(df is not None and not df.empty for df in f1_dfs.values()):
-    st.info("F1 无数据，无法进行推演。")
-else:
-    c1, c2, c3 = st.columns([1, 1, 1.5])
-
-    # 1. 选留种
-    with c1:
-        st.markdown("**:one: 留哪条 F1?**")
-        source_clutch = st.selectbox("来源:", ["母蛇 A 的后代", "母蛇 B 的后代", "母蛇 C 的后代"])
-        clutch_key_map = {"母蛇 A 的后代": "A", "母蛇 B 的后代": "B", "母蛇 C 的后代": "C"}
-        clutch_key = clutch_key_map[source_clutch]
+@st.fragment
+def render_f2_section(male_geno, females_geno, selected_gene_ids, group_animals):
+    # F1 结果来自缓存 (与上方标签页共享同一阶段结果)
+    pairing_cache = get_pairing_cache()
+    inventory = get_inventory()
+    profiler = get_profiler()
+    with profiler.stage("f1_results", scope="F2"):
+        f1_results = {k: get_pairing_result(pairing_cache, male_geno, females_geno[k], selected_gene_ids, profiler)
+                      for k in ["A", "B", "C"]}
+
+    if not any(len(result.table.prob) for result in f1_results.values()):
+        st.info("F1 无数据，无法进行推演。")
+    else:
+        c1, c2, c3 = st.columns([1, 1, 1.5])
+
+        # 1. 选留种
+        with c1:
+            st.markdown("**:one: 留哪条 F1?**")
+            source_clutch = st.selectbox("来源:", ["母蛇 A 的后代", "母蛇 B 的后代", "母蛇 C 的后代"])
+            clutch_key_map = {"母蛇 A 的后代": "A", "母蛇 B 的后代": "B", "母蛇 C 的后代": "C"}
+            clutch_key = clutch_key_map[source_clutch]
         
-        current_df = f1_dfs.get(clutch_key)
-        if current_df is not None and not current_df.empty:
-            options = []
-            for idx, row in current_df.iterrows():
-                clean_label = row['表现型_Full'].replace("\n", " ").replace("**", "").split(">>>")[-1].strip()
-                options.append(f"{clean_label} ({row['概率']:.1f}%)")
+            # 两亲都从库存载入时, 可直接选库中已记录的这窝后代 (真实个体), 不必由 F1 结果推算
+            sire, dam = group_animals.get("公蛇"), group_animals.get(female_names[clutch_key])
+            kept = {a.id: a for a in inventory.get_offspring(sire.id, dam.id)} if sire and dam else {}
+            holdback_animal = None
+            current_result = f1_results.get(clutch_key)
+            if kept and st.radio("留种:", ["库存中的已留种个体", "按 F1 结果推算"], horizontal=True, key="f2_holdback_source") == "库存中的已留种个体":
+                holdback_animal = kept[st.selectbox("个体:", list(kept), format_func=lambda i: format_animal(kept[i]), key="f2_holdback_animal")]
+                holdback_geno = {gid: holdback_animal.genotype.get(gid, 0) for gid in selected_gene_ids}
+            elif current_result is not None and len(current_result.table.prob):
+                current_table = current_result.table
+                all_rows = range(len(current_table.prob))
+                options = []
+                for r, label in zip(all_rows, current_result.labels):
+                    clean_label = label.replace("\n", " ").replace("**", "").split(">>>")[-1].strip()
+                    options.append(f"{clean_label} ({current_table.prob[r] * 100:.1f}%)")
                 
-            sel_idx = st.selectbox("个体:", range(len(current_df)), format_func=lambda x: options[x])
-            holdback_geno_dict = dict(current_df.iloc[sel_idx]['_geno_dict'])
-            holdback_geno = {gid: holdback_geno_dict.get(gid, 0) for gid in selected_gene_ids}
-        else:
-            st.warning("该来源无数据")
-            st.stop()
-
-    # 2. 选配偶
-    with c2:
-        st.markdown("**:two: 配给谁?**")
-        partner_map = {
-            "回交 - 公蛇 (父亲)": male_geno,
-            "回交 - 母蛇 A (亲妈/姨妈)": females_geno["A"],
-            "回交 - 母蛇 B (姨妈)": females_geno["B"],
-            "回交 - 母蛇 C (姨妈)": females_geno["C"],
-            "同窝互配 (Sibling/近亲)": holdback_geno 
-        }
-        partner_choice = st.radio("配偶选择:", list(partner_map.keys()))
-        partner_geno = partner_map[partner_choice]
-
-    # 3. 结果 & 风控
-    with c3:
-        st.markdown("**:three: F2 结果**")
-        df_f2 = calculate_offspring(holdback_geno, partner_geno)
+                sel_idx = st.selectbox("个体:", all_rows, format_func=lambda x: options[x])
+                holdback_geno_dict = get_row_geno(current_table, sel_idx)
+                holdback_geno = {gid: holdback_geno_dict.get(gid, 0) for gid in selected_gene_ids}
+            else:
+                st.warning("该来源无数据")
+                st.stop()
+
+        # 2. 选配偶
+        with c2:
+            st.markdown("**:two: 配给谁?**")
+            partner_map = {
+                "回交 - 公蛇 (父亲)": male_geno,
+                "回交 - 母蛇 A (亲妈/姨妈)": females_geno["A"],
+                "回交 - 母蛇 B (姨妈)": females_geno["B"],
+                "回交 - 母蛇 C (姨妈)": females_geno["C"],
+            }
+            if holdback_animal is None:
+                partner_map["同窝互配 (Sibling/近亲)"] = holdback_geno
+                partner_sex = None
+            else:
+                # 系谱: 父母与同窝的异性兄弟姐妹
+                partner_sex = FEMALE if holdback_animal.sex == MALE else MALE
+                parents, siblings = inventory.get_relatives(holdback_animal)
+                partner_map.update({f"系谱 - {'父' if p.sex == MALE else '母'} {format_animal(p)}": p.genotype for p in parents})
+                partner_map.update({f"同窝 - {format_animal(s)}": s.genotype for s in siblings if s.sex == partner_sex})
+            partner_query = st.text_input("从库存挑选 (条件):", key="f2_partner_query", placeholder="例: Clown:het")
+            if partner_query.strip():
+                try:
+                    found = inventory.find(partner_query, partner_sex, limit=INVENTORY_ROWS)
+                except ValueError as e:
+                    st.error(f"条件无法解析: {e}")
+                    found = []
+                partner_map.update({f"库存 - {format_animal(p)}": p.genotype for p in found})
+            partner_widget = st.radio if len(partner_map) <= 8 else st.selectbox
+            partner_choice = partner_widget("配偶选择:", list(partner_map.keys()))
+            partner_geno = {gid: partner_map[partner_choice].get(gid, 0) for gid in selected_gene_ids}
+
+        # 3. 结果 & 风控
+        with c3:
+            st.markdown("**:three: F2 结果**")
+            with profiler.stage("pairing_result", scope="F2"):
+                result_f2 = get_pairing_result(pairing_cache, holdback_geno, partner_geno, selected_gene_ids, profiler)
         
-        f2_risks = check_genetic_risks(df_f2, selected_gene_ids)
-        if f2_risks:
-            for r in f2_risks: st.markdown(f"<div class='risk-alert'>{r}</div>", unsafe_allow_html=True)
-            
-        df_f2['表现型'] = df_f2.apply(lambda row: format_label_with_combo(row, selected_gene_ids, simplified=False), axis=1)
-        df_f2['链接'] = df_f2.apply(lambda row: generate_mm_link(dict(row['_geno_dict'])), axis=1)
+            render_risk_alerts(result_f2.risks, result_f2.loci)
         
+            render_result_frame(
+                result_f2, np.arange(len(result_f2.table.prob)), "F2", "F2", include_other=True,
+                column_config={
+                    "概率": st.column_config.NumberColumn(format="%.1f%%", width="small"),
+                    "链接": st.column_config.LinkColumn("图鉴", display_text="MorphMarket", width="small")
+                },
+                width="stretch",
+                hide_index=True,
+                height=300
+            )
+
+render_f2_section(male_geno, females_geno, selected_gene_ids, group_animals)
+
+@st.fragment
+def render_holdback_matrix_section(male_geno, females_geno, selected_gene_ids):
+    # 全部留种 × 全部配偶: 展开时才计算 (与分层结果相同的懒加载)
+    expander = st.expander("🧮 留种 × 配偶 全矩阵 (找出最值得留的 F1)", expanded=False, key="holdback_matrix", on_change="rerun")
+    if not expander.open: return
+    with expander:
+        hc1, hc2, hc3 = st.columns([2, 2, 1])
+        with hc1:
+            hb_targets = st.multiselect("目标组合:", options=selected_gene_ids, default=[], key="hb_targets")
+        with hc2:
+            hb_query = st.text_input("高级条件 (可选, 填写后代替左侧多选):", key="hb_query", placeholder="例如: Clown AND Pied:het")
+        with hc3:
+            hb_mode = st.radio("命中口径:", ["strict", "loose"], format_func=lambda m: "完美成体" if m == "strict" else "项目个体", key="hb_mode")
+        try:
+            node = parse_query(hb_query) if hb_query.strip() else (query_from_targets(hb_targets) if hb_targets else None)
+        except ValueError as e:
+            st.error(f"条件无法解析: {e}")
+            return
+        if node is None:
+            st.caption("选择目标后, 对三窝 F1 的每种留种分别与 公蛇 / 母蛇 A/B/C / 同窝随机个体 配对, 一次算出 F2 命中率矩阵。")
+            return
+        merge = st.toggle("按目标相关基因合并留种 (其余基因不影响命中率)", value=True, key="hb_merge")
+
+        pairing_cache = get_pairing_cache()
+        partners = {"公蛇": male_geno, **{female_names[k]: females_geno[k] for k in ["A", "B", "C"]}}
+        frames = []
+        with get_profiler().stage("holdback_matrix", scope="F2"):
+            for k in ["A", "B", "C"]:
+                result = get_pairing_result(pairing_cache, male_geno, females_geno[k], selected_gene_ids)
+                matrix = compute_holdback_matrix(result.loci, partners, node, hb_mode)
+                if merge:
+                    table = matrix.holdbacks
+                    labels, prob, hits = format_outcome_labels(table, range(len(table.prob)), selected_gene_ids), table.prob, matrix.hits
+                else:
+                    labels, prob, hits = result.labels, result.table.prob, expand_to_outcomes(matrix, result.table)
+                df = pd.DataFrame(hits * 100, columns=matrix.partners)
+                df.insert(0, "留种", labels)
+                df.insert(0, "来源", f"{female_names[k]} 的后代")
+                df["留种概率"] = prob * 100
+                df["最佳配偶"] = [matrix.partners[i] for i in hits.argmax(axis=1)]
+                df["最佳命中率"] = hits.max(axis=1) * 100
+                # 按该留种在窝中出现的概率加权: 一窝里真正能挑到它的机会 × 它能带来的命中率
+                df["加权命中"] = df["留种概率"] * hits.max(axis=1)
+                frames.append(df)
+        df_matrix = pd.concat(frames, ignore_index=True).sort_values("加权命中", ascending=False, kind="stable")
+
+        if len(df_matrix) > HOLDBACK_MATRIX_ROWS:
+            st.caption(f"共 {len(df_matrix)} 种留种, 按加权命中列出前 {HOLDBACK_MATRIX_ROWS} 种。")
+        pct_cols = [c for c in df_matrix.columns if c not in ("来源", "留种", "最佳配偶")]
         st.dataframe(
-            df_f2[['表现型', '概率', '链接']], 
-            column_config={
-                "概率": st.column_config.NumberColumn(format="%.1f%%", width="small"),
-                "链接": st.column_config.LinkColumn("图鉴", display_text="MorphMarket", width="small")
-            },
-            use_container_width=True,
+            df_matrix.head(HOLDBACK_MATRIX_ROWS),
+            column_config={c: st.column_config.NumberColumn(format="%.2f%%" if c == "加权命中" else "%.1f%%") for c in pct_cols},
+            width="stretch",
             hide_index=True,
-            height=300
         )
+
+render_holdback_matrix_section(male_geno, females_geno, selected_gene_ids)
+
+@st.fragment
+def render_plan_section(male_geno, females_geno, selected_gene_ids):
+    with st.expander("🧭 多代选育规划 (自动搜索最优路线)", expanded=False):
+        pc1, pc2, pc3 = st.columns([2, 1, 1])
+        with pc1:
+            plan_targets = st.multiselect("目标组合:", options=selected_gene_ids, default=[], key="plan_targets")
+        with pc2:
+            horizon = st.slider("最多代数", min_value=2, max_value=4, value=3, key="plan_horizon")
+        with pc3:
+            clutch_size = st.number_input("每窝蛋数", min_value=1, max_value=15, value=6, key="plan_clutch")
+        if not plan_targets:
+            st.caption("选择目标组合后, 将在 公蛇 + 母蛇 A/B/C 中搜索留种、回交、同窝互配与外交的最优组合路线。")
+            return
+
+        collection = {"公蛇": ("M", male_geno)}
+        collection.update({female_names[k]: ("F", females_geno[k]) for k in ["A", "B", "C"]})
+        with get_profiler().stage("plan_breeding", scope="plan"):
+            plans = plan_breeding(collection, plan_targets, horizon=horizon, clutch_size=clutch_size)
+        if not plans:
+            st.info(f"{horizon} 代以内无法从现有个体做出该目标组合。")
+            return
+
+        for rank, plan in enumerate(plans, 1):
+            st.markdown(f"**方案 {rank}** · {plan.generations} 代 · 成功率 {plan.success_prob * 100:.1f}%"
+                        f" (末代单蛋命中 {plan.egg_prob * 100:.1f}%)")
+            st.dataframe(
+                pd.DataFrame([{"代": f"第 {s.generation} 代", "方式": s.move, "公": s.parent_a, "母": s.parent_b} for s in plan.steps]),
+                width="stretch",
+                hide_index=True,
+            )
+
+render_plan_section(male_geno, females_geno, selected_gene_ids)
+
+@st.fragment
+def render_projection_section(male_geno, females_geno, selected_gene_ids):
+    with st.expander("📈 多代投影 (固定交配方案 F1 → Fn)", expanded=False):
+        pc1, pc2, pc3 = st.columns([1, 1, 1])
+        with pc1:
+            scheme_label = st.radio("交配方案:", ["同窝互配 (每代近亲)", "连续回交公蛇"], key="proj_scheme")
+        with pc2:
+            proj_female = st.selectbox("起始母蛇:", ["A", "B", "C"], format_func=lambda k: female_names[k], key="proj_female")
+            generations = st.slider("代数", min_value=2, max_value=10, value=6, key="proj_generations")
+        with pc3:
+            proj_targets = st.multiselect("目标组合:", options=selected_gene_ids, default=[], key="proj_targets")
+
+        scheme = SCHEME_SIBLING if scheme_label.startswith("同窝") else SCHEME_BACKCROSS
+        with get_profiler().stage("project_generations", scope="projection"):
+            projected = project_generations(male_geno, females_geno[proj_female], scheme, generations)
+        rows = []
+        for n, loci in enumerate(projected, 1):
+            row = {"代": f"F{n}", "成体/超级体概率": get_visual_probability(loci) * 100}
+            if proj_targets:
+                row["完美成体概率"] = get_combo_hit_probability(loci, proj_targets, "strict") * 100
+            row["致死风险概率"] = get_lethal_probability(loci) * 100
+            rows.append(row)
+        df_proj = pd.DataFrame(rows).set_index("代")
+        st.line_chart(df_proj)
+        st.dataframe(df_proj, column_config={c: st.column_config.NumberColumn(format="%.1f%%") for c in df_proj.columns},
+                     width="stretch")
+
+render_projection_section(male_geno, females_geno, selected_gene_ids)
+
+# --- 4. 全库配对矩阵 ---
+st.divider()
+st.markdown("#### 4. 全库配对矩阵 (批量)")
+
+@st.fragment
+def render_batch_section():
+    st.caption("上传动物表 CSV (列: id, sex, 基因英文名...; 分值 0/1/2), 一次评估所有 公蛇 × 母蛇 配对并排序。")
+    uploaded = st.file_uploader("动物表 CSV", type=["csv"], label_visibility="collapsed")
+    if uploaded is None: return
+    try:
+        males, females = load_animals_csv(uploaded)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if not males or not females:
+        st.warning("动物表中至少需要一条公蛇和一条母蛇")
+        return
+
+    gene_ids = sorted({gid for geno in [*males.values(), *females.values()] for gid in geno})
+    batch_targets = st.multiselect("目标组合:", options=gene_ids, default=[], key="batch_targets")
+
+    # 可选: 本地价目表 (按表现型), 按每窝期望价值排序
+    price_file = st.file_uploader("价目表 CSV / Parquet (列: phenotype, price; 可选, 提供后按每窝期望价值排序)",
+                                  type=["csv", "parquet"], key="batch_prices")
+    value_args = None
+    if price_file is not None:
+        try:
+            prices = load_price_table(price_file)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        vc1, vc2 = st.columns(2)
+        clutch_size = vc1.number_input("每窝蛋数", min_value=1, max_value=15, value=DEFAULT_CLUTCH_SIZE, key="batch_clutch")
+        risk_discount = vc2.slider("非致死风险个体折价", 0, 100, 0, format="%d%%", key="batch_risk_discount",
+                                   help="RISK_DB 中的非致死风险 (如 Wobble、Kinking) 个体按此比例折价; 致死结果一律不计价值。")
+        value_args = (prices, clutch_size, risk_discount / 100)
+    if not st.button(f"计算 {len(males)} × {len(females)} 配对", key="batch_run"): return
+
+    total = len(males) * len(females)
+    progress = st.progress(0.0)
+    rows = []
+    with get_profiler().stage("pairing_matrix", scope="batch"):
+        for chunk in iter_pairing_matrix(males, females, batch_targets, value_args=value_args):
+            rows.extend(chunk)
+            progress.progress(len(rows) / total, text=f"{len(rows)} / {total}")
+    columns = PAIRING_COLUMNS + (VALUE_COLUMNS if value_args is not None else [])
+    df_matrix = rank_pairings(pd.DataFrame(rows, columns=columns), bool(batch_targets), by_value=value_args is not None)
+
+    prob_cols = PAIRING_COLUMNS[2:]
+    df_matrix[prob_cols] = df_matrix[prob_cols] * 100
+    st.dataframe(
+        df_matrix.head(500),
+        column_config={**{c: st.column_config.NumberColumn(format="%.1f%%") for c in prob_cols},
+                       **{c: st.column_config.NumberColumn(format="%.1f") for c in VALUE_COLUMNS}},
+        width="stretch",
+        hide_index=True,
+    )
+
+render_batch_section()
+
+# --- 性能调试面板 (?debug=1 并在侧边栏开启后显示) ---
+if get_profiler().enabled:
+    st.divider()
+    render_debug_panel(get_profiler())
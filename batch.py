@@ -0,0 +1,116 @@
+"""全库配对矩阵: 任意数量公蛇 × 母蛇的批量评估 (进程池 + 分块流式返回)。"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from genetics import (
+    GENE_DB, lazy_import, get_locus_distributions, get_loci_gene_ids, get_combo_hit_probability,
+    get_visual_probability, get_lethal_probability, count_offspring_outcomes, calculate_offspring_top,
+    format_outcome_labels, generate_mm_links, get_risk_probabilities,
+)
+from inventory import MALE, read_animals_csv
+from pricing import evaluate_clutch_value
+
+pd = lazy_import("pandas")
+
+PAIRING_COLUMNS = ["公蛇", "母蛇", "完美成体概率", "项目个体概率", "成体/超级体概率", "致死风险概率"]
+VALUE_COLUMNS = ["每蛋期望价值", "每窝期望价值", "每窝风险损失"]  # 提供价目表时追加在 PAIRING_COLUMNS 之后
+INLINE_PAIRING_LIMIT = 2000  # 配对数不超过此值时直接在当前进程计算, 省去进程启动开销
+
+# 单个配对的完整评估 (命令行与 JSON API 共用); 概率为 0~1, 未选目标时 hit / project 为 None
+# outcomes: 概率最高的 top 个结果 [(标签, 概率, MorphMarket 链接)]; top 为 0 时为空, other_prob 为 None
+PairingReport = namedtuple("PairingReport", ["hit", "project", "visual", "lethal", "outcome_count", "risks",
+                                             "outcomes", "other_prob"])
+
+def evaluate_pairing(male_geno, female_geno, targets=()):
+    # 只用各位点分布计算, 不枚举基因型; 概率为 0~1
+    return evaluate_loci(get_locus_distributions(male_geno, female_geno), targets)
+
+def evaluate_loci(loci, targets=()):
+    hit = get_combo_hit_probability(loci, targets, "strict") if targets else None
+    proj = get_combo_hit_probability(loci, targets, "loose") if targets else None
+    return hit, proj, get_visual_probability(loci), get_lethal_probability(loci)
+
+def evaluate_report(parent_a, parent_b, targets=(), top=3):
+    loci = get_locus_distributions(parent_a, parent_b)
+    outcomes, other_prob = [], None
+    if top:
+        table, other_prob = calculate_offspring_top(parent_a, parent_b, top_k=top)
+        rows = range(len(table.prob))
+        labels = format_outcome_labels(table, rows, get_loci_gene_ids(loci))
+        outcomes = list(zip(labels, table.prob.tolist(), generate_mm_links(table, rows)))
+    return PairingReport(*evaluate_loci(loci, targets), count_offspring_outcomes(loci), get_risk_probabilities(loci),
+                         outcomes, other_prob)
+
+def _evaluate_chunk(male_id, male_geno, females, targets, value_args=None):
+    # value_args: (价目表, 每窝蛋数, 风险折价) 或 None
+    rows = []
+    for female_id, female_geno in females:
+        loci = get_locus_distributions(male_geno, female_geno)
+        row = (male_id, female_id) + evaluate_loci(loci, targets)
+        if value_args is not None:
+            value = evaluate_clutch_value(loci, *value_args)
+            row += (value.egg_value, value.clutch_value, value.risk_loss)
+        rows.append(row)
+    return rows
+
+def _iter_chunks(males, females, chunk_size):
+    females = list(females.items())
+    for male_id, male_geno in males.items():
+        for i in range(0, len(females), chunk_size):
+            yield male_id, male_geno, females[i:i + chunk_size]
+
+def iter_pairing_matrix(males, females, targets=(), max_workers=None, chunk_size=256, value_args=None):
+    """逐块产出评估结果 (每块为若干行 tuple, 列顺序同 PAIRING_COLUMNS, 给出 value_args 时再加 VALUE_COLUMNS)。
+
+    在途任务数限制为 2 × 进程数, 内存占用与动物数量无关; max_workers=0 强制在当前进程计算。
+    value_args 为 (价目表, 每窝蛋数, 风险折价), 见 pricing.evaluate_clutch_value。
+    """
+    targets = tuple(targets)
+    chunks = _iter_chunks(males, females, chunk_size)
+    if max_workers is None and len(males) * len(females) <= INLINE_PAIRING_LIMIT:
+        max_workers = 0
+    if max_workers == 0:
+        for chunk in chunks:
+            yield _evaluate_chunk(*chunk, targets, value_args)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_evaluate_chunk, *chunk, targets, value_args))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done: yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done: yield future.result()
+
+def rank_pairings(df, has_targets, by_value=False):
+    # 按价值: 每窝期望价值降序; 有目标组合: 完美成体 > 项目个体 > 成体/超级体, 致死风险越低越靠前; 否则按成体/超级体排序
+    if by_value:
+        by, ascending = ["每窝期望价值", "致死风险概率"], [False, True]
+    elif has_targets:
+        by, ascending = ["完美成体概率", "项目个体概率", "成体/超级体概率", "致死风险概率"], [False, False, False, True]
+    else:
+        by, ascending = ["成体/超级体概率", "致死风险概率"], [False, True]
+    return df.sort_values(by, ascending=ascending, kind="stable").reset_index(drop=True)
+
+def build_pairing_matrix(males, females, targets=(), value_args=None, **kwargs):
+    rows = []
+    for chunk in iter_pairing_matrix(males, females, targets, value_args=value_args, **kwargs):
+        rows.extend(chunk)
+    columns = PAIRING_COLUMNS + (VALUE_COLUMNS if value_args is not None else [])
+    return rank_pairings(pd.DataFrame(rows, columns=columns), bool(targets), by_value=value_args is not None)
+
+def pivot_pairing_matrix(df, value="完美成体概率"):
+    # 公蛇 × 母蛇 矩阵视图
+    return df.pivot(index="公蛇", columns="母蛇", values=value)
+
+def load_animals_csv(path_or_buffer):
+    """读取动物表 (格式见 inventory.read_animals_csv), 返回 (males, females), 均为 {id: {gene: score}}。"""
+    males, females = {}, {}
+    for animal in read_animals_csv(path_or_buffer):
+        (males if animal.sex == MALE else females)[animal.id] = animal.genotype
+    return males, females
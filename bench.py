@@ -0,0 +1,248 @@
+"""遗传引擎与页面流水线基准测试: 记录耗时 / 峰值内存 / 结果数到 JSON, 并可与基线对比检查性能回退。
+
+用法:
+    python bench.py run -o bench_baseline.json              # 生成基线
+    python bench.py compare bench_baseline.json             # 重新测一遍并与基线对比, 回退时退出码为 1
+    python bench.py compare bench_baseline.json --current new.json --time-threshold 0.3
+
+场景覆盖 1~20 个基因 (双杂合 / 超级×野生 / 混合) 以及复合组 (BEL / YB / ALS / Spider) 密集的配对;
+每个场景依次测量: 配子枚举、完整后代表 (calculate_offspring)、页面用结果表 (Top-K)、表现型汇总表、风险筛查、
+标签生成 (df.apply(format_label_with_combo) 与向量化版本)、MM 链接与档位筛选。
+耗时取多次重复中的最小值 (单次调用), 峰值内存由 tracemalloc 单独测一次 (不计入耗时)。
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+from genetics import (
+    FULL_ENUM_LIMIT, np, pd, get_locus_distributions, get_loci_gene_ids, count_offspring_outcomes, get_gametes,
+    calculate_offspring, calculate_offspring_for_display, calculate_phenotype_for_display, offspring_table_to_frame, check_table_risks,
+    format_label_with_combo, format_outcome_labels, generate_mm_links, get_combo_hit_mask,
+)
+
+GAMETE_LIMIT = 2 ** 16  # 配子数超过此值时跳过 get_gametes (结果数按 2^位点数 增长)
+SWEEP_SIZES = (1, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20)
+# 扫描用基因: 均不在复合组内, 显性/隐性交替, 含一个有风险提示的基因 (GHI)
+SWEEP_GENES = [
+    "Clown", "Pastel", "Pied", "Enchi", "GHI", "Desert Ghost", "Orange Dream", "Albino", "Leopard", "Sunset",
+    "Fire", "Ghost", "Mahogany", "Monsoon", "Blackhead", "Puzzle", "Vanilla", "Genetic Stripe", "Banana", "Toy",
+]
+# 混合场景中各基因的 (公, 母) 分值, 循环使用
+MIXED_PATTERN = [(1, 1), (2, 1), (1, 0), (2, 2), (0, 1)]
+
+# ================= 1. 场景 =================
+def build_scenarios():
+    """返回 [(名称, 亲本 A, 亲本 B, 目标基因)], 顺序固定, 结果可复现。"""
+    scenarios = []
+    for n in SWEEP_SIZES:
+        genes = SWEEP_GENES[:n]
+        targets = genes[:2]
+        scenarios.append((f"het_x_het/{n}", dict.fromkeys(genes, 1), dict.fromkeys(genes, 1), targets))
+        scenarios.append((f"super_x_wild/{n}", dict.fromkeys(genes, 2), {}, targets))
+        pattern = [MIXED_PATTERN[i % len(MIXED_PATTERN)] for i in range(n)]
+        scenarios.append((f"mixed/{n}",
+                          {g: a for g, (a, _) in zip(genes, pattern) if a},
+                          {g: b for g, (_, b) in zip(genes, pattern) if b}, targets))
+    scenarios.append(("complex/bel_pair", {"Mojave": 1, "Lesser": 1}, {"Mojave": 1, "Butter": 1}, ["Mojave"]))
+    scenarios.append(("complex/bel_heavy",
+                      {"Mojave": 1, "Lesser": 1, "Black Pastel": 1, "Spider": 1, "Yellow Belly": 1, "Clown": 1},
+                      {"Butter": 1, "Russo": 1, "Cinnamon": 1, "Woma": 1, "Asphalt": 1, "Clown": 1},
+                      ["Lesser", "Clown"]))
+    scenarios.append(("complex/all_groups_het",
+                      {"Mojave": 1, "Phantom": 1, "Cinnamon": 1, "Het Red Axanthic": 1, "Gravel": 1, "Spark": 1,
+                       "Spotnose": 1, "Champagne": 1, "Acid": 1, "Pied": 1, "Clown": 1, "GHI": 1},
+                      {"Lesser": 1, "Mystic": 1, "Black Pastel": 1, "Cinnamon": 1, "Yellow Belly": 1, "Specter": 1,
+                       "Hidden Gene Woma": 1, "Spider": 1, "Confusion": 1, "Pied": 1, "Clown": 1, "GHI": 1},
+                      ["Mojave", "Pied", "Clown"]))
+    return scenarios
+
+def build_stages(parent_a, parent_b, targets):
+    """返回 [(阶段名, 可调用对象, 结果数)], 下游阶段复用上游结果, 只测各自本身的开销。"""
+    loci = get_locus_distributions(parent_a, parent_b)
+    gene_ids = get_loci_gene_ids(loci)
+    n_outcomes = count_offspring_outcomes(loci)
+    stages = []
+    if 2 ** len(loci) <= GAMETE_LIMIT:
+        stages.append(("get_gametes", lambda: (get_gametes(parent_a), get_gametes(parent_b)),
+                       len(get_gametes(parent_a)) + len(get_gametes(parent_b))))
+    if n_outcomes <= FULL_ENUM_LIMIT:
+        stages.append(("calculate_offspring", lambda: calculate_offspring(parent_a, parent_b), n_outcomes))
+
+    _, table, _ = calculate_offspring_for_display(parent_a, parent_b)
+    rows = range(len(table.prob))
+    df = offspring_table_to_frame(table)
+
+    def tiers():
+        strict = get_combo_hit_mask(table, targets, "strict")
+        loose = get_combo_hit_mask(table, targets, "loose")
+        return table.prob[strict].sum(), table.prob[loose & ~strict].sum(), np.flatnonzero(~loose)
+
+    stages += [
+        ("display_table", lambda: calculate_offspring_for_display(parent_a, parent_b), len(rows)),
+        ("phenotype_table", lambda: calculate_phenotype_for_display(parent_a, parent_b),
+         len(calculate_phenotype_for_display(parent_a, parent_b)[1].prob)),
+        ("check_table_risks", lambda: check_table_risks(table, gene_ids), len(rows)),
+        ("labels_df_apply", lambda: df.apply(format_label_with_combo, axis=1, args=(gene_ids,)), len(rows)),
+        ("labels_vectorized", lambda: format_outcome_labels(table, rows, gene_ids), len(rows)),
+        ("mm_links", lambda: generate_mm_links(table, rows), len(rows)),
+        ("tier_filter", tiers, len(rows)),
+    ]
+    return stages
+
+# ================= 2. 测量 =================
+MIN_SAMPLE_SECONDS = 0.02  # 每次重复的最短时长, 快速函数会在一次重复内循环多次
+
+def measure(fn, repeats=5):
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < MIN_SAMPLE_SECONDS: number *= 2
+    times = [t / number for t in timer.repeat(repeats, number)]
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": statistics.median(times), "loops": number, "peak_bytes": peak}
+
+CALIBRATION_REPEATS = 15  # 校准负载在套件前后各测的次数
+
+def _calibration_workload():
+    # 固定的纯 Python + numpy 负载 (单次约数十毫秒), 用来估计本次运行时机器的快慢
+    counts = {}
+    for i in range(200000):
+        key = (i % 97, i % 13)
+        counts[key] = counts.get(key, 0) + 1
+    np.sort(np.arange(200000)[::-1] % 1013)
+    return counts
+
+def _calibrate():
+    return measure(_calibration_workload, CALIBRATION_REPEATS)["seconds"]
+
+def run_suite(repeats=5, name_filter=None, log=None):
+    # 校准在套件前后各测一轮取最小值, 单次测量受抖动影响时不会让整份报告的折算系数失真
+    calibration = _calibrate()
+    results = {}
+    for name, parent_a, parent_b, targets in build_scenarios():
+        if name_filter and name_filter not in name: continue
+        results[name] = {}
+        for stage, fn, outcomes in build_stages(parent_a, parent_b, targets):
+            results[name][stage] = {**measure(fn, repeats), "outcomes": outcomes}
+            if log:
+                r = results[name][stage]
+                log(f"{name:<24} {stage:<20} {r['seconds'] * 1000:>10.3f} ms {r['peak_bytes'] / 1024:>10.1f} KB {outcomes:>8}")
+    return {
+        "meta": {
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "repeats": repeats,
+            "calibration_seconds": min(calibration, _calibrate()),
+        },
+        "results": results,
+    }
+
+def remeasure(report, keys, repeats=5):
+    # 对疑似回退的 (场景, 阶段) 重测, 保留更快的一次, 排除偶发的机器抖动
+    scenarios = {name: (a, b, t) for name, a, b, t in build_scenarios()}
+    for name in sorted({name for name, _ in keys}):
+        wanted = {stage for n, stage in keys if n == name}
+        for stage, fn, _ in build_stages(*scenarios[name]):
+            if stage not in wanted: continue
+            old = report["results"][name][stage]
+            new = measure(fn, repeats)
+            if new["seconds"] < old["seconds"]:
+                report["results"][name][stage] = {**old, "seconds": new["seconds"], "median_seconds": new["median_seconds"]}
+
+# ================= 3. 对比 =================
+def compare(baseline, current, time_threshold=0.25, memory_threshold=0.25, min_delta_seconds=0.0005,
+            min_delta_bytes=64 * 1024, normalize=False):
+    """返回 (回退列表 [((场景, 阶段), 说明)], 提示列表)。
+
+    耗时或峰值内存超过基线的 (1 + 阈值) 倍且绝对差超过噪声下限时记为回退;
+    结果数变化说明计算结果本身变了, 同样记为回退。
+    normalize 时按两次运行的校准负载耗时之比折算当前耗时, 抵消机器整体快慢的波动;
+    校准本身也有抖动, 默认不折算, 只在基线来自另一台机器时使用。
+    """
+    regressions, notes = [], []
+    scale = 1.0
+    base_cal, cur_cal = baseline["meta"].get("calibration_seconds"), current["meta"].get("calibration_seconds")
+    if normalize and base_cal and cur_cal:
+        scale = base_cal / cur_cal
+        notes.append(f"机器速度折算系数 {scale:.2f}")
+    for name, stages in baseline["results"].items():
+        if name not in current["results"]:
+            notes.append(f"{name}: 当前结果中缺少该场景")
+            continue
+        for stage, base in stages.items():
+            cur = current["results"][name].get(stage)
+            if cur is None:
+                notes.append(f"{name} {stage}: 当前结果中缺少该阶段")
+                continue
+            label = (name, stage)
+            cur = {**cur, "seconds": cur["seconds"] * scale}
+            if cur["outcomes"] != base["outcomes"]:
+                regressions.append((label, f"{name} {stage}: 结果数 {base['outcomes']} -> {cur['outcomes']}"))
+            if (cur["seconds"] > base["seconds"] * (1 + time_threshold)
+                    and cur["seconds"] - base["seconds"] > min_delta_seconds):
+                regressions.append((label, f"{name} {stage}: 耗时 {base['seconds'] * 1000:.3f} -> {cur['seconds'] * 1000:.3f} ms "
+                                   f"(+{(cur['seconds'] / base['seconds'] - 1) * 100:.0f}%)"))
+            if (cur["peak_bytes"] > base["peak_bytes"] * (1 + memory_threshold)
+                    and cur["peak_bytes"] - base["peak_bytes"] > min_delta_bytes):
+                regressions.append((label, f"{name} {stage}: 峰值内存 {base['peak_bytes'] / 1024:.1f} -> {cur['peak_bytes'] / 1024:.1f} KB "
+                                   f"(+{(cur['peak_bytes'] / base['peak_bytes'] - 1) * 100:.0f}%)"))
+    return regressions, notes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="遗传引擎基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="运行基准并写出 JSON")
+    run.add_argument("-o", "--output", default="bench_baseline.json")
+    cmp_ = sub.add_parser("compare", help="与基线对比, 出现回退时退出码为 1")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("--current", help="已有的当前结果 JSON; 不指定则现场运行")
+    cmp_.add_argument("--time-threshold", type=float, default=0.25, help="耗时允许增幅 (0.25 = 25%%)")
+    cmp_.add_argument("--memory-threshold", type=float, default=0.25, help="峰值内存允许增幅")
+    cmp_.add_argument("--min-delta-ms", type=float, default=0.5, help="耗时绝对差低于此值视为噪声")
+    cmp_.add_argument("--normalize", action="store_true", help="按校准负载折算机器速度 (基线来自另一台机器时使用)")
+    cmp_.add_argument("--retries", type=int, default=2, help="现场运行时对疑似回退的重测次数")
+    for p in (run, cmp_):
+        p.add_argument("--repeats", type=int, default=5)
+        p.add_argument("--filter", help="只运行名称包含该字符串的场景")
+    args = parser.parse_args(argv)
+
+    log = lambda msg: print(msg, file=sys.stderr)
+    if args.command == "run":
+        report = run_suite(args.repeats, args.filter, log)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        log(f"已写入 {args.output}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args.repeats, args.filter, log)
+    if args.filter:
+        baseline["results"] = {k: v for k, v in baseline["results"].items() if args.filter in k}
+    def check():
+        return compare(baseline, current, args.time_threshold, args.memory_threshold, args.min_delta_ms / 1000,
+                       normalize=args.normalize)
+    regressions, notes = check()
+    for _ in range(0 if args.current else args.retries):
+        if not regressions: break
+        log(f"重测 {len(regressions)} 处疑似回退...")
+        remeasure(current, [key for key, _ in regressions], args.repeats)
+        regressions, notes = check()
+    for note in notes: log(f"提示: {note}")
+    for _, message in regressions: print(f"回退: {message}")
+    print(f"{len(regressions)} 处回退" if regressions else "未发现回退")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""命令行批量模式: 读取配对文件, 按批流式输出评估结果, 无需启动 Streamlit。
+
+用法:
+    python cli.py pairings.jsonl -o results.csv --targets Clown,Pied --workers 4
+
+输入 (每行一个配对, 按扩展名识别格式, 也可用 --input-format 指定):
+    JSONL: {"id": "p1", "parent_a": {"Clown": 1}, "parent_b": {"Clown": 2, "Pied": 1}}
+    CSV:   id,parent_a,parent_b  其中基因型写作 "Clown=1;Pied=2"
+输出: CSV / JSONL / Parquet (Parquet 需要 pyarrow)。
+输入逐行读取、按 --batch-size 分批计算并立即写出, 内存占用与文件大小无关。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from genetics import GENE_DB, validate_genotype
+from batch import evaluate_report
+
+RESULT_COLUMNS = ["id", "完美成体概率", "项目个体概率", "成体/超级体概率", "致死风险概率", "结果数", "风险提示", "高概率结果", "错误"]
+FORMATS = ("csv", "jsonl", "parquet")
+
+def parse_score(gene_id, value):
+    # 只接受恰好为 0 / 1 / 2 的整数: bool、带小数部分的数与非整数文本一律拒绝, 不做截断
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value not in (0, 1, 2):
+        raise ValueError(f"基因分值只能为 0 / 1 / 2: {gene_id}={value!r}")
+    return value
+
+def parse_genotype(value):
+    """解析基因型: dict 或 "Clown=1;Pied=2" 形式的字符串。"""
+    if isinstance(value, dict):
+        genotype = {str(k): v for k, v in value.items()}
+    else:
+        genotype = {}
+        for part in str(value or "").split(";"):
+            if not part.strip(): continue
+            gene, _, score = part.partition("=")
+            genotype[gene.strip()] = score
+    unknown = [gid for gid in genotype if gid not in GENE_DB]
+    if unknown:
+        raise ValueError(f"未知基因: {', '.join(unknown)}")
+    genotype = {gid: parse_score(gid, score) for gid, score in genotype.items()}
+    errors = validate_genotype(genotype)
+    if errors:
+        raise ValueError("; ".join(errors))
+    return genotype
+
+def iter_pairings(path, input_format):
+    # 逐行产出 (id, parent_a 原始值, parent_b 原始值, 错误); 无法解析的行以行号为 id, 错误写入结果, 不中断整批
+    with open(path, newline="", encoding="utf-8") as f:
+        if input_format == "jsonl":
+            for line_no, line in enumerate(f, 1):
+                if not line.strip(): continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield str(line_no), None, None, f"第 {line_no} 行不是有效的 JSON: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield str(line_no), None, None, f"第 {line_no} 行须为 JSON 对象"
+                    continue
+                yield str(record.get("id", line_no)), record.get("parent_a"), record.get("parent_b"), None
+        else:
+            # 行号按文件计 (表头为第 1 行, 引号内换行的记录取其末行), 与 JSONL 一致
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield str(record.get("id") or reader.line_num), record.get("parent_a"), record.get("parent_b"), None
+
+def evaluate_record(pair_id, raw_a, raw_b, targets=(), top=3, error=None):
+    row = dict.fromkeys(RESULT_COLUMNS)
+    row["id"] = pair_id
+    if error is not None:
+        row["错误"] = error
+        return row
+    try:
+        parent_a, parent_b = parse_genotype(raw_a), parse_genotype(raw_b)
+    except (ValueError, TypeError) as e:
+        row["错误"] = str(e)
+        return row
+    report = evaluate_report(parent_a, parent_b, targets, top)
+    row["完美成体概率"], row["项目个体概率"], row["成体/超级体概率"], row["致死风险概率"] = report[:4]
+    row["结果数"] = report.outcome_count
+    row["风险提示"] = " | ".join(f"{r.message} ({r.probability * 100:.1f}%)" for r in report.risks)
+    if top:
+        row["高概率结果"] = " | ".join(f"{label} ({p * 100:.1f}%)" for label, p, _ in report.outcomes)
+    return row
+
+def _evaluate_batch(records, targets, top):
+    return [evaluate_record(pair_id, raw_a, raw_b, targets, top, error) for pair_id, raw_a, raw_b, error in records]
+
+def _iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+def iter_results(pairings, targets=(), top=3, batch_size=1000, workers=1):
+    """按输入顺序逐批产出结果行; workers > 1 时用进程池, 在途批次数限制为 2 × workers。"""
+    batches = _iter_batches(pairings, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            yield _evaluate_batch(batch, targets, top)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for batch in batches:
+            window.append(pool.submit(_evaluate_batch, batch, targets, top))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+class _CsvWriter:
+    def __init__(self, f):
+        self._writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        self._writer.writeheader()
+
+    def write_batch(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        pass
+
+class _JsonlWriter:
+    def __init__(self, f):
+        self._f = f
+
+    def write_batch(self, rows):
+        self._f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    def close(self):
+        pass
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("输出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        self._pa = pa
+        self._schema = pa.schema([
+            ("id", pa.string()),
+            *[(c, pa.float64()) for c in RESULT_COLUMNS[1:5]],
+            ("结果数", pa.int64()),
+            *[(c, pa.string()) for c in RESULT_COLUMNS[6:]],
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write_batch(self, rows):
+        # 每批写成一个 row group
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def _detect_format(path, default):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"csv": "csv", "jsonl": "jsonl", "json": "jsonl", "parquet": "parquet"}.get(ext, default)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="球蟒配对批量评估 (无界面)")
+    parser.add_argument("input", help="配对文件 (CSV / JSONL)")
+    parser.add_argument("-o", "--output", default="-", help="输出文件, 默认标准输出")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"))
+    parser.add_argument("--format", choices=FORMATS, help="输出格式, 默认按输出扩展名识别")
+    parser.add_argument("--targets", default="", help="目标组合, 逗号分隔, 如 Clown,Pied")
+    parser.add_argument("--top", type=int, default=3, help="每个配对列出的高概率结果数, 0 为不列出")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or _detect_format(args.input, "csv")
+    output_format = args.format or ("csv" if args.output == "-" else _detect_format(args.output, "csv"))
+    targets = tuple(t.strip() for t in args.targets.split(",") if t.strip())
+    unknown = [t for t in targets if t not in GENE_DB]
+    if unknown:
+        parser.error(f"未知目标基因: {', '.join(unknown)}")
+    if output_format == "parquet" and args.output == "-":
+        parser.error("Parquet 输出需要指定 -o 文件路径")
+
+    if output_format == "parquet":
+        f, writer = None, _ParquetWriter(args.output)
+    else:
+        f = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+        writer = _CsvWriter(f) if output_format == "csv" else _JsonlWriter(f)
+    try:
+        pairings = iter_pairings(args.input, input_format)
+        for rows in iter_results(pairings, targets, args.top, args.batch_size, args.workers):
+            writer.write_batch(rows)
+    finally:
+        writer.close()
+        if f is not None and f is not sys.stdout: f.close()
+
+if __name__ == "__main__":
+    main()
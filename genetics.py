@@ -0,0 +1,734 @@
+"""球蟒遗传计算核心 (无 Streamlit 依赖, 可被页面、批量任务与工作进程直接导入)。"""
+import importlib
+import itertools
+import heapq
+import sys
+import threading
+from collections import defaultdict, namedtuple, OrderedDict
+from fractions import Fraction
+from functools import lru_cache
+
+from profiling import NULL_PROFILER
+
+class _LazyModule:
+    """首次访问属性时才导入模块, 让只用位点分布的脚本/工作进程免去 numpy / pandas 的导入开销。"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name):
+    return _LazyModule(name)
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# ================= 1. 核心数据库 =================
+GENE_DB = {
+    # --- 1. 显性/不完全显性 ---
+    # [BEL Complex]
+    "Mojave": {"cn": "莫哈维", "type": "显性", "group": "BEL"},
+    "Lesser": {"cn": "白金", "type": "显性", "group": "BEL"},
+    "Butter": {"cn": "黄油", "type": "显性", "group": "BEL"},
+    "Bamboo": {"cn": "竹子", "type": "显性", "group": "BEL"},
+    "Russo": {"cn": "卢瑟", "type": "显性", "group": "BEL"},
+    "Phantom": {"cn": "幻影", "type": "显性", "group": "BEL"},
+    "Mystic": {"cn": "神秘", "type": "显性", "group": "BEL"},
+    "Special": {"cn": "特别", "type": "显性", "group": "BEL"},
+    "Mocha": {"cn": "摩卡", "type": "显性", "group": "BEL"},
+
+    # [ALS Complex]
+    "Black Pastel": {"cn": "黑蜡笔", "type": "显性", "group": "ALS"},
+    "Cinnamon": {"cn": "肉桂", "type": "显性", "group": "ALS"},
+    "Het Red Axanthic": {"cn": "HRA (红缺黄)", "type": "显性", "group": "ALS"},
+
+    # [Yellow Belly Complex]
+    "Yellow Belly": {"cn": "黄腹", "type": "显性", "group": "YB"},
+    "Asphalt": {"cn": "沥青", "type": "显性", "group": "YB"},
+    "Gravel": {"cn": "碎石", "type": "显性", "group": "YB"},
+    "Spark": {"cn": "火花", "type": "显性", "group": "YB"},
+    "Specter": {"cn": "幽灵(Specter)", "type": "显性", "group": "YB"},
+
+    # [Spider Complex]
+    "Spider": {"cn": "蜘蛛", "type": "显性", "group": "Spider"},
+    "Spotnose": {"cn": "斑鼻", "type": "显性", "group": "Spider"},
+    "Woma": {"cn": "沃玛", "type": "显性", "group": "Spider"},
+    "Hidden Gene Woma": {"cn": "HGW (隐沃玛)", "type": "显性", "group": "Spider"},
+    "Champagne": {"cn": "香槟", "type": "显性", "group": "Spider"},
+
+    # [Acid Complex]
+    "Acid": {"cn": "酸 (Acid)", "type": "显性", "group": "Acid"},
+    "Confusion": {"cn": "困惑 (Confusion)", "type": "显性", "group": "Acid"},
+
+    # [High-End / Hype]
+    "Stranger": {"cn": "陌客 (Stranger)", "type": "显性"},
+    "Mahogany": {"cn": "红木", "type": "显性"},
+    "Red Stripe": {"cn": "红条", "type": "显性"},
+    "Bongo": {"cn": "邦戈 (Bongo)", "type": "显性"},
+    "Cypress": {"cn": "柏树", "type": "显性"},
+    "Leopard": {"cn": "豹纹", "type": "显性"},
+    "Blackhead": {"cn": "黑头", "type": "显性"},
+    "Enchi": {"cn": "安奇", "type": "显性"},
+    "Orange Dream": {"cn": "橙梦 (OD)", "type": "显性"},
+    "Fire": {"cn": "火", "type": "显性"},
+    "Vanilla": {"cn": "香草", "type": "显性"},
+    "Disco": {"cn": "迪斯科", "type": "显性"},
+    "Thunder": {"cn": "雷电", "type": "显性"},
+    "Banana": {"cn": "香蕉", "type": "显性"},
+    "Pastel": {"cn": "蜡笔", "type": "显性"},
+    "Pinstripe": {"cn": "细纹", "type": "显性"},
+    "GHI": {"cn": "GHI", "type": "显性"},
+    "Blade": {"cn": "刀锋", "type": "显性"},
+
+    # --- 2. 隐性 ---
+    "Clown": {"cn": "小丑", "type": "隐性"},
+    "Pied": {"cn": "派 (Piebald)", "type": "隐性"},
+    "Desert Ghost": {"cn": "沙幽 (DG)", "type": "隐性"},
+    "Sunset": {"cn": "日落 (Sunset)", "type": "隐性"},
+    "Monsoon": {"cn": "季风 (Monsoon)", "type": "隐性"},
+    "Puzzle": {"cn": "拼图 (Puzzle)", "type": "隐性"},
+    "Tri-Stripe": {"cn": "三条纹", "type": "隐性"},
+    "Ultramel": {"cn": "超焦 (Ultramel)", "type": "隐性"},
+    "Lavender Albino": {"cn": "薰衣草白化", "type": "隐性"},
+    "Albino": {"cn": "白化", "type": "隐性"},
+    "Axanthic (VPI)": {"cn": "缺黄 (VPI)", "type": "隐性"},
+    "Axanthic (TSK)": {"cn": "缺黄 (TSK)", "type": "隐性"},
+    "Ghost": {"cn": "幽灵/衰退 (Hypo)", "type": "隐性"},
+    "Genetic Stripe": {"cn": "遗传直线", "type": "隐性"},
+    "Toy": {"cn": "玩具 (Toy)", "type": "隐性"},
+}
+
+# 映射表
+NAME_TO_ID_MAP = {}
+for k, v in GENE_DB.items():
+    display_name = f"{k} ({v['cn']})"
+    NAME_TO_ID_MAP[display_name] = k
+
+RISK_DB = {
+    "Black Pastel": {2: "风险提示: Super Black Pastel 极易出现脊柱弯曲 (Kinking) 和鸭嘴畸形。"},
+    "Cinnamon": {2: "风险提示: Super Cinnamon 极易出现脊柱弯曲 (Kinking) 和鸭嘴畸形。"},
+    "Spider": {1: "注意: 蜘蛛基因携带神经系统问题 (Wobble)。", 2: "致死风险: Super Spider 为致死基因。"},
+    "Woma": {1: "注意: 沃玛基因可能携带神经问题 (Wobble)。", 2: "致死风险: Super Woma 通常无法存活。"},
+    "Hidden Gene Woma": {1: "注意: HGW 基因可能携带神经问题。", 2: "致死风险: Super HGW 为致死基因。"},
+    "Champagne": {2: "致死风险: Super Champagne 为致死基因。"},
+    "Spotnose": {2: "风险: Super Spotnose (Powerball) 可能伴随严重神经问题。"},
+    "GHI": {2: "风险: Super GHI 生长缓慢且可能存在致死风险。"},
+}
+# 致死的 (基因, 分值): 蛋无法出壳, 计入致死概率; 必须是 RISK_DB 中的条目, 其余风险只提示
+LETHAL_RISKS = {("Spider", 2), ("Woma", 2), ("Hidden Gene Woma", 2), ("Champagne", 2)}
+
+# ================= 紧凑基因型编码 (Base-3 Packed Genotype) =================
+# 按 GENE_DB 的固定顺序, 每个基因占一位三进制数 (分值 0/1/2), 整条基因型编码为一个 Python int,
+# 作为缓存键、持久化与分享链接的规范形式 (0 分基因不影响编码, 与 dict 写法无关)。
+# 新基因只能追加在 GENE_DB 末尾, 否则已保存的编码会失效。
+GENE_ORDER = tuple(GENE_DB)
+GENE_INDEX = {gid: i for i, gid in enumerate(GENE_ORDER)}
+_POW3 = [3 ** i for i in range(len(GENE_ORDER))]
+_UINT64_DIGITS = 40  # 3^40 < 2^64, 前 40 个基因的编码可放进 uint64
+_TOKEN_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def encode_genotype(genotype_dict):
+    return sum(score * _POW3[GENE_INDEX[gid]] for gid, score in genotype_dict.items() if score)
+
+def decode_genotype(code, gene_ids=None):
+    # 默认只返回非零基因; 指定 gene_ids 时按其顺序返回 (含 0 分)
+    if code < 0 or code >= 3 ** len(GENE_ORDER):
+        raise ValueError(f"无效的基因型编码: {code}")
+    genotype = {}
+    i = 0
+    while code:
+        code, digit = divmod(code, 3)
+        if digit: genotype[GENE_ORDER[i]] = digit
+        i += 1
+    if gene_ids is not None:
+        return {gid: genotype.get(gid, 0) for gid in gene_ids}
+    return genotype
+
+def encode_table_rows(table):
+    # 结果表每行的编码 (向量化): 所有基因序号 < 40 时为 uint64 数组, 否则为 Python int 的 object 数组
+    idx = np.array([GENE_INDEX[gid] for gid in table.gene_ids], dtype=np.int64)
+    low = idx < _UINT64_DIGITS
+    low_weights = np.array([_POW3[i] for i in idx[low]], dtype=np.uint64)
+    codes = table.geno[:, low].astype(np.uint64) @ low_weights
+    if low.all(): return codes
+    high_weights = np.array([_POW3[i - _UINT64_DIGITS] for i in idx[~low]], dtype=np.uint64)
+    high = table.geno[:, ~low].astype(np.uint64) @ high_weights
+    shift = _POW3[_UINT64_DIGITS]
+    return np.array([lo + hi * shift for lo, hi in zip(codes.tolist(), high.tolist())], dtype=object)
+
+def code_to_token(code):
+    # base-36 短字符串, 用于 URL
+    if code == 0: return "0"
+    digits = []
+    while code:
+        code, d = divmod(code, 36)
+        digits.append(_TOKEN_DIGITS[d])
+    return "".join(reversed(digits))
+
+def token_to_code(token):
+    return int(token, 36)
+
+# ================= 2. 核心算法 =================
+
+def check_genetic_risks(df, active_gene_ids):
+    # 旧版接口: df 为 calculate_offspring 的 DataFrame (每个基因一列 + 概率)
+    warnings = set()
+    live = df['概率'] > 0
+    for gid in active_gene_ids:
+        if gid not in RISK_DB or gid not in df: continue
+        for score in df.loc[live, gid].unique().tolist():
+            if score in RISK_DB[gid]:
+                warnings.add(RISK_DB[gid][score])
+    return list(warnings)
+
+def check_table_risks(table, active_gene_ids):
+    # 同 check_genetic_risks, 直接在结果表 (OffspringTable) 上按列去重
+    warnings = set()
+    live = table.prob > 0
+    for gid in active_gene_ids:
+        if gid not in RISK_DB or gid not in table.gene_ids: continue
+        present = np.unique(table.geno[live, table.gene_ids.index(gid)])
+        for score in present.tolist():
+            if score in RISK_DB[gid]:
+                warnings.add(RISK_DB[gid][score])
+    return list(warnings)
+
+# 复合组规则 (按优先级): 同组基因分值之和 >= 2 即判定为该组合
+COMBO_RULES = [
+    ("BEL", "BEL (蓝眼白路复合组)"),
+    ("YB", "Ivory/Highway (黄腹复合组超级体)"),
+    ("ALS", "8-Ball Complex (ALS超级体 - 高风险)"),
+]
+
+def apply_combo_rules(active_genes_dict):
+    for group, combo_name in COMBO_RULES:
+        group_count = 0
+        for gid, score in active_genes_dict.items():
+            if score > 0 and GENE_DB.get(gid, {}).get("group") == group:
+                group_count += score
+        if group_count >= 2: return combo_name
+    return None
+
+# --- 核心修改：生成更智能的 MorphMarket 链接 ---
+def generate_mm_link(active_genes_dict):
+    search_terms = []
+    for gid, score in active_genes_dict.items():
+        if score == 0: continue
+        
+        # 获取基因类型 (显性/隐性)
+        gene_info = GENE_DB.get(gid, {})
+        g_type = gene_info.get("type", "显性")
+        
+        term = gid
+        # 显性处理
+        if "显性" in g_type:
+            if score == 2:
+                # 显性纯合 -> Super Gene
+                term = f"Super {gid}"
+            else:
+                # 显性杂合 -> Gene
+                term = gid
+        # 隐性处理
+        elif "隐性" in g_type:
+            if score == 1:
+                # 隐性杂合 -> Het Gene
+                term = f"Het {gid}"
+            else:
+                # 隐性纯合 -> Gene (Visual)
+                term = gid
+        
+        search_terms.append(term)
+
+    if not search_terms:
+        # 原色
+        return "https://www.morphmarket.com/us/c/reptiles/pythons/ball-pythons?trait_form=Normal"
+    
+    # 使用 'q' 参数进行关键词搜索，比 'genes' 参数更智能，能识别 "Super", "Het" 等修饰词
+    query_str = "+".join(search_terms)
+    return f"https://www.morphmarket.com/us/c/reptiles/pythons/ball-pythons?q={query_str}"
+
+# --- 位点模型 (Locus Model) ---
+# 同一复合组 (BEL / YB / ALS / Spider / Acid) 的基因是同一位点上的等位基因:
+# 每个个体在该位点只有两个等位基因槽, 如 Mojave + Lesser 即两个槽各占一个, 不存在四个等位基因的组合。
+# 无组别的基因各自为一个位点。位点状态用该位点各基因的分值 tuple 表示。
+def get_locus_id(gene_id):
+    return GENE_DB.get(gene_id, {}).get("group", gene_id)
+
+def group_loci(gene_ids):
+    # 按位点归并基因, 返回 [位点基因 tuple], 位点按首个基因名排序
+    loci = defaultdict(list)
+    for gid in sorted(gene_ids):
+        loci[get_locus_id(gid)].append(gid)
+    return sorted((tuple(ids) for ids in loci.values()), key=lambda ids: ids[0])
+
+def get_locus_alleles(genotype_dict, gene_ids):
+    # 个体在该位点的两个等位基因槽 (None 为野生型)
+    alleles = []
+    for gid in gene_ids:
+        alleles += [gid] * genotype_dict.get(gid, 0)
+    if len(alleles) > 2:
+        raise ValueError(f"{get_locus_id(gene_ids[0])} 复合组为同一位点, 最多只能携带两个等位基因: {' + '.join(alleles)}")
+    return tuple(alleles) + (None,) * (2 - len(alleles))
+
+def validate_genotype(genotype_dict):
+    # 返回错误信息列表, 空列表表示基因型合法
+    errors = []
+    for gene_ids in group_loci(genotype_dict):
+        try:
+            get_locus_alleles(genotype_dict, gene_ids)
+        except ValueError as e:
+            errors.append(str(e))
+    return errors
+
+def get_gametes(genotype_dict):
+    locus_options = []
+    for gene_ids in group_loci(genotype_dict):
+        options = []
+        for allele in get_locus_alleles(genotype_dict, gene_ids):
+            option = tuple((gid, int(allele == gid)) for gid in gene_ids)
+            if option not in options: options.append(option)
+        locus_options.append(options)
+    return [tuple(sorted(itertools.chain(*combo))) for combo in itertools.product(*locus_options)]
+
+# --- 逐位点分解计算 (Per-Locus Factorized Engine) ---
+# 各位点独立遗传: 先算每个位点的后代分布, 再做乘积组合, 避免 4^n 的配子交叉枚举。
+# 每个位点两亲各出一个等位基因, 概率均为 k/4, 用整数权重累乘, 分母为 4^位点数, 结果精确无浮点误差。
+# loci 格式: [(位点基因 tuple, {后代分值 tuple: 权重})]
+@lru_cache(maxsize=4096)
+def get_locus_offspring(gene_ids, alleles_a, alleles_b):
+    # 返回 {后代分值 tuple: 权重}, 权重之和为 4; 结果被缓存共享, 调用方不得修改
+    dist = defaultdict(int)
+    for a in alleles_a:
+        for b in alleles_b:
+            dist[tuple(int(a == gid) + int(b == gid) for gid in gene_ids)] += 1
+    return dict(dist)
+
+def get_locus_distributions(parent_a_geno, parent_b_geno):
+    loci = []
+    for gene_ids in group_loci(set(parent_a_geno) | set(parent_b_geno)):
+        alleles_a = get_locus_alleles(parent_a_geno, gene_ids)
+        alleles_b = get_locus_alleles(parent_b_geno, gene_ids)
+        loci.append((gene_ids, get_locus_offspring(gene_ids, alleles_a, alleles_b)))
+    return loci
+
+def get_loci_gene_ids(loci):
+    return tuple(gid for gene_ids, _ in loci for gid in gene_ids)
+
+def enumerate_offspring_weights(parent_a_geno, parent_b_geno):
+    # 返回 ([(genotype_tuple, 权重)], 分母), genotype_tuple 为按基因名排序的 (基因, 分值) 对
+    loci = get_locus_distributions(parent_a_geno, parent_b_geno)
+    outcomes = [((), 1)]
+    for gene_ids, dist in loci:
+        items = sorted(dist.items())
+        outcomes = [(geno + tuple(zip(gene_ids, s)), w * c) for geno, w in outcomes for s, c in items]
+    return [(tuple(sorted(geno)), w) for geno, w in outcomes], 4 ** len(loci)
+
+def calculate_offspring_exact(parent_a_geno, parent_b_geno):
+    # 精确分数概率: [(genotype_tuple, Fraction)]
+    outcomes, total = enumerate_offspring_weights(parent_a_geno, parent_b_geno)
+    return [(geno, Fraction(w, total)) for geno, w in outcomes]
+
+# --- 列式结果表 (Columnar Outcome Table) ---
+# geno: (结果数 × 基因数) int8 矩阵, prob: 概率向量 (0~1), 按 概率/基因数 降序排列。
+# KPI、分层筛选等统计均在矩阵上向量化完成, 文字标签只为实际展示的行生成。
+OffspringTable = namedtuple("OffspringTable", ["gene_ids", "geno", "prob"])
+
+def calculate_offspring_table(parent_a_geno, parent_b_geno):
+    return build_full_table(get_locus_distributions(parent_a_geno, parent_b_geno))
+
+def build_full_table(loci):
+    # 各位点分布的完整乘积 (向量化), 按 概率/基因数 降序
+    gene_ids = get_loci_gene_ids(loci)
+    geno = np.zeros((1, len(gene_ids)), dtype=np.int8)
+    prob = np.ones(1)
+    col = 0
+    for ids, dist in loci:
+        states = sorted(dist)
+        n = len(prob)
+        geno = np.repeat(geno, len(states), axis=0)
+        geno[:, col:col + len(ids)] = np.tile(np.array(states, dtype=np.int8), (n, 1))
+        prob = np.outer(prob, np.array([dist[s] for s in states]) / 4).ravel()
+        col += len(ids)
+    order = np.lexsort((-get_gene_counts(geno), -prob))
+    return OffspringTable(gene_ids, geno[order], prob[order])
+
+def get_gene_counts(geno):
+    return (geno > 0).sum(axis=1)
+
+def get_row_geno(table, row_idx):
+    return dict(zip(table.gene_ids, table.geno[row_idx].tolist()))
+
+def offspring_table_to_frame(table):
+    # 旧版 DataFrame 格式 (每个基因一列 + 概率 + _geno_code + _gene_count); _geno_code 为紧凑基因型编码
+    df = pd.DataFrame(table.geno.astype(int), columns=list(table.gene_ids))
+    df['概率'] = table.prob * 100
+    df['_geno_code'] = encode_table_rows(table)
+    df['_gene_count'] = get_gene_counts(table.geno)
+    return df
+
+def calculate_offspring(parent_a_geno, parent_b_geno):
+    return offspring_table_to_frame(calculate_offspring_table(parent_a_geno, parent_b_geno))
+
+def _is_recessive(gene_id):
+    return "隐性" in GENE_DB.get(gene_id, {}).get("type", "显性")
+
+def get_target_min_score(gene_id, mode="strict"):
+    # 目标命中所需的最低分值: 严格模式下隐性需 2 (Visual), 其余 >= 1
+    return 2 if mode == "strict" and _is_recessive(gene_id) else 1
+
+def get_combo_codes(table):
+    # 0 = 无组合, i+1 = COMBO_RULES[i]; 与 apply_combo_rules 的优先级一致
+    codes = np.zeros(table.geno.shape[0], dtype=np.int8)
+    for i in reversed(range(len(COMBO_RULES))):
+        group = COMBO_RULES[i][0]
+        cols = [j for j, gid in enumerate(table.gene_ids) if GENE_DB.get(gid, {}).get("group") == group]
+        if cols:
+            codes[table.geno[:, cols].sum(axis=1) >= 2] = i + 1
+    return codes
+
+def get_visual_mask(table, combo_codes=None):
+    # 等价于旧版在 表现型_Full 上 str.contains("BEL" / "Super" / "Visual")
+    if combo_codes is None: combo_codes = get_combo_codes(table)
+    bel_code = [group for group, _ in COMBO_RULES].index("BEL") + 1
+    return (table.geno == 2).any(axis=1) | (combo_codes == bel_code)
+
+def check_combo_hit(row_geno, targets, mode="strict"):
+    for t in targets:
+        val = row_geno.get(t, 0)
+        if val == 0: return False
+        g_type = GENE_DB.get(t, {}).get("type", "显性")
+        if mode == "strict":
+            # 严格模式：隐性必须2，显性必须>=1 (含2)
+            if "隐性" in g_type and val < 2: return False
+    return True
+
+def get_combo_hit_mask(table, targets, mode="strict"):
+    # check_combo_hit 的向量化版本
+    mask = np.ones(table.geno.shape[0], dtype=bool)
+    for t in targets:
+        if t not in table.gene_ids: return np.zeros(table.geno.shape[0], dtype=bool)
+        min_score = get_target_min_score(t, mode)
+        mask &= table.geno[:, table.gene_ids.index(t)] >= min_score
+    return mask
+
+def _gene_label(gene_id, val):
+    gene_info = GENE_DB.get(gene_id, {"type": "隐性"})
+    prefix = ""
+    suffix = ""
+    
+    if "隐性" in gene_info["type"]:
+        if val == 2: suffix = "(Visual)" 
+        else: suffix = "(Het)"
+    else: # 显性
+        if val == 2: prefix = "[Super]"
+        
+    label = f"{prefix} {gene_id} {suffix}"
+    return label.strip()
+
+def format_label_with_combo(row, active_gene_ids, simplified=False):
+    # 旧版 DataFrame 行 (含 _geno_code) 的标签
+    return format_genotype_label(decode_genotype(int(row['_geno_code'])), active_gene_ids, simplified)
+
+def format_genotype_label(geno_dict, active_gene_ids, simplified=False):
+    combo_name = apply_combo_rules(geno_dict)
+    
+    if simplified:
+        if combo_name: return f"{combo_name} (All Variants)"
+    
+    parts = []
+    for gene_id in active_gene_ids:
+        val = geno_dict.get(gene_id, 0)
+        if val == 0: continue
+        parts.append(_gene_label(gene_id, val))
+        
+    base_label = " + ".join(parts) if parts else "Wild Type (原色)"
+    
+    if combo_name: 
+        return f"{combo_name} >>> {base_label}"
+    return base_label
+
+def format_outcome_labels(table, rows, active_gene_ids, simplified=False, combo_codes=None):
+    # 只为 rows 指定的行生成标签 (与 format_label_with_combo 输出一致)
+    if combo_codes is None: combo_codes = get_combo_codes(table)
+    cols = [(table.gene_ids.index(gid), {1: _gene_label(gid, 1), 2: _gene_label(gid, 2)})
+            for gid in active_gene_ids if gid in table.gene_ids]
+    labels = []
+    for r in rows:
+        combo_code = int(combo_codes[r])
+        combo_name = COMBO_RULES[combo_code - 1][1] if combo_code else None
+        if simplified and combo_name:
+            labels.append(f"{combo_name} (All Variants)")
+            continue
+        row = table.geno[r]
+        parts = [tokens[int(row[j])] for j, tokens in cols if row[j] > 0]
+        base_label = " + ".join(parts) if parts else "Wild Type (原色)"
+        labels.append(f"{combo_name} >>> {base_label}" if combo_name else base_label)
+    return labels
+
+def generate_mm_links(table, rows):
+    return [generate_mm_link(get_row_geno(table, r)) for r in rows]
+
+# --- 按概率从高到低惰性枚举 (Top-K / 概率覆盖截断) ---
+# 大项目的结果数随位点数指数增长, 全部枚举既看不完也算不动。
+# 用优先队列在各位点分布 (按概率降序) 的乘积空间上做 best-first 扩展,
+# 只生成真正需要展示的结果, 剩余概率归入「其他」。
+FULL_ENUM_LIMIT = 50000  # 结果数超过此值时切换为 Top-K 模式
+TOP_K_OUTCOMES = 2000
+OTHER_LABEL = "其他 (低概率结果合计)"
+
+def count_offspring_outcomes(loci):
+    n = 1
+    for _, dist in loci: n *= len(dist)
+    return n
+
+def _iter_locus_weights(loci):
+    # 产出 (展开后的各基因分值 tuple, 整数权重), 权重降序; 分母为 4^位点数
+    options = [sorted(dist.items(), key=lambda x: (-x[1], [-s for s in x[0]])) for _, dist in loci]
+    n = len(options)
+    start = (0,) * n
+    start_w = 1
+    for opts in options: start_w *= opts[0][1]
+    # 每个状态只由「最后一个非零坐标减一」的父状态生成, 保证不重复
+    heap = [(-start_w, start, 0)]
+    while heap:
+        neg_w, state, last = heapq.heappop(heap)
+        yield tuple(s for j, i in enumerate(state) for s in options[j][i][0]), -neg_w
+        for j in range(last, n):
+            i = state[j]
+            if i + 1 < len(options[j]):
+                child_w = (-neg_w) // options[j][i][1] * options[j][i + 1][1]
+                heapq.heappush(heap, (-child_w, state[:j] + (i + 1,) + state[j + 1:], j))
+
+def iter_offspring_by_probability(parent_a_geno, parent_b_geno):
+    # 生成器: 按概率从高到低产出 (genotype_tuple, 概率 0~1)
+    loci = get_locus_distributions(parent_a_geno, parent_b_geno)
+    gene_ids = get_loci_gene_ids(loci)
+    total = 4 ** len(loci)
+    for scores, weight in _iter_locus_weights(loci):
+        yield tuple(sorted(zip(gene_ids, scores))), weight / total
+
+def calculate_offspring_top(parent_a_geno, parent_b_geno, top_k=None, mass=None):
+    # 取概率最高的 top_k 个结果, 或累计概率达到 mass (0~1) 即停止
+    # 返回 (OffspringTable, 剩余「其他」概率)
+    return build_top_table(get_locus_distributions(parent_a_geno, parent_b_geno), top_k, mass)
+
+def build_top_table(loci, top_k=None, mass=None):
+    # 在任意位点分布 (基因型或表现型) 上做 best-first 截断; 都不指定时返回全部结果
+    total = 4 ** len(loci)
+    rows, weights = [], []
+    covered = 0
+    for scores, weight in _iter_locus_weights(loci):
+        if top_k is not None and len(rows) >= top_k: break
+        rows.append(scores)
+        weights.append(weight)
+        covered += weight
+        if mass is not None and covered >= mass * total: break
+    gene_ids = get_loci_gene_ids(loci)
+    geno = np.array(rows, dtype=np.int8).reshape(len(rows), len(gene_ids))
+    prob = np.array(weights, dtype=float) / total
+    order = np.lexsort((-get_gene_counts(geno), -prob))
+    table = OffspringTable(gene_ids, geno[order], prob[order])
+    return table, (total - covered) / total
+
+# --- 表现型模式 (Visual Phenotype) ---
+# 买家看不出隐性 Het: 在每个位点上把隐性分值 1 并入 0, 得到各位点的表现型分布, 再做乘积组合。
+# 显性基因保留 单显 / 超级 之分, 复合组位点保留等位基因组合 (组合名由 get_combo_codes 给出)。
+# 直接由各位点分布计算, 不先枚举基因型; 结果表与基因型模式同格式, 标签/链接/档位函数通用。
+def get_phenotype_scores(gene_ids, scores):
+    return tuple(0 if s == 1 and _is_recessive(gid) else s for gid, s in zip(gene_ids, scores))
+
+def get_locus_phenotypes(loci):
+    phenotype_loci = []
+    for gene_ids, dist in loci:
+        merged = defaultdict(int)
+        for scores, weight in dist.items():
+            merged[get_phenotype_scores(gene_ids, scores)] += weight
+        phenotype_loci.append((gene_ids, dict(merged)))
+    return phenotype_loci
+
+def calculate_phenotype_for_display(parent_a_geno, parent_b_geno):
+    # 返回 (基因型 loci, 表现型结果表, other_prob); loci 仍为基因型分布, 供 KPI 边际统计使用
+    loci = get_locus_distributions(parent_a_geno, parent_b_geno)
+    phenotype_loci = get_locus_phenotypes(loci)
+    if count_offspring_outcomes(phenotype_loci) > FULL_ENUM_LIMIT:
+        table, other_prob = build_top_table(phenotype_loci, top_k=TOP_K_OUTCOMES)
+        return loci, table, other_prob
+    return loci, build_full_table(phenotype_loci), 0.0
+
+def calculate_offspring_for_display(parent_a_geno, parent_b_geno):
+    # 页面使用: 结果数可控时全量计算, 否则走 Top-K; 返回 (loci, table, other_prob)
+    loci = get_locus_distributions(parent_a_geno, parent_b_geno)
+    if count_offspring_outcomes(loci) > FULL_ENUM_LIMIT:
+        table, other_prob = calculate_offspring_top(parent_a_geno, parent_b_geno, top_k=TOP_K_OUTCOMES)
+        return loci, table, other_prob
+    return loci, calculate_offspring_table(parent_a_geno, parent_b_geno), 0.0
+
+# --- 基于位点分布的精确统计 (不依赖结果表是否被截断) ---
+# 风险只取决于单个基因的分值, 因此直接由该基因所在位点的分布求出现概率, 与结果表大小无关
+RiskProbability = namedtuple("RiskProbability", ["gene_id", "score", "message", "probability", "lethal"])
+
+def get_risk_probabilities(loci, active_gene_ids=None):
+    # 每条 RISK_DB 风险在后代中出现的概率 (0~1), 按概率降序; active_gene_ids 为 None 时不过滤
+    active = None if active_gene_ids is None else set(active_gene_ids)
+    risks = []
+    for gene_ids, dist in loci:
+        for k, gid in enumerate(gene_ids):
+            if gid not in RISK_DB or (active is not None and gid not in active): continue
+            for score, message in RISK_DB[gid].items():
+                weight = sum(c for s, c in dist.items() if s[k] == score)
+                if weight:
+                    risks.append(RiskProbability(gid, score, message, weight / 4, (gid, score) in LETHAL_RISKS))
+    return sorted(risks, key=lambda r: (-r.probability, r.gene_id, r.score))
+
+def check_locus_risks(loci, active_gene_ids):
+    return [r.message for r in get_risk_probabilities(loci, active_gene_ids)]
+
+def get_combo_hit_probability(loci, targets, mode="strict"):
+    required = {t: get_target_min_score(t, mode) for t in targets}
+    if not required.keys() <= set(get_loci_gene_ids(loci)): return 0.0
+    p = 1.0
+    for gene_ids, dist in loci:
+        checks = [(k, required[gid]) for k, gid in enumerate(gene_ids) if gid in required]
+        if not checks: continue
+        p *= sum(c for s, c in dist.items() if all(s[k] >= m for k, m in checks)) / 4
+    return p
+
+def get_visual_probability(loci):
+    # 1 - P(没有任何分值 2 且 BEL 组分值之和 < 2), 与 get_visual_mask 口径一致
+    # BEL 组基因同属一个位点, 因此可逐位点独立相乘
+    p_plain = 1.0
+    for gene_ids, dist in loci:
+        bel = [k for k, gid in enumerate(gene_ids) if GENE_DB.get(gid, {}).get("group") == "BEL"]
+        p_plain *= sum(c for s, c in dist.items() if 2 not in s and sum(s[k] for k in bel) < 2) / 4
+    return 1 - p_plain
+
+def get_lethal_mask(table):
+    # 行级: 是否落在任一 RISK_DB 致死分值上 (与 get_lethal_probability 口径一致)
+    mask = np.zeros(table.geno.shape[0], dtype=bool)
+    for j, gid in enumerate(table.gene_ids):
+        lethal_scores = _get_lethal_scores(gid)
+        if lethal_scores:
+            mask |= np.isin(table.geno[:, j], lethal_scores)
+    return mask
+
+def _get_lethal_scores(gene_id):
+    return [s for s in RISK_DB.get(gene_id, {}) if (gene_id, s) in LETHAL_RISKS]
+
+def get_lethal_probability(loci):
+    # 任一基因落在 RISK_DB 致死分值上的概率 (各位点独立)
+    p_survive = 1.0
+    for gene_ids, dist in loci:
+        lethal = [(k, _get_lethal_scores(gid)) for k, gid in enumerate(gene_ids)]
+        p_survive *= 1 - sum(c for s, c in dist.items() if any(s[k] in scores for k, scores in lethal)) / 4
+    return 1 - p_survive
+
+# --- 进程级配对缓存 (Pairing Cache) ---
+# A×B 与 B×A 结果相同, 键为两条基因型规范编码排序后的组合 (再加上标签用的基因顺序)。
+# 结果表、风险提示与标签分阶段缓存; 按条目数与估算内存做 LRU 淘汰。
+# 链接不在缓存中: 只为页面上实际显示的行生成 (generate_mm_links)
+PairingResult = namedtuple("PairingResult", ["loci", "table", "other_prob", "risks", "combo_codes", "labels"])
+
+def get_genotype_key(genotype_dict):
+    return encode_genotype(genotype_dict)
+
+def get_pairing_key(parent_a_geno, parent_b_geno, active_gene_ids):
+    pair = tuple(sorted([get_genotype_key(parent_a_geno), get_genotype_key(parent_b_geno)]))
+    return pair, tuple(active_gene_ids)
+
+def compute_offspring_stage(parent_a_geno, parent_b_geno, phenotype=False):
+    # 阶段 1 (F1/F2 计算): 只依赖两条基因型; phenotype 时结果表按表现型汇总
+    calculate = calculate_phenotype_for_display if phenotype else calculate_offspring_for_display
+    loci, table, other_prob = calculate(parent_a_geno, parent_b_geno)
+    return loci, table, other_prob, get_combo_codes(table)
+
+def compute_label_stage(table, combo_codes, active_gene_ids):
+    # 阶段 3 (标签生成): 依赖结果表与标签用的基因顺序
+    all_rows = range(len(table.prob))
+    return np.array(format_outcome_labels(table, all_rows, active_gene_ids, combo_codes=combo_codes), dtype=object)
+
+def estimate_bytes(value):
+    if isinstance(value, np.ndarray):
+        n = value.nbytes
+        if value.dtype == object: n += sum(sys.getsizeof(v) for v in value)
+        return n
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class PairingCache:
+    """线程安全的 LRU 缓存, 同时限制条目数 (max_entries) 与估算内存 (max_bytes)。"""
+
+    def __init__(self, max_entries=1024, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes: return
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, old_bytes) = self._entries.popitem(last=False)
+                self.total_bytes -= old_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def get_cached_stage(cache, key, compute):
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.put(key, value, estimate_bytes(value))
+    return value
+
+def get_pairing_result(cache, parent_a_geno, parent_b_geno, active_gene_ids, profiler=NULL_PROFILER, phenotype=False):
+    # 各阶段按各自的输入分别缓存: 只改了标签基因顺序时不会重算结果表
+    pair, active_key = get_pairing_key(parent_a_geno, parent_b_geno, active_gene_ids)
+    view = "phenotype" if phenotype else "offspring"
+    with profiler.stage(view):
+        loci, table, other_prob, combo_codes = get_cached_stage(
+            cache, (view, pair), lambda: compute_offspring_stage(parent_a_geno, parent_b_geno, phenotype))
+    # 阶段 2 (风险筛查): [RiskProbability]
+    with profiler.stage("risks"):
+        risks = get_cached_stage(cache, ("risks", pair, active_key), lambda: get_risk_probabilities(loci, active_gene_ids))
+    with profiler.stage("labels"):
+        labels = get_cached_stage(
+            cache, ("labels", view, pair, active_key), lambda: compute_label_stage(table, combo_codes, active_gene_ids))
+    return PairingResult(loci, table, other_prob, risks, combo_codes, labels)
@@ -0,0 +1,102 @@
+"""F2 留种矩阵: 所有 F1 留种 × 所有配偶 一次算完, 给出每个组合的目标命中率。
+
+目标命中率只取决于条件涉及的位点, 因此留种按这些位点上的状态合并 (同一状态的 F1 结果命中率相同),
+每个合并状态与每个配偶只算一次; 各位点的 F2 分布由双亲在该位点的等位基因查表得到 (get_locus_offspring 缓存),
+在同一位点、同一状态上跨配偶、跨留种复用。状态较多时分块交给进程池。
+同窝互配的配偶为「同窝随机一条」: 各位点取同窝分布的加权混合, 与各位点独立的模型一致, 结果为精确值。
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from genetics import build_full_table, get_locus_alleles, get_locus_id, get_locus_offspring, group_loci, np
+from query import get_query_genes, get_query_probability
+
+SIBLING = "同窝互配"
+INLINE_STATE_LIMIT = 2000  # 留种状态 × 配偶数不超过此值时在当前进程计算
+
+# holdbacks: 条件相关位点上的留种状态表 (OffspringTable, prob 为该状态在本窝中的概率, 按概率降序)
+# partners: 配偶名 (列顺序); hits: 命中率矩阵 (状态数 × 配偶数)
+HoldbackMatrix = namedtuple("HoldbackMatrix", ["holdbacks", "partners", "hits"])
+
+def _align_loci(clutch_loci, partners, genes):
+    # 条件相关的位点; 位点的基因取本窝与各配偶携带的并集 (配偶可能带来本窝没有的基因 / 等位基因)
+    carried = {gid for ids, _ in clutch_loci for gid in ids}
+    carried |= {gid for geno in partners.values() for gid, s in geno.items() if s}
+    locus_ids = {get_locus_id(gid) for gid in genes}
+    clutch_dists = {get_locus_id(ids[0]): (ids, dist) for ids, dist in clutch_loci}
+    loci = []
+    for ids in group_loci(carried):
+        if get_locus_id(ids[0]) not in locus_ids: continue
+        own_ids, dist = clutch_dists.get(get_locus_id(ids[0]), ((), {(): 4}))
+        # 本窝分布换到并集基因上, 本窝没有的基因分值为 0
+        loci.append((ids, {tuple(dict(zip(own_ids, scores)).get(gid, 0) for gid in ids): c for scores, c in dist.items()}))
+    return loci
+
+def _state_alleles(gene_ids, scores):
+    return get_locus_alleles(dict(zip(gene_ids, scores)), gene_ids)
+
+def _sibling_dist(gene_ids, alleles, clutch_dist):
+    # 与同窝随机一条配对: 按同窝各状态的权重混合 F2 分布, 权重之和仍为 4
+    mixed = {}
+    for scores, weight in clutch_dist.items():
+        for child, c in get_locus_offspring(gene_ids, alleles, _state_alleles(gene_ids, scores)).items():
+            mixed[child] = mixed.get(child, 0) + weight * c / 4
+    return mixed
+
+def _evaluate_states(loci, states, partners, node, mode):
+    """states: [(每个位点的状态 tuple)]; partners: [(名称, 基因型 dict 或 SIBLING)]。返回 [[命中率]]。"""
+    partner_alleles = [None if geno == SIBLING else [get_locus_alleles(geno, ids) for ids, _ in loci]
+                       for _, geno in partners]
+    memo = {}  # (位点序号, 留种状态, 配偶在该位点的等位基因) -> F2 分布; 同窝互配的等位基因记为 True
+    rows = []
+    for state in states:
+        row = []
+        for alleles in partner_alleles:
+            f2_loci = []
+            for i, ((ids, dist), scores) in enumerate(zip(loci, state)):
+                key = (i, scores, alleles is None or alleles[i])
+                if key not in memo:
+                    own = _state_alleles(ids, scores)
+                    memo[key] = _sibling_dist(ids, own, dist) if alleles is None else get_locus_offspring(ids, own, alleles[i])
+                f2_loci.append((ids, memo[key]))
+            row.append(get_query_probability(node, f2_loci, mode))
+        rows.append(row)
+    return rows
+
+def compute_holdback_matrix(clutch_loci, partners, node, mode="strict", sibling=True, max_workers=None, chunk_size=256):
+    """clutch_loci: 一窝 F1 的位点分布; partners: {配偶名: 基因型}。
+
+    返回 HoldbackMatrix; sibling 为 True 时最后一列为同窝互配。max_workers=0 强制在当前进程计算。
+    """
+    loci = _align_loci(clutch_loci, partners, get_query_genes(node))
+    holdbacks = build_full_table(loci)
+    partner_items = list(partners.items()) + ([(SIBLING, SIBLING)] if sibling else [])
+    # 结果表的列按位点依次排列, 切回每个位点的状态 tuple
+    bounds = np.cumsum([0] + [len(ids) for ids, _ in loci])
+    states = [tuple(tuple(int(s) for s in row[bounds[i]:bounds[i + 1]]) for i in range(len(loci)))
+              for row in holdbacks.geno]
+
+    if max_workers is None and len(states) * len(partner_items) <= INLINE_STATE_LIMIT:
+        max_workers = 0
+    chunks = [states[i:i + chunk_size] for i in range(0, len(states), chunk_size)]
+    if max_workers == 0:
+        rows = [row for chunk in chunks for row in _evaluate_states(loci, chunk, partner_items, node, mode)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(_evaluate_states, loci, chunk, partner_items, node, mode) for chunk in chunks]
+            rows = [row for future in futures for row in future.result()]
+    hits = np.array(rows, dtype=float).reshape(len(states), len(partner_items))
+    return HoldbackMatrix(holdbacks, [name for name, _ in partner_items], hits)
+
+def expand_to_outcomes(matrix, table):
+    """把合并状态的命中率展开到完整 F1 结果表的每一行 (按条件相关基因的分值对应)。返回 (结果数 × 配偶数)。"""
+    holdbacks = matrix.holdbacks
+    if not holdbacks.gene_ids:
+        return np.broadcast_to(matrix.hits[0], (len(table.prob), len(matrix.partners)))
+    # 只由配偶带来的基因在 F1 中均为 0
+    keys = np.zeros((len(table.prob), len(holdbacks.gene_ids)), dtype=np.int8)
+    for k, gid in enumerate(holdbacks.gene_ids):
+        if gid in table.gene_ids: keys[:, k] = table.geno[:, table.gene_ids.index(gid)]
+    index = {tuple(row): i for i, row in enumerate(holdbacks.geno.tolist())}
+    return matrix.hits[[index[key] for key in map(tuple, keys.tolist())]]
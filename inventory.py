@@ -0,0 +1,244 @@
+"""本地动物库存 (SQLite): 个体、性别、基因型与窝系谱, 支持 CSV 批量导入和按基因条件筛选。
+
+用法:
+    python inventory.py import animals.csv            # 导入 / 更新 (按 id 覆盖)
+    python inventory.py find "Clown=1 AND Stranger" --sex F
+
+表结构:
+    animals      每条蛇一行; genotype 为基因型编码的 base-36 文本 (与分享链接同一编码), 父母与窝号为可选的系谱
+    animal_genes 每条蛇每个非零基因一行, 以 (gene_id, score, animal_id) 为主键, 按基因条件筛选时直接走索引
+筛选条件沿用目标查询语法 (见 query.py), 编译为 SQL 后由 SQLite 求值, 不逐条解码基因型。
+"""
+import argparse
+import sqlite3
+import threading
+from collections import namedtuple
+
+from genetics import GENE_DB, lazy_import, encode_genotype, decode_genotype, code_to_token, token_to_code, get_target_min_score, validate_genotype
+from query import GeneTerm, ComboTerm, NotTerm, AndTerm, OrTerm, opposite_mode, parse_query
+
+pd = lazy_import("pandas")
+
+DEFAULT_DB_PATH = "inventory.db"
+MALE, FEMALE = "M", "F"
+MALE_LABELS = {"m", "male", "公", "公蛇", "1.0"}
+FEMALE_LABELS = {"f", "female", "母", "母蛇", "0.1"}
+LINEAGE_COLUMNS = ("sire", "dam", "clutch")  # CSV 中可选的系谱列
+
+# sire / dam 为父母的 id (可不在库中), clutch 为窝号; 均可为 None
+Animal = namedtuple("Animal", ["id", "sex", "genotype", "sire", "dam", "clutch"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS animals (
+    id TEXT PRIMARY KEY,
+    sex TEXT NOT NULL CHECK (sex IN ('M', 'F')),
+    genotype TEXT NOT NULL,
+    sire TEXT,
+    dam TEXT,
+    clutch TEXT
+);
+CREATE INDEX IF NOT EXISTS animals_sex ON animals (sex);
+CREATE INDEX IF NOT EXISTS animals_parents ON animals (sire, dam);
+CREATE INDEX IF NOT EXISTS animals_dam ON animals (dam);
+CREATE INDEX IF NOT EXISTS animals_clutch ON animals (clutch);
+CREATE TABLE IF NOT EXISTS animal_genes (
+    gene_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    animal_id TEXT NOT NULL REFERENCES animals (id) ON DELETE CASCADE,
+    PRIMARY KEY (gene_id, score, animal_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS animal_genes_animal ON animal_genes (animal_id);
+"""
+
+def parse_sex(value):
+    sex = str(value).strip().lower()
+    if sex in MALE_LABELS: return MALE
+    if sex in FEMALE_LABELS: return FEMALE
+    raise ValueError(f"无法识别的性别: {value}")
+
+def read_animals_csv(path_or_buffer):
+    """读取动物表: 列为 id, sex, 若干基因列 (分值 0/1/2, 留空视为 0), 以及可选的 sire, dam, clutch。"""
+    df = pd.read_csv(path_or_buffer, dtype={c: str for c in ("id", "sex", *LINEAGE_COLUMNS)})
+    gene_cols = [c for c in df.columns if c in GENE_DB]
+    unknown = [c for c in df.columns if c not in GENE_DB and c not in ("id", "sex", *LINEAGE_COLUMNS)]
+    if unknown:
+        raise ValueError(f"未知基因列: {', '.join(unknown)}")
+    missing = [c for c in ("id", "sex") if c not in df.columns]
+    if missing:
+        raise ValueError(f"缺少列: {', '.join(missing)}")
+    # 行号按 CSV 文件计 (表头为第 1 行)
+    df["id"] = df["id"].str.strip()
+    blank = df.index[df["id"].isna() | (df["id"] == "")]
+    if len(blank):
+        raise ValueError(f"id 不能为空 (第 {', '.join(str(i + 2) for i in blank)} 行)")
+    duplicated = df.loc[df["id"].duplicated(), "id"].unique()
+    if len(duplicated):
+        raise ValueError(f"id 重复: {', '.join(duplicated)}")
+    raw = df[gene_cols].apply(pd.to_numeric, errors="coerce")
+    if (raw.isna() & df[gene_cols].notna()).any().any():
+        raise ValueError("基因分值必须为数字")
+    raw = raw.fillna(0)
+    if not raw.isin([0, 1, 2]).all().all():
+        raise ValueError("基因分值只能为 0 / 1 / 2")
+    scores = raw.astype(int)
+    lineage = [[None if pd.isna(v) else v.strip() for v in df[c]] if c in df else [None] * len(df) for c in LINEAGE_COLUMNS]
+    # 没有基因列时 to_dict("records") 为空列表, 按行数补空基因型, 否则 zip 会把所有行丢掉
+    genes = scores.to_dict("records") if gene_cols else [{}] * len(df)
+    animals = []
+    for animal_id, sex, row, sire, dam, clutch in zip(df["id"], df["sex"], genes, *lineage):
+        genotype = {gid: s for gid, s in row.items() if s}
+        errors = validate_genotype(genotype)
+        if errors:
+            raise ValueError(f"{animal_id}: {'; '.join(errors)}")
+        try:
+            sex = parse_sex(sex)
+        except ValueError as e:
+            raise ValueError(f"{e} (id={animal_id})") from None
+        animals.append(Animal(animal_id, sex, genotype, sire, dam, clutch))
+    return animals
+
+# ================= 筛选条件 -> SQL =================
+def _gene_sql(gene_id, op, score):
+    return f"a.id IN (SELECT animal_id FROM animal_genes WHERE gene_id = ? AND score {op} ?)", [gene_id, score]
+
+def compile_query_sql(node, mode="strict"):
+    """把查询语法树编译为 (WHERE 子句, 参数); 基因条件均为 animal_genes 索引上的范围查找。"""
+    if isinstance(node, GeneTerm):
+        score = node.min_score if node.min_score is not None else get_target_min_score(node.gene_id, mode)
+        if score == 0:
+            # 未记录的基因即为 0 分
+            if not node.exact: return "1", []
+            sql, params = _gene_sql(node.gene_id, ">", 0)
+            return f"NOT {sql}", params
+        return _gene_sql(node.gene_id, "=" if node.exact else ">=", score)
+    if isinstance(node, ComboTerm):
+        gene_ids = [gid for gid, info in GENE_DB.items() if info.get("group") == node.group]
+        marks = ", ".join("?" * len(gene_ids))
+        return (f"(SELECT COALESCE(SUM(score), 0) FROM animal_genes WHERE animal_id = a.id AND gene_id IN ({marks})) >= 2",
+                gene_ids)
+    if isinstance(node, NotTerm):
+        sql, params = compile_query_sql(node.child, opposite_mode(mode))
+        return f"NOT ({sql})", params
+    parts = [compile_query_sql(c, mode) for c in node.children]
+    params = [p for _, ps in parts for p in ps]
+    if isinstance(node, AndTerm): return " AND ".join(f"({s})" for s, _ in parts), params
+    if isinstance(node, OrTerm): return " OR ".join(f"({s})" for s, _ in parts), params
+    # any(n, ...): SQLite 的比较结果为 0 / 1, 直接相加
+    return f"({' + '.join(f'({s})' for s, _ in parts)}) >= ?", params + [node.n]
+
+# ================= 库存 =================
+class Inventory:
+    """单个 SQLite 连接, 加锁后可在多个会话线程间共享。"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA foreign_keys = ON")
+            if path != ":memory:": self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add_animals(self, animals):
+        """写入 / 覆盖 (按 id) 若干 Animal, 整批为一个事务。返回写入条数。"""
+        animals = list(animals)
+        if len({a.id for a in animals}) < len(animals):
+            raise ValueError("同一批中有重复的 id")
+        ids = [(a.id,) for a in animals]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM animal_genes WHERE animal_id = ?", ids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO animals (id, sex, genotype, sire, dam, clutch) VALUES (?, ?, ?, ?, ?, ?)",
+                [(a.id, a.sex, code_to_token(encode_genotype(a.genotype)), a.sire, a.dam, a.clutch) for a in animals])
+            self._conn.executemany(
+                "INSERT INTO animal_genes (gene_id, score, animal_id) VALUES (?, ?, ?)",
+                [(gid, score, a.id) for a in animals for gid, score in a.genotype.items() if score])
+        return len(animals)
+
+    def import_csv(self, path_or_buffer):
+        return self.add_animals(read_animals_csv(path_or_buffer))
+
+    def remove_animals(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM animals WHERE id = ?", [(i,) for i in ids])
+
+    def count(self, sex=None):
+        if sex is None: return self._query("SELECT COUNT(*) FROM animals")[0][0]
+        return self._query("SELECT COUNT(*) FROM animals WHERE sex = ?", (sex,))[0][0]
+
+    def _select(self, where="1", params=(), limit=None):
+        sql = f"SELECT a.id, a.sex, a.genotype, a.sire, a.dam, a.clutch FROM animals a WHERE {where} ORDER BY a.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = [*params, limit]
+        return [Animal(i, sex, decode_genotype(token_to_code(geno)), sire, dam, clutch)
+                for i, sex, geno, sire, dam, clutch in self._query(sql, params)]
+
+    def get(self, animal_id):
+        found = self._select("a.id = ?", [animal_id])
+        return found[0] if found else None
+
+    def find(self, query=None, sex=None, mode="strict", limit=None):
+        """按条件筛选 (query 为条件文本或语法树, 为空时不限基因), 按 id 排序。"""
+        where, params = ["1"], []
+        if query:
+            node = parse_query(query) if isinstance(query, str) else query
+            sql, query_params = compile_query_sql(node, mode)
+            where.append(f"({sql})")
+            params += query_params
+        if sex is not None:
+            where.append("a.sex = ?")
+            params.append(sex)
+        return self._select(" AND ".join(where), params, limit)
+
+    def get_offspring(self, sire, dam):
+        # 这对父母在库中的已留种后代
+        return self._select("a.sire = ? AND a.dam = ?", [sire, dam])
+
+    def get_relatives(self, animal):
+        """系谱中的近亲: (父母, 同窝/同父母的兄弟姐妹)。"""
+        parents = [p for p in (self.get(animal.sire) if animal.sire else None,
+                               self.get(animal.dam) if animal.dam else None) if p is not None]
+        if animal.clutch:
+            siblings = self._select("a.clutch = ? AND a.id != ?", [animal.clutch, animal.id])
+        elif animal.sire and animal.dam:
+            siblings = self._select("a.sire = ? AND a.dam = ? AND a.id != ?", [animal.sire, animal.dam, animal.id])
+        else:
+            siblings = []
+        return parents, siblings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="球蟒动物库存")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"数据库文件, 默认 {DEFAULT_DB_PATH}")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="从 CSV 导入 (按 id 覆盖)")
+    p_import.add_argument("csv")
+    p_find = sub.add_parser("find", help="按条件筛选")
+    p_find.add_argument("query", nargs="?", default="")
+    p_find.add_argument("--sex", choices=(MALE, FEMALE))
+    p_find.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    inventory = Inventory(args.db)
+    try:
+        if args.command == "import":
+            n = inventory.import_csv(args.csv)
+            print(f"已导入 {n} 条, 库中共 {inventory.count()} 条")
+        else:
+            for a in inventory.find(args.query, args.sex, limit=args.limit):
+                genes = ";".join(f"{gid}={s}" for gid, s in a.genotype.items())
+                print("\t".join([a.id, a.sex, genes, a.sire or "", a.dam or "", a.clutch or ""]))
+    except ValueError as e:
+        parser.exit(1, f"错误: {e}\n")
+    finally:
+        inventory.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""多代选育规划: 给定目标组合与现有种群, 用 beam search 搜索 2~4 代内最可能做出目标的繁育路线。
+
+搜索只在目标基因上进行 (其余基因不影响命中概率), 状态为当前这一窝的父母基因型;
+每一代可选: 留种回交父本 / 回交母本 / 同窝互配 / 与种群中其他个体外交。
+子代分布按配对记忆化, 同一配对在整个搜索中只计算一次。
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from genetics import enumerate_offspring_weights, format_genotype_label, get_target_min_score
+
+MOVE_FOUNDER = "现有配对"
+MOVE_BACKCROSS_FATHER = "留种回交父本"
+MOVE_BACKCROSS_MOTHER = "留种回交母本"
+MOVE_SIBLING = "同窝互配"
+MOVE_OUTCROSS = "留种外交"
+
+# parent_a 为公, parent_b 为母; holdback 为本步使用的留种个体标签 (首代为 None)
+PlanStep = namedtuple("PlanStep", ["generation", "move", "parent_a", "parent_b", "holdback"])
+BreedingPlan = namedtuple("BreedingPlan", ["steps", "success_prob", "egg_prob", "generations"])
+_Node = namedtuple("_Node", ["avail", "steps", "father", "mother"])  # father/mother: (标签, 目标基因 key)
+
+def _project(genotype_dict, targets):
+    return tuple((t, genotype_dict.get(t, 0)) for t in targets)
+
+@lru_cache(maxsize=65536)
+def _cross(key_a, key_b):
+    # 目标基因上的子代分布 ((key, 概率), ...); 调用方保证 key_a <= key_b
+    outcomes, total = enumerate_offspring_weights(dict(key_a), dict(key_b))
+    return tuple((geno, w / total) for geno, w in outcomes)
+
+def cross_targets(key_a, key_b):
+    return _cross(*sorted((key_a, key_b)))
+
+def _egg_prob(key_a, key_b, required):
+    return sum(p for geno, p in cross_targets(key_a, key_b) if all(s >= required[g] for g, s in geno))
+
+def _clutch_prob(p, clutch_size):
+    # 一窝 clutch_size 枚蛋中至少出现一次的概率
+    return 1 - (1 - p) ** clutch_size
+
+def _progress(key, required):
+    # 个体对目标的完成度 (0~1), 用于挑选留种候选
+    q = 1.0
+    for g, s in key:
+        q *= (min(s, required[g]) + 1) / (required[g] + 1)
+    return q
+
+def _label(key, targets):
+    return format_genotype_label(dict(key), targets)
+
+def plan_breeding(collection, targets, horizon=3, clutch_size=6, mode="strict",
+                  beam_width=24, holdback_limit=6, top_n=5):
+    """collection: {个体ID: (性别 "M"/"F", 基因型 dict)}。
+
+    成功率 = 各步留种个体在一窝中出现 (且性别符合) 的概率之积 × 最后一窝至少出一条目标个体的概率。
+    返回按成功率降序、代数升序排列的 BreedingPlan 列表。
+    """
+    targets = sorted(targets)
+    if not targets: return []
+    required = {t: get_target_min_score(t, mode) for t in targets}
+    animals = [(aid, sex, _project(geno, targets)) for aid, (sex, geno) in collection.items()]
+    males = [(aid, key) for aid, sex, key in animals if sex == "M"]
+    females = [(aid, key) for aid, sex, key in animals if sex == "F"]
+
+    beam = [_Node(1.0, (PlanStep(1, MOVE_FOUNDER, m[0], f[0], None),), m, f) for m in males for f in females]
+    plans = []
+    for gen in range(1, horizon + 1):
+        for node in beam:
+            egg = _egg_prob(node.father[1], node.mother[1], required)
+            if egg > 0:
+                plans.append(BreedingPlan(node.steps, node.avail * _clutch_prob(egg, clutch_size), egg, gen))
+        if gen == horizon: break
+        beam = _expand(beam, gen + 1, males, females, targets, required, clutch_size, beam_width, holdback_limit)
+
+    plans.sort(key=lambda p: (-round(p.success_prob, 12), p.generations))
+    return plans[:top_n]
+
+def _expand(beam, gen, males, females, targets, required, clutch_size, beam_width, holdback_limit):
+    best = {}  # (公 key, 母 key) -> 最优子节点, 同一状态只保留可得性最高的路线
+    for node in beam:
+        outcomes = cross_targets(node.father[1], node.mother[1])
+        holdbacks = sorted(outcomes, key=lambda o: (-_progress(o[0], required), -o[1]))[:holdback_limit]
+        for h_key, h_p in holdbacks:
+            # 留种需指定性别: 每枚蛋为该基因型且性别符合的概率为 p/2
+            avail = node.avail * _clutch_prob(h_p / 2, clutch_size)
+            for h_sex in ("M", "F"):
+                h = (f"F{gen - 1} 留种{'♂' if h_sex == 'M' else '♀'}: {_label(h_key, targets)}", h_key)
+                partners = [(MOVE_BACKCROSS_FATHER, node.father, 1.0)] if h_sex == "F" else [(MOVE_BACKCROSS_MOTHER, node.mother, 1.0)]
+                for s_key, s_p in holdbacks:
+                    s_label = f"F{gen - 1} 同窝{'♀' if h_sex == 'M' else '♂'}: {_label(s_key, targets)}"
+                    partners.append((MOVE_SIBLING, (s_label, s_key), _clutch_prob(s_p / 2, clutch_size)))
+                pool = females if h_sex == "M" else males
+                for aid, key in pool:
+                    if (aid, key) not in (node.father, node.mother):
+                        partners.append((MOVE_OUTCROSS, (aid, key), 1.0))
+                for move, partner, partner_avail in partners:
+                    father, mother = (h, partner) if h_sex == "M" else (partner, h)
+                    child_avail = avail * partner_avail
+                    step = PlanStep(gen, move, father[0], mother[0], h[0])
+                    state = (father[1], mother[1])
+                    if state not in best or best[state].avail < child_avail:
+                        best[state] = _Node(child_avail, node.steps + (step,), father, mother)
+
+    def beam_score(node):
+        egg = _egg_prob(node.father[1], node.mother[1], required)
+        progress = _progress(node.father[1], required) * _progress(node.mother[1], required)
+        return (node.avail * _clutch_prob(egg, clutch_size), node.avail * progress)
+
+    return sorted(best.values(), key=beam_score, reverse=True)[:beam_width]
@@ -0,0 +1,134 @@
+"""本地价目表与整窝期望价值: 价目按肉眼可见的表现型给出, 与后代结果表向量化匹配。
+
+价目表 (CSV 或 Parquet) 两列:
+    phenotype  表现型, 基因用 + 或 , 分隔: "Pastel + Clown", "Super Pastel", "Mojave + Lesser"; 原色写 Normal
+    price      单价
+隐性基因写出即为成体 (Visual), 显性基因加 Super 前缀为超级体; 价目按表现型, 不接受 Het。
+后代按「被它包含的价目中最高的一条」估价: Pastel Clown 的个体若无专门价目, 则取 Clown / Pastel 等中的较高者;
+一条都不匹配时价值为 0 (可用 Normal 设定原色底价)。
+风险 (RISK_DB): 致死结果不计价值 (该蛋损失); 其余风险结果按 risk_discount 折价。
+"""
+from collections import namedtuple
+
+from genetics import (
+    GENE_DB, RISK_DB, FULL_ENUM_LIMIT, TOP_K_OUTCOMES, np, pd, build_full_table, build_top_table,
+    count_offspring_outcomes, get_lethal_mask, get_lethal_probability, get_locus_distributions, get_locus_phenotypes,
+    _is_recessive,
+)
+
+DEFAULT_CLUTCH_SIZE = 6
+MATCH_CHUNK_CELLS = 4_000_000  # 匹配时单块 (行 × 价目 × 基因) 的元素数上限
+NORMAL_NAMES = {"normal", "wild", "wild type", "原色", ""}
+
+# gene_ids: 价目涉及的基因; scores: 每条价目在这些基因上的表现型分值 (int8, 条数 × 基因数); prices: 单价
+PriceTable = namedtuple("PriceTable", ["gene_ids", "scores", "prices"])
+# 期望价值均已扣除风险; risk_loss 为风险 (致死 + 折价) 造成的每窝期望损失
+ClutchValue = namedtuple("ClutchValue", ["egg_value", "clutch_value", "risk_loss", "lethal_prob"])
+
+_GENE_NAMES = {gid.lower(): gid for gid in GENE_DB}
+
+def parse_phenotype(text):
+    """"Super Pastel + Clown" -> {"Pastel": 2, "Clown": 2}; 原色为 {}。"""
+    phenotype = {}
+    for part in str(text).replace(",", "+").split("+"):
+        name = " ".join(part.split())
+        if name.lower() in NORMAL_NAMES: continue
+        if name.lower().startswith("het "):
+            raise ValueError(f"价目按表现型给出, 不含 Het: {text}")
+        is_super = name.lower().startswith("super ") and name.lower() not in _GENE_NAMES
+        gid = _GENE_NAMES.get(name[6:].lower() if is_super else name.lower())
+        if gid is None:
+            raise ValueError(f"未知基因: {name} ({text})")
+        if is_super and _is_recessive(gid):
+            raise ValueError(f"隐性基因没有 Super: {name}")
+        phenotype[gid] = 2 if is_super or _is_recessive(gid) else 1
+    return phenotype
+
+def build_price_table(entries):
+    """entries: [(表现型文本或 {gene: score}, 单价)]; 同一表现型出现两次视为错误。"""
+    parsed = [(parse_phenotype(p) if isinstance(p, str) else dict(p), float(price)) for p, price in entries]
+    gene_ids = tuple(sorted({gid for phenotype, _ in parsed for gid in phenotype}, key=list(GENE_DB).index))
+    scores = np.array([[phenotype.get(gid, 0) for gid in gene_ids] for phenotype, _ in parsed], dtype=np.int8)
+    scores = scores.reshape(len(parsed), len(gene_ids))
+    if len(np.unique(scores, axis=0)) < len(parsed):
+        raise ValueError("价目表中有重复的表现型")
+    return PriceTable(gene_ids, scores, np.array([price for _, price in parsed], dtype=float))
+
+def load_price_table(path_or_buffer, file_format=None):
+    """读取 CSV / Parquet 价目表; 未指定格式时按扩展名判断, 默认 CSV。"""
+    name = getattr(path_or_buffer, "name", path_or_buffer)
+    file_format = file_format or ("parquet" if str(name).lower().endswith(".parquet") else "csv")
+    if file_format == "parquet":
+        try:
+            df = pd.read_parquet(path_or_buffer)
+        except ImportError:
+            raise ValueError("读取 Parquet 需要安装 pyarrow: pip install pyarrow") from None
+    else:
+        df = pd.read_csv(path_or_buffer, dtype={"phenotype": str}, keep_default_na=False)
+    missing = {"phenotype", "price"} - set(df.columns)
+    if missing:
+        raise ValueError(f"价目表缺少列: {', '.join(sorted(missing))}")
+    prices = pd.to_numeric(df["price"], errors="coerce")
+    if prices.isna().any() or (prices < 0).any():
+        raise ValueError("price 列必须为非负数")
+    return build_price_table(zip(df["phenotype"], prices))
+
+# ================= 结果表估价 =================
+def get_outcome_values(table, prices):
+    """结果表 (表现型分值) 每行的单价: 被该行包含的价目中的最高价, 无匹配为 0。"""
+    n_rows = table.geno.shape[0]
+    cols = [table.gene_ids.index(gid) if gid in table.gene_ids else -1 for gid in prices.gene_ids]
+    # 要求了本窝根本不存在的基因的价目不可能匹配, 先剔除
+    absent = [k for k, j in enumerate(cols) if j < 0]
+    usable = ~prices.scores[:, absent].any(axis=1) if absent else np.ones(len(prices.prices), dtype=bool)
+    present = [k for k, j in enumerate(cols) if j >= 0]
+    if not usable.any(): return np.zeros(n_rows)
+    wanted = prices.scores[usable][:, present]  # 价目 × 基因
+    unit = prices.prices[usable]
+    geno = table.geno[:, [cols[k] for k in present]]  # 行 × 基因
+    values = np.empty(n_rows)
+    # 按行分块广播 (行 × 价目 × 基因), 控制中间数组大小
+    step = max(1, MATCH_CHUNK_CELLS // max(1, wanted.size))
+    for start in range(0, n_rows, step):
+        block = geno[start:start + step]
+        # 价目不要求的基因 (0) 不限制; 要求的基因分值须完全一致
+        match = ((wanted == 0)[None, :, :] | (block[:, None, :] == wanted[None, :, :])).all(axis=2)
+        values[start:start + step] = np.where(match, unit[None, :], 0.0).max(axis=1)
+    return values
+
+def get_risk_flags(table):
+    # (致死, 非致死风险) 两个行级布尔数组
+    risky = np.zeros(table.geno.shape[0], dtype=bool)
+    for j, gid in enumerate(table.gene_ids):
+        if gid in RISK_DB:
+            risky |= np.isin(table.geno[:, j], list(RISK_DB[gid]))
+    lethal = get_lethal_mask(table)
+    return lethal, risky & ~lethal
+
+def evaluate_clutch_value(loci, prices, clutch_size=DEFAULT_CLUTCH_SIZE, risk_discount=0.0):
+    """由基因型位点分布求每蛋 / 每窝期望价值。
+
+    只保留价目或风险涉及的位点并换算为表现型分布, 再枚举其组合 (通常只有几十到几百种);
+    组合过多时取概率最高的 TOP_K_OUTCOMES 种, 剩余概率按原色价值计 (下界)。
+    """
+    relevant = set(prices.gene_ids) | set(RISK_DB)
+    loci = get_locus_phenotypes([(ids, dist) for ids, dist in loci if relevant & set(ids)])
+    if count_offspring_outcomes(loci) > FULL_ENUM_LIMIT:
+        table, other_prob = build_top_table(loci, top_k=TOP_K_OUTCOMES)
+    else:
+        table, other_prob = build_full_table(loci), 0.0
+    values = get_outcome_values(table, prices)
+    lethal, risky = get_risk_flags(table)
+    adjusted = np.where(lethal, 0.0, np.where(risky, values * (1 - risk_discount), values))
+    base = _base_price(prices)
+    gross = float(table.prob @ values) + other_prob * base
+    egg_value = float(table.prob @ adjusted) + other_prob * base
+    return ClutchValue(egg_value, egg_value * clutch_size, (gross - egg_value) * clutch_size, get_lethal_probability(loci))
+
+def _base_price(prices):
+    # 原色 (所有基因为 0) 能匹配到的价目
+    normal = ~prices.scores.any(axis=1)
+    return float(prices.prices[normal].max()) if normal.any() else 0.0
+
+def evaluate_pairing_value(parent_a_geno, parent_b_geno, prices, clutch_size=DEFAULT_CLUTCH_SIZE, risk_discount=0.0):
+    return evaluate_clutch_value(get_locus_distributions(parent_a_geno, parent_b_geno), prices, clutch_size, risk_discount)
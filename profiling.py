@@ -0,0 +1,96 @@
+"""按阶段的耗时 / 内存分配统计 (可选开启)。
+
+关闭时使用 NULL_PROFILER: 每个埋点只是一次方法调用并返回同一个空上下文, 可常驻生产环境。
+开启后每个阶段记录一行 StageRecord, 跨多次重跑累积 (有上限), 可汇总或导出为 JSON / CSV。
+内存统计基于 tracemalloc (进程级, 开启后整体变慢, 多会话同时运行时数字会互相干扰), 默认只计时。
+"""
+import time
+import tracemalloc
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+
+# scope: 标签页 / 页面区域 (A/B/C/F2 ...); alloc_bytes: 阶段结束时净增的已分配内存; peak_bytes: 阶段内峰值增量
+StageRecord = namedtuple("StageRecord", ["run", "timestamp", "scope", "stage", "seconds", "alloc_bytes", "peak_bytes"])
+RECORD_COLUMNS = list(StageRecord._fields)
+
+_NULL_CONTEXT = nullcontext()
+
+class NullProfiler:
+    enabled = False
+
+    def start_run(self):
+        pass
+
+    def stage(self, name, scope=None):
+        return _NULL_CONTEXT
+
+NULL_PROFILER = NullProfiler()
+
+class StageProfiler:
+    enabled = True
+
+    def __init__(self, track_memory=False, max_records=20000):
+        self.track_memory = track_memory
+        self.records = deque(maxlen=max_records)
+        self.run = 0
+        self._stack = []  # [(scope, 起始内存, 期间最高内存)]
+        self._started_tracemalloc = False
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def start_run(self):
+        self.run += 1
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name, scope=None):
+        # 嵌套阶段继承外层的 scope
+        scope = scope or (self._stack[-1][0] if self._stack else "page")
+        memory = self.track_memory and tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack: self._stack[-1][2] = max(self._stack[-1][2], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([scope, current, current])
+        else:
+            self._stack.append([scope, 0, 0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _, start_mem, max_mem = self._stack.pop()
+            alloc = peak_delta = None
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                max_mem = max(max_mem, peak)
+                alloc, peak_delta = current - start_mem, max_mem - start_mem
+                # 把本阶段的峰值并入外层, 再清零峰值供外层继续统计
+                if self._stack: self._stack[-1][2] = max(self._stack[-1][2], max_mem)
+                tracemalloc.reset_peak()
+            self.records.append(StageRecord(self.run, time.time(), scope, name, seconds, alloc, peak_delta))
+
+    def clear(self):
+        self.records.clear()
+
+    def to_frame(self, last_run_only=False):
+        import pandas as pd
+        records = [r for r in self.records if r.run == self.run] if last_run_only else list(self.records)
+        return pd.DataFrame(records, columns=RECORD_COLUMNS)
+
+    def summary(self, last_run_only=False):
+        """按 (scope, stage) 汇总: 次数、总/平均/P95/最大耗时 (毫秒) 与平均内存。"""
+        df = self.to_frame(last_run_only)
+        if df.empty: return df
+        df["ms"] = df["seconds"] * 1000
+        grouped = df.groupby(["scope", "stage"], sort=False)
+        out = grouped["ms"].agg(次数="count", 总耗时="sum", 平均="mean", P95=lambda s: s.quantile(0.95), 最大="max")
+        if df["alloc_bytes"].notna().any():
+            out["平均净分配KB"] = grouped["alloc_bytes"].mean() / 1024
+            out["平均峰值KB"] = grouped["peak_bytes"].mean() / 1024
+        return out.reset_index().sort_values("总耗时", ascending=False, ignore_index=True)
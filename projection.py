@@ -0,0 +1,110 @@
+"""多代投影: 在固定交配方案下直接求 F1…Fn 的基因型分布。
+
+各位点独立遗传, 每个位点是一条小的马尔可夫链 (个体基因型为无序等位基因对):
+- 连续回交: 状态为个体基因型, 每代与同一回交个体配对;
+- 同窝互配: 状态为交配类型 (无序基因型对), 每代取两条同窝个体配对。
+起点为确定的亲本基因型, 因此各位点链相互独立, 联合分布为各位点分布之积。
+第 n 代分布用转移矩阵的幂一步求出, 矩阵幂与单位点投影均按方案缓存。
+复合组位点只保留亲本实际携带的等位基因, 状态数保持很小。
+
+输出沿用 genetics 的 loci 约定 [(位点基因 tuple, {分值 tuple: 权重})], 权重之和为 4,
+可直接交给 get_visual_probability / get_combo_hit_probability / get_lethal_probability。
+"""
+from functools import lru_cache
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from genetics import get_locus_alleles, group_loci
+
+SCHEME_SIBLING = "sibling"
+SCHEME_BACKCROSS = "backcross"
+
+# 单位点上等位基因编号为 0..n-1 (0 为野生型), 基因型为编号的有序对 (x <= y)
+@lru_cache(maxsize=None)
+def _genotype_states(n_alleles):
+    return tuple(combinations_with_replacement(range(n_alleles), 2))
+
+@lru_cache(maxsize=None)
+def _mating_states(n_alleles):
+    return tuple(combinations_with_replacement(range(len(_genotype_states(n_alleles))), 2))
+
+def _offspring_vector(n_alleles, geno_a, geno_b):
+    states = _genotype_states(n_alleles)
+    vec = np.zeros(len(states))
+    for x in geno_a:
+        for y in geno_b:
+            vec[states.index(tuple(sorted((x, y))))] += 0.25
+    return vec
+
+@lru_cache(maxsize=None)
+def _offspring_matrix(n_alleles):
+    # (基因型数 × 交配类型数): 交配类型 -> 子代基因型分布
+    states = _genotype_states(n_alleles)
+    return np.column_stack([_offspring_vector(n_alleles, states[i], states[j]) for i, j in _mating_states(n_alleles)])
+
+@lru_cache(maxsize=None)
+def _sibling_matrix(n_alleles):
+    # (交配类型数 × 交配类型数): 当前交配类型 -> 下一代同窝互配的交配类型
+    mating = _mating_states(n_alleles)
+    index = {pair: i for i, pair in enumerate(mating)}
+    offspring = _offspring_matrix(n_alleles)
+    T = np.zeros((len(mating), len(mating)))
+    for j in range(len(mating)):
+        d = offspring[:, j]
+        for x, y in mating:
+            T[index[(x, y)], j] += d[x] * d[y] * (1 if x == y else 2)
+    return T
+
+@lru_cache(maxsize=None)
+def _backcross_matrix(n_alleles, partner):
+    # (基因型数 × 基因型数): 个体基因型 -> 与固定个体回交后的子代基因型
+    return np.column_stack([_offspring_vector(n_alleles, g, partner) for g in _genotype_states(n_alleles)])
+
+@lru_cache(maxsize=1024)
+def _matrix_power(scheme, n_alleles, partner, k):
+    T = _sibling_matrix(n_alleles) if scheme == SCHEME_SIBLING else _backcross_matrix(n_alleles, partner)
+    return np.linalg.matrix_power(T, k)
+
+@lru_cache(maxsize=4096)
+def _project_locus(scheme, n_alleles, geno_a, geno_b, partner, generations):
+    # 单位点 F1…Fn 的基因型分布 (每代一个概率向量)
+    if scheme == SCHEME_SIBLING:
+        states = _genotype_states(n_alleles)
+        start = np.zeros(len(_mating_states(n_alleles)))
+        start[_mating_states(n_alleles).index(tuple(sorted((states.index(geno_a), states.index(geno_b)))))] = 1.0
+        return tuple(_offspring_matrix(n_alleles) @ (_matrix_power(scheme, n_alleles, None, k) @ start) for k in range(generations))
+    f1 = _offspring_vector(n_alleles, geno_a, geno_b)
+    return tuple(_matrix_power(scheme, n_alleles, partner, k) @ f1 for k in range(generations))
+
+def project_generations(male_geno, female_geno, scheme=SCHEME_SIBLING, generations=10, backcross_geno=None):
+    """返回 [F1 loci, F2 loci, …, Fn loci]。
+
+    scheme=SCHEME_BACKCROSS 时每代都与 backcross_geno (默认为 male_geno) 回交。
+    """
+    if scheme not in (SCHEME_SIBLING, SCHEME_BACKCROSS):
+        raise ValueError(f"未知交配方案: {scheme}")
+    if backcross_geno is None: backcross_geno = male_geno
+    founders = [male_geno, female_geno] + ([backcross_geno] if scheme == SCHEME_BACKCROSS else [])
+
+    per_locus = []
+    for gene_ids in group_loci(set(male_geno) | set(female_geno)):
+        slots = [get_locus_alleles(g, gene_ids) for g in founders]
+        # 只保留亲本实际携带的等位基因: 0 为野生型, 其余按位点内顺序编号
+        alleles = [None] + [gid for gid in gene_ids if any(gid in s for s in slots)]
+        codes = [tuple(sorted(alleles.index(a) for a in s)) for s in slots]
+        partner = codes[2] if scheme == SCHEME_BACKCROSS else None
+        vectors = _project_locus(scheme, len(alleles), codes[0], codes[1], partner, generations)
+        scores = [tuple((alleles[x] == gid) + (alleles[y] == gid) for gid in gene_ids) for x, y in _genotype_states(len(alleles))]
+        per_locus.append((gene_ids, scores, vectors))
+
+    projected = []
+    for k in range(generations):
+        loci = []
+        for gene_ids, scores, vectors in per_locus:
+            dist = {}
+            for state, p in zip(scores, vectors[k]):
+                if p > 0: dist[state] = dist.get(state, 0.0) + float(p) * 4
+            loci.append((gene_ids, dist))
+        projected.append(loci)
+    return projected
@@ -0,0 +1,325 @@
+"""目标条件查询: 把目标组合写成布尔表达式, 编译一次后在结果表上向量化求值, 或直接由各位点分布求精确概率。
+
+语法 (大小写不敏感, 基因名可含空格, 也可用引号):
+    Clown AND Pied                  与; 也可写作 & 或 +
+    Clown OR Pied, NOT Spider       或 (|) / 非 (!)
+    Clown>=1, Pastel=2, Pied:het    最低分值 / 精确分值; :het 为 >=1, :visual / :super 为 2
+    any(2, Clown, Pied, Pastel)     其中至少 2 个满足
+    combo(BEL)                      复合组组合 (与 apply_combo_rules 口径一致: 组内分值之和 >= 2)
+不写分值的基因按模式取最低分值: 严格模式 (完美成体) 隐性需 2, 宽松模式 (项目个体) 均为 >= 1。
+NOT 的子条件按相反模式求值 (严格模式下「不是项目个体」, 宽松模式下「不是完美成体」), 保证严格命中 ⊆ 宽松命中。
+"""
+import itertools
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from genetics import GENE_DB, COMBO_RULES, np, get_locus_id, get_phenotype_scores, get_target_min_score
+
+MODES = ("strict", "loose")
+MAX_JOINT_STATES = 200000  # 非独立子条件联合枚举的状态数上限
+
+# min_score 为 None 时按模式取默认值; exact 为 True 时要求分值恰好等于 min_score
+GeneTerm = namedtuple("GeneTerm", ["gene_id", "min_score", "exact"])
+ComboTerm = namedtuple("ComboTerm", ["group"])
+NotTerm = namedtuple("NotTerm", ["child"])
+AndTerm = namedtuple("AndTerm", ["children"])
+OrTerm = namedtuple("OrTerm", ["children"])
+AnyTerm = namedtuple("AnyTerm", ["n", "children"])
+
+# ================= 1. 解析 =================
+_GENE_NAMES = sorted(GENE_DB, key=len, reverse=True)  # 最长匹配, 让 "Black Pastel" 优先于 "Pastel"
+_COMBO_GROUPS = {group.lower(): group for group, _ in COMBO_RULES}
+_SCORE_ALIASES = {"het": (1, False), "visual": (2, False), "super": (2, False), "wild": (0, True)}
+_TOKEN_NAMES = {"GENE": "基因名", "NUM": "数字", "NAME": "名称", "(": "左括号", ")": "右括号"}
+_SYMBOLS = {"&": "AND", "+": "AND", "|": "OR", "!": "NOT", "(": "(", ")": ")", ",": ",", ":": ":", ">=": ">=", "=": "="}
+
+def _tokenize(text):
+    tokens, i = [], 0
+    lower = text.lower()
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+            continue
+        word = re.match(r"(and|or|not|any|combo)\b", lower[i:])
+        if word:
+            tokens.append((word.group(1).upper(), None, i))
+            i += word.end()
+            continue
+        if text[i] in "\"'":
+            end = text.find(text[i], i + 1)
+            if end < 0: raise ValueError(f"第 {i + 1} 个字符处的引号未闭合")
+            name = text[i + 1:end]
+            gid = next((g for g in GENE_DB if g.lower() == name.lower()), None)
+            if gid is None: raise ValueError(f"未知基因: {name}")
+            tokens.append(("GENE", gid, i))
+            i = end + 1
+            continue
+        gid = next((g for g in _GENE_NAMES if lower.startswith(g.lower(), i)
+                    and not lower[i + len(g):i + len(g) + 1].isalnum()), None)
+        if gid is not None:
+            tokens.append(("GENE", gid, i))
+            i += len(gid)
+            continue
+        symbol = text[i:i + 2] if text[i:i + 2] == ">=" else text[i]
+        if symbol in _SYMBOLS:
+            tokens.append((_SYMBOLS[symbol], None, i))
+            i += len(symbol)
+            continue
+        number = re.match(r"\d+", text[i:])
+        if number:
+            tokens.append(("NUM", int(number.group()), i))
+            i += number.end()
+            continue
+        name = re.match(r"[\w-]+", text[i:])
+        if name:
+            tokens.append(("NAME", name.group(), i))
+            i += name.end()
+            continue
+        raise ValueError(f"第 {i + 1} 个字符无法识别: {text[i]}")
+    return tokens
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            where = f"第 {self.tokens[self.pos][2] + 1} 个字符处" if self.pos < len(self.tokens) else "结尾处"
+            raise ValueError(f"{where}缺少{_TOKEN_NAMES.get(kind, kind)}")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token[1]
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"第 {self.tokens[self.pos][2] + 1} 个字符处有多余内容")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.pos += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else OrTerm(tuple(children))
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while self.peek() == "AND":
+            self.pos += 1
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else AndTerm(tuple(children))
+
+    def parse_unary(self):
+        if self.peek() == "NOT":
+            self.pos += 1
+            return NotTerm(self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind = self.peek()
+        if kind == "(":
+            self.pos += 1
+            node = self.parse_or()
+            self.take(")")
+            return node
+        if kind == "ANY":
+            self.pos += 1
+            self.take("(")
+            n = self.take("NUM")
+            children = []
+            while self.peek() == ",":
+                self.pos += 1
+                children.append(self.parse_or())
+            self.take(")")
+            if not children or not 1 <= n <= len(children):
+                raise ValueError(f"any({n}, ...) 的数量须在 1 到条件个数之间")
+            return AnyTerm(n, tuple(children))
+        if kind == "COMBO":
+            self.pos += 1
+            self.take("(")
+            name = self.tokens[self.pos][1] if self.peek() in ("NAME", "GENE") else None
+            group = _COMBO_GROUPS.get(str(name).lower())
+            if group is None:
+                raise ValueError(f"combo() 只支持: {', '.join(g for g, _ in COMBO_RULES)}")
+            self.pos += 1
+            self.take(")")
+            return ComboTerm(group)
+        if kind == "NAME":
+            raise ValueError(f"未知基因: {self.tokens[self.pos][1]}")
+        gid = self.take("GENE")
+        if self.peek() in (">=", "="):
+            exact = self.peek() == "="
+            self.pos += 1
+            score = self.take("NUM")
+            if score not in (0, 1, 2): raise ValueError(f"{gid} 的分值只能为 0 / 1 / 2")
+            return GeneTerm(gid, score, exact)
+        if self.peek() == ":":
+            self.pos += 1
+            alias = str(self.take("NAME")).lower()
+            if alias not in _SCORE_ALIASES:
+                raise ValueError(f"未知分值写法 :{alias} (可用 {', '.join(_SCORE_ALIASES)})")
+            return GeneTerm(gid, *_SCORE_ALIASES[alias])
+        return GeneTerm(gid, None, False)
+
+@lru_cache(maxsize=256)
+def parse_query(text):
+    """把条件文本编译为语法树 (结果缓存, 同一条件只解析一次)。"""
+    if not text or not text.strip():
+        raise ValueError("条件为空")
+    return _Parser(_tokenize(text)).parse()
+
+def query_from_targets(targets):
+    # 多选框里的目标基因: 全部满足 (各自按模式取默认分值)
+    terms = tuple(GeneTerm(t, None, False) for t in targets)
+    return terms[0] if len(terms) == 1 else AndTerm(terms)
+
+def get_query_genes(node):
+    if isinstance(node, GeneTerm): return {node.gene_id}
+    if isinstance(node, ComboTerm): return {gid for gid, info in GENE_DB.items() if info.get("group") == node.group}
+    children = (node.child,) if isinstance(node, NotTerm) else node.children
+    return set().union(*(get_query_genes(c) for c in children))
+
+def opposite_mode(mode):
+    return MODES[1 - MODES.index(mode)]
+
+def _min_score(term, mode):
+    return term.min_score if term.min_score is not None else get_target_min_score(term.gene_id, mode)
+
+def _gene_matches(term, score, mode):
+    threshold = _min_score(term, mode)
+    return score == threshold if term.exact else score >= threshold
+
+# ================= 2. 单条基因型求值 =================
+def evaluate_query(node, genotype_dict, mode="strict"):
+    if isinstance(node, GeneTerm):
+        return _gene_matches(node, genotype_dict.get(node.gene_id, 0), mode)
+    if isinstance(node, ComboTerm):
+        return sum(s for gid, s in genotype_dict.items() if GENE_DB.get(gid, {}).get("group") == node.group) >= 2
+    if isinstance(node, NotTerm):
+        return not evaluate_query(node.child, genotype_dict, opposite_mode(mode))
+    hits = [evaluate_query(c, genotype_dict, mode) for c in node.children]
+    if isinstance(node, AndTerm): return all(hits)
+    if isinstance(node, OrTerm): return any(hits)
+    return sum(hits) >= node.n
+
+# ================= 3. 结果表向量化求值 =================
+def _eval_table(node, table):
+    # 返回 (2, 行数) 布尔矩阵: 第 0 行为严格模式, 第 1 行为宽松模式; 两种模式在同一次遍历中求出
+    n_rows = table.geno.shape[0]
+    if isinstance(node, GeneTerm):
+        if node.gene_id in table.gene_ids:
+            col = table.geno[:, table.gene_ids.index(node.gene_id)]
+        else:
+            col = np.zeros(n_rows, dtype=np.int8)
+        thresholds = np.array([[_min_score(node, m)] for m in MODES])
+        return (col == thresholds) if node.exact else (col >= thresholds)
+    if isinstance(node, ComboTerm):
+        cols = [j for j, gid in enumerate(table.gene_ids) if GENE_DB.get(gid, {}).get("group") == node.group]
+        hit = table.geno[:, cols].sum(axis=1) >= 2 if cols else np.zeros(n_rows, dtype=bool)
+        return np.broadcast_to(hit, (2, n_rows))
+    if isinstance(node, NotTerm):
+        # 子条件的两行交换后取反: 严格行 = 非 (子条件宽松命中)
+        return ~_eval_table(node.child, table)[::-1]
+    results = [_eval_table(c, table) for c in node.children]
+    if isinstance(node, AndTerm): return np.logical_and.reduce(results)
+    if isinstance(node, OrTerm): return np.logical_or.reduce(results)
+    return np.sum(results, axis=0) >= node.n
+
+def get_query_masks(node, table):
+    """返回 (严格模式命中, 宽松模式命中) 两个布尔数组。"""
+    masks = _eval_table(node, table)
+    return masks[0], masks[1]
+
+def get_query_tiers(node, table):
+    """分层: 1 = 完美目标, 2 = 核心项目 (仅宽松模式命中), 3 = 其他。"""
+    strict, loose = _eval_table(node, table)
+    return np.where(strict, 1, np.where(loose, 2, 3)).astype(np.int8)
+
+# ================= 4. 由位点分布求概率 =================
+def _node_loci(node, locus_of):
+    if isinstance(node, GeneTerm): return frozenset([locus_of.get(node.gene_id, ("absent", node.gene_id))])
+    if isinstance(node, ComboTerm): return frozenset([node.group])
+    children = (node.child,) if isinstance(node, NotTerm) else node.children
+    return frozenset().union(*(_node_loci(c, locus_of) for c in children))
+
+def _prob_any(probs, n):
+    # 独立事件中至少 n 个发生的概率 (泊松二项分布 DP)
+    dist = [1.0]
+    for p in probs:
+        dist = [a * (1 - p) + b * p for a, b in zip(dist + [0.0], [0.0] + dist)]
+    return sum(dist[n:])
+
+def _prob(node, loci_by_id, locus_of, mode):
+    if isinstance(node, GeneTerm):
+        locus = loci_by_id.get(locus_of.get(node.gene_id))
+        if locus is None: return float(_gene_matches(node, 0, mode))
+        gene_ids, dist = locus
+        k = gene_ids.index(node.gene_id)
+        return sum(c for s, c in dist.items() if _gene_matches(node, s[k], mode)) / 4
+    if isinstance(node, ComboTerm):
+        locus = loci_by_id.get(node.group)
+        if locus is None: return 0.0
+        return sum(c for s, c in locus[1].items() if sum(s) >= 2) / 4
+    if isinstance(node, NotTerm):
+        return 1 - _prob(node.child, loci_by_id, locus_of, opposite_mode(mode))
+    child_loci = [_node_loci(c, locus_of) for c in node.children]
+    if sum(len(l) for l in child_loci) == len(frozenset().union(*child_loci)):
+        # 子条件涉及的位点互不重叠 -> 相互独立
+        probs = [_prob(c, loci_by_id, locus_of, mode) for c in node.children]
+        if isinstance(node, AndTerm): return float(np.prod(probs))
+        if isinstance(node, OrTerm): return 1 - float(np.prod([1 - p for p in probs]))
+        return _prob_any(probs, node.n)
+    return _prob_joint(node, loci_by_id, frozenset().union(*child_loci), mode)
+
+def _prob_joint(node, loci_by_id, locus_ids, mode):
+    # 子条件共享位点: 只在这些位点的联合分布上枚举
+    loci = [loci_by_id[l] for l in locus_ids if l in loci_by_id]
+    n_states = 1
+    for _, dist in loci: n_states *= len(dist)
+    if n_states > MAX_JOINT_STATES:
+        raise ValueError("条件涉及的位点组合过多, 请拆分条件")
+    total = 0
+    for combo in itertools.product(*[list(dist.items()) for _, dist in loci]):
+        genotype, weight = {}, 1
+        for (gene_ids, _), (scores, c) in zip(loci, combo):
+            genotype.update(zip(gene_ids, scores))
+            weight *= c
+        if evaluate_query(node, genotype, mode): total += weight
+    return total / 4 ** len(loci)
+
+def get_query_probability(node, loci, mode="strict"):
+    """条件在后代中成立的精确概率 (0~1); 独立子条件直接由各位点分布相乘, 不枚举基因型。"""
+    loci_by_id = {get_locus_id(gene_ids[0]): (gene_ids, dist) for gene_ids, dist in loci}
+    locus_of = {gid: get_locus_id(gid) for gene_ids, _ in loci for gid in gene_ids}
+    return _prob(node, loci_by_id, locus_of, mode)
+
+def get_phenotype_tier_probs(node, loci, table):
+    """表现型结果表每行在三层中的概率 (行数 × 3, 各行之和为该行概率)。
+
+    表现型把隐性 Het 并入原色, 同一行可能混有不同层的基因型, 不能在表现型分值上直接分层;
+    改由基因型位点分布 loci 取该行在条件相关位点上的条件分布, 精确求出严格 / 宽松命中的部分。
+    """
+    genes = get_query_genes(node)
+    relevant = [(ids, dist) for ids, dist in loci if genes & set(ids)]
+    cols = [table.gene_ids.index(gid) for ids, _ in relevant for gid in ids]
+    memo = {}
+    split = np.empty((len(table.prob), 3))
+    for r, key in enumerate(map(tuple, table.geno[:, cols].tolist())):
+        if key not in memo:
+            cond, pos = [], 0
+            for ids, dist in relevant:
+                wanted = key[pos:pos + len(ids)]
+                pos += len(ids)
+                sub = {s: c for s, c in dist.items() if get_phenotype_scores(ids, s) == wanted}
+                total = sum(sub.values())
+                cond.append((ids, {s: c * 4 / total for s, c in sub.items()}))
+            strict, loose = (get_query_probability(node, cond, m) for m in MODES)
+            memo[key] = (strict, max(loose - strict, 0.0), max(1 - loose, 0.0))
+        split[r] = memo[key]
+    return split * table.prob[:, None]
@@ -0,0 +1,343 @@
+"""本地 JSON API 服务: asyncio 前端 + 进程池计算, 供网站与内部工具直接调用, 无需 Streamlit 会话。
+
+启动:
+    python server.py serve --port 8765 --workers 4
+压测 (在本机起一个临时服务, 全程离线):
+    python server.py bench --requests 5000 --concurrency 64 --distinct 300
+
+接口 (请求与响应均为 JSON, 基因型可写作 dict 或 "Clown=1;Pied=2"):
+    POST /pair   {"parent_a": ..., "parent_b": ..., "targets": ["Clown"], "top": 5}
+    POST /batch  {"pairings": [{"id": "p1", "parent_a": ..., "parent_b": ...}, ...], "targets": [...], "top": 5}
+    GET  /health, GET /stats
+
+同一配对 (不分父母顺序) 的结果按 (配对, 目标, top) 缓存; 正在计算中的相同请求会合并为一次计算;
+批量请求中未命中的配对按 chunk_size 分块提交到进程池。
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from genetics import GENE_DB, PairingCache, estimate_bytes, get_genotype_key, get_locus_id
+from batch import evaluate_report
+from cli import parse_genotype
+
+DEFAULT_TOP = 5
+MAX_TOP = 200
+MAX_BATCH = 10000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+class RequestError(Exception):
+    """请求内容无效, 以 400 返回。"""
+
+# ================= 1. 计算 (在工作进程中执行) =================
+def evaluate_payload(parent_a, parent_b, targets=(), top=DEFAULT_TOP):
+    """返回一个配对的 JSON 结果; 概率为 0~1。"""
+    report = evaluate_report(parent_a, parent_b, targets, top)
+    return {
+        "probabilities": {"perfect": report.hit, "project": report.project, "visual": report.visual,
+                          "lethal": report.lethal},
+        "outcome_count": report.outcome_count,
+        "risks": [{"gene": r.gene_id, "score": r.score, "message": r.message, "probability": r.probability,
+                   "lethal": r.lethal} for r in report.risks],
+        "outcomes": [{"label": label, "probability": p, "link": link} for label, p, link in report.outcomes],
+        "other_probability": report.other_prob,
+    }
+
+def _evaluate_chunk(jobs):
+    return [evaluate_payload(*job) for job in jobs]
+
+def get_request_key(parent_a, parent_b, targets, top):
+    # 规范键: 紧凑基因型编码, 父母顺序无关
+    pair = tuple(sorted((get_genotype_key(parent_a), get_genotype_key(parent_b))))
+    return pair, targets, top
+
+# ================= 2. 调度: 缓存 + 在途合并 + 分块提交 =================
+class PairingService:
+    def __init__(self, workers=None, chunk_size=32, cache=None):
+        # workers=0 时在默认线程池中计算 (便于调试与小规模使用)
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        self.chunk_size = chunk_size
+        self.cache = cache or PairingCache(max_entries=20000, max_bytes=128 * 1024 * 1024)
+        self.computed = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    def close(self):
+        if self.pool is not None: self.pool.shutdown(cancel_futures=True)
+
+    def parse_options(self, body):
+        targets = body.get("targets") or ()
+        if isinstance(targets, str): targets = targets.split(",")
+        targets = tuple(sorted({str(t).strip() for t in targets if str(t).strip()}))
+        unknown = [t for t in targets if t not in GENE_DB]
+        if unknown:
+            raise RequestError(f"未知目标基因: {', '.join(unknown)}")
+        top = body.get("top", DEFAULT_TOP)
+        # bool 是 int 的子类, "top": true 需单独排除
+        if isinstance(top, bool) or not isinstance(top, int) or not 0 <= top <= MAX_TOP:
+            raise RequestError(f"top 须为 0~{MAX_TOP} 的整数")
+        return targets, top
+
+    async def evaluate_many(self, jobs):
+        """jobs 为 [(parent_a, parent_b, targets, top)], 按顺序返回结果 dict。"""
+        loop = asyncio.get_running_loop()
+        futures, misses = [], []
+        for job in jobs:
+            key = get_request_key(*job)
+            cached = self.cache.get(key)
+            if cached is not None:
+                fut = loop.create_future()
+                fut.set_result(cached)
+            elif key in self._inflight:
+                fut = self._inflight[key]
+                self.coalesced += 1
+            else:
+                fut = self._inflight[key] = loop.create_future()
+                misses.append((key, job))
+            futures.append(fut)
+        for i in range(0, len(misses), self.chunk_size):
+            asyncio.ensure_future(self._run_chunk(misses[i:i + self.chunk_size]))
+        return await asyncio.gather(*futures)
+
+    async def _run_chunk(self, chunk):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, _evaluate_chunk, [job for _, job in chunk])
+        except Exception as e:
+            for key, _ in chunk:
+                fut = self._inflight.pop(key)
+                if not fut.done(): fut.set_exception(e)
+            return
+        self.computed += len(chunk)
+        for (key, _), payload in zip(chunk, results):
+            self.cache.put(key, payload, estimate_bytes(payload))
+            fut = self._inflight.pop(key)
+            if not fut.done(): fut.set_result(payload)
+
+    async def handle_pair(self, body):
+        targets, top = self.parse_options(body)
+        try:
+            parent_a, parent_b = parse_genotype(body.get("parent_a")), parse_genotype(body.get("parent_b"))
+        except (ValueError, TypeError) as e:
+            raise RequestError(str(e))
+        (payload,) = await self.evaluate_many([(parent_a, parent_b, targets, top)])
+        return payload
+
+    async def handle_batch(self, body):
+        targets, top = self.parse_options(body)
+        pairings = body.get("pairings")
+        if not isinstance(pairings, list):
+            raise RequestError("pairings 须为数组")
+        if len(pairings) > MAX_BATCH:
+            raise RequestError(f"单次最多 {MAX_BATCH} 个配对")
+        results, jobs, slots = [], [], []
+        for i, item in enumerate(pairings):
+            item = item if isinstance(item, dict) else {}
+            row = {"id": item.get("id", i)}
+            try:
+                jobs.append((parse_genotype(item.get("parent_a")), parse_genotype(item.get("parent_b")), targets, top))
+                slots.append(row)
+            except (ValueError, TypeError) as e:
+                row["error"] = str(e)
+            results.append(row)
+        for row, payload in zip(slots, await self.evaluate_many(jobs)):
+            row.update(payload)
+        return {"results": results}
+
+    def stats(self):
+        return {**self.cache.stats(), "computed": self.computed, "coalesced": self.coalesced,
+                "inflight": len(self._inflight)}
+
+# ================= 3. HTTP 前端 (HTTP/1.1, 支持 keep-alive) =================
+async def _read_request(reader):
+    # 此处的 RequestError 说明流中位置已不可信 (请求体未读或长度未知), 调用方回复 400 后须关闭连接
+    try:
+        request_line = await reader.readline()
+        if not request_line: return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise RequestError("请求行格式错误")
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except ValueError:
+        # StreamReader.readline 在单行超过缓冲上限时抛出 ValueError
+        raise RequestError("请求行或请求头过长") from None
+    length = headers.get("content-length") or "0"
+    if not (length.isascii() and length.isdigit()):
+        raise RequestError("Content-Length 无效")
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise RequestError("请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], headers, body
+
+def _encode_response(status, payload, keep_alive):
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + data
+
+async def _dispatch(service, method, path, body):
+    if method == "GET" and path == "/health":
+        return {"status": "ok"}
+    if method == "GET" and path == "/stats":
+        return service.stats()
+    routes = {"/pair": service.handle_pair, "/batch": service.handle_batch}
+    if path not in routes:
+        return HTTPStatus.NOT_FOUND, {"error": f"未知路径: {path}"}
+    if method != "POST":
+        return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "只支持 POST"}
+    try:
+        body = json.loads(body or b"{}")
+    except ValueError:
+        raise RequestError("请求体不是有效的 JSON")
+    if not isinstance(body, dict):
+        raise RequestError("请求体须为 JSON 对象")
+    return await routes[path](body)
+
+def make_handler(service):
+    async def handle(reader, writer):
+        try:
+            while True:
+                keep_alive = False  # 请求未能完整读取时, 回复后关闭连接
+                try:
+                    request = await _read_request(reader)
+                    if request is None: break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    result = await _dispatch(service, method, path, body)
+                    status, payload = result if isinstance(result, tuple) else (HTTPStatus.OK, result)
+                except RequestError as e:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+                    break
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive: break
+        finally:
+            writer.close()
+    return handle
+
+async def start_server(service, host="127.0.0.1", port=8765):
+    return await asyncio.start_server(make_handler(service), host, port)
+
+# ================= 4. 离线压测 =================
+def random_genotype(rng, n_genes=4):
+    # 随机基因型: 每个复合组最多取一个基因, 保证合法
+    genotype, used = {}, set()
+    for gid in rng.sample(sorted(GENE_DB), len(GENE_DB)):
+        if len(genotype) >= n_genes: break
+        if get_locus_id(gid) in used: continue
+        used.add(get_locus_id(gid))
+        genotype[gid] = rng.choice((1, 2))
+    return genotype
+
+async def _client(host, port, bodies, path, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            data = json.dumps(body).encode("utf-8")
+            start = time.perf_counter()
+            writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+            await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""): break
+                if line.lower().startswith(b"content-length:"): length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+async def run_bench(requests=2000, concurrency=64, distinct=200, batch_size=0, workers=None, n_genes=4, seed=0):
+    """在本机起临时服务并发压测, 返回吞吐与延迟统计 (毫秒)。batch_size > 0 时压测 /batch。"""
+    rng = random.Random(seed)
+    pool = [{"parent_a": random_genotype(rng, n_genes), "parent_b": random_genotype(rng, n_genes)} for _ in range(distinct)]
+    if batch_size:
+        path = "/batch"
+        bodies = [{"pairings": [rng.choice(pool) for _ in range(batch_size)], "targets": [], "top": 3}
+                  for _ in range(max(1, requests // batch_size))]
+    else:
+        path = "/pair"
+        bodies = [{**rng.choice(pool), "top": 3} for _ in range(requests)]
+
+    service = PairingService(workers=workers)
+    server = await start_server(service, port=0)
+    host, port = server.sockets[0].getsockname()[:2]
+    latencies = []
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[_client(host, port, bodies[i::concurrency], path, latencies) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.close()
+    pairings = len(bodies) * (batch_size or 1)
+    return {
+        "endpoint": path, "http_requests": len(bodies), "pairings": pairings, "concurrency": concurrency,
+        "seconds": round(elapsed, 3), "requests_per_s": round(len(bodies) / elapsed, 1),
+        "pairings_per_s": round(pairings / elapsed, 1),
+        "latency_ms": {"p50": round(_percentile(latencies, 50) * 1000, 2), "p95": round(_percentile(latencies, 95) * 1000, 2),
+                       "p99": round(_percentile(latencies, 99) * 1000, 2), "max": round(max(latencies) * 1000, 2)},
+        **{k: v for k, v in service.stats().items() if k in ("hits", "misses", "computed", "coalesced")},
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="球蟒配对计算 JSON API 服务")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="启动服务")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=None, help="进程数, 默认 CPU 核数; 0 为不用进程池")
+    bench = sub.add_parser("bench", help="离线压测")
+    bench.add_argument("--requests", type=int, default=2000)
+    bench.add_argument("--concurrency", type=int, default=64)
+    bench.add_argument("--distinct", type=int, default=200, help="不同配对的数量 (越小缓存命中越多)")
+    bench.add_argument("--batch-size", type=int, default=0, help="> 0 时压测 /batch, 每个请求含这么多配对")
+    bench.add_argument("--genes", type=int, default=4, help="每条亲本的基因数")
+    bench.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        print(json.dumps(asyncio.run(run_bench(args.requests, args.concurrency, args.distinct, args.batch_size,
+                                               args.workers, args.genes)), ensure_ascii=False, indent=2))
+        return
+
+    async def serve_forever():
+        service = PairingService(workers=args.workers)
+        server = await start_server(service, args.host, args.port)
+        print(f"listening on http://{args.host}:{args.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            service.close()
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
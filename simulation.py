@@ -0,0 +1,87 @@
+"""整窝蒙特卡洛模拟: 从子代分布批量抽样整窝蛋, 统计每窝/每季的结果分布。
+
+各位点独立, 按位点累积概率对均匀随机数做 searchsorted 即可得到位点状态, 整批向量化, 不逐蛋循环。
+致死分值 (LETHAL_RISKS) 的蛋视为无法出壳, 不计入命中与成体数量。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from genetics import (
+    OffspringTable, get_locus_distributions, get_loci_gene_ids, get_combo_hit_mask,
+    get_visual_mask, get_lethal_mask,
+)
+from query import MODES, get_query_masks
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+EGGS_PER_BATCH = 1 << 20
+
+# 各计数字段为 {"mean", "p_any", "quantiles"}; season 为整季汇总 (season_clutches > 1 时)
+ClutchStats = namedtuple("ClutchStats", ["n_clutches", "clutch_size", "hits", "visuals", "lethal", "survivors", "season"])
+
+def _locus_samplers(loci):
+    # 每个位点: (状态矩阵 [状态数 × 位点基因数], 累积概率)
+    samplers = []
+    for gene_ids, dist in loci:
+        states = sorted(dist)
+        samplers.append((np.array(states, dtype=np.int8).reshape(len(states), len(gene_ids)),
+                         np.cumsum([dist[s] for s in states]) / 4))
+    return samplers
+
+def _sample_geno(rng, samplers, n_genes, n_eggs):
+    geno = np.empty((n_eggs, n_genes), dtype=np.int8)
+    col = 0
+    for states, cum in samplers:
+        idx = np.minimum(np.searchsorted(cum, rng.random(n_eggs), side="right"), len(cum) - 1)
+        geno[:, col:col + states.shape[1]] = states[idx]
+        col += states.shape[1]
+    return geno
+
+def _summarize(counts):
+    return {
+        "mean": float(counts.mean()),
+        "p_any": float((counts > 0).mean()),
+        "quantiles": {q: float(v) for q, v in zip(QUANTILES, np.quantile(counts, QUANTILES))},
+    }
+
+def simulate_clutches(parent_a_geno, parent_b_geno, clutch_size=6, n_clutches=100000, targets=(),
+                      mode="strict", season_clutches=1, seed=None, query=None):
+    """抽样 n_clutches 窝, 每窝 clutch_size 枚蛋; seed 相同则结果可复现。
+
+    season_clutches > 1 时, 另将相邻的 season_clutches 窝合并为一季统计 (不足一季的尾部丢弃)。
+    query 为 query.parse_query 的条件树时, 用它代替 targets 判定命中。
+    """
+    loci = get_locus_distributions(parent_a_geno, parent_b_geno)
+    gene_ids = get_loci_gene_ids(loci)
+    samplers = _locus_samplers(loci)
+    rng = np.random.default_rng(seed)
+
+    per_clutch = {name: np.empty(n_clutches, dtype=np.int32) for name in ("hits", "visuals", "lethal")}
+    clutches_per_batch = max(1, EGGS_PER_BATCH // clutch_size)
+    for start in range(0, n_clutches, clutches_per_batch):
+        n = min(clutches_per_batch, n_clutches - start)
+        table = OffspringTable(gene_ids, _sample_geno(rng, samplers, len(gene_ids), n * clutch_size), None)
+        dead = get_lethal_mask(table)
+        alive = ~dead
+        if query is not None:
+            hit = get_query_masks(query, table)[MODES.index(mode)] & alive
+        else:
+            hit = get_combo_hit_mask(table, targets, mode) & alive if targets else np.zeros_like(alive)
+        visual = get_visual_mask(table) & alive
+        for name, mask in (("hits", hit), ("visuals", visual), ("lethal", dead)):
+            per_clutch[name][start:start + n] = mask.reshape(n, clutch_size).sum(axis=1)
+
+    survivors = clutch_size - per_clutch["lethal"]
+    season = None
+    if season_clutches > 1 and n_clutches >= season_clutches:
+        n_seasons = n_clutches // season_clutches
+        season = {
+            name: _summarize(counts[:n_seasons * season_clutches].reshape(n_seasons, season_clutches).sum(axis=1))
+            for name, counts in (("hits", per_clutch["hits"]), ("visuals", per_clutch["visuals"]),
+                                 ("lethal", per_clutch["lethal"]), ("survivors", survivors))
+        }
+    return ClutchStats(
+        n_clutches, clutch_size,
+        _summarize(per_clutch["hits"]), _summarize(per_clutch["visuals"]),
+        _summarize(per_clutch["lethal"]), _summarize(survivors), season,
+    )
@@ -0,0 +1,109 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genetics import build_full_table, get_combo_hit_probability, get_locus_distributions, get_visual_probability
+from holdbacks import SIBLING, compute_holdback_matrix, expand_to_outcomes
+from planner import plan_breeding
+from pricing import build_price_table, evaluate_pairing_value, parse_phenotype
+from projection import SCHEME_BACKCROSS, SCHEME_SIBLING, project_generations
+from query import parse_query
+from simulation import simulate_clutches
+
+# ================= 多代投影 =================
+def test_projection_first_generation_is_the_pairing():
+    male, female = {"Clown": 1, "Mojave": 1}, {"Clown": 2, "Lesser": 1}
+    f1 = project_generations(male, female, generations=1)[0]
+    expected = get_locus_distributions(male, female)
+    assert [ids for ids, _ in f1] == [ids for ids, _ in expected]
+    for (_, got), (_, want) in zip(f1, expected):
+        assert {s: c for s, c in got.items() if c} == pytest.approx(want)
+
+def test_projection_sibling_and_backcross():
+    # 同窝互配 (全同胞近交): Visual = p² + F·pq, 近交系数 F 依次为 0, 0, 1/4, 3/8
+    gens = project_generations({"Clown": 1}, {"Clown": 1}, SCHEME_SIBLING, generations=4)
+    assert [get_visual_probability(loci) for loci in gens] == pytest.approx([1 / 4, 1 / 4, 5 / 16, 11 / 32])
+    # 与 Visual 公蛇连续回交: F1 全为 Het, F2 Visual 1/2, F3 3/4
+    gens = project_generations({"Clown": 2}, {}, SCHEME_BACKCROSS, generations=3)
+    assert [get_visual_probability(loci) for loci in gens] == pytest.approx([0, 0.5, 0.75])
+
+def test_projection_rejects_unknown_scheme():
+    with pytest.raises(ValueError):
+        project_generations({"Clown": 1}, {}, "selfing")
+
+# ================= 留种矩阵 =================
+def test_holdback_matrix_exact_hits():
+    clutch = get_locus_distributions({"Clown": 1}, {"Clown": 1})
+    matrix = compute_holdback_matrix(clutch, {"visual": {"Clown": 2}, "normal": {}}, parse_query("Clown"), max_workers=0)
+    assert matrix.partners == ["visual", "normal", SIBLING]
+    hits = {row[0]: list(h) for row, h in zip(matrix.holdbacks.geno.tolist(), matrix.hits)}
+    # 与同窝随机一条配对: 对方为 Visual / Het / 原色的概率为 1/4, 1/2, 1/4
+    assert hits[2] == pytest.approx([1.0, 0.0, 0.5])
+    assert hits[1] == pytest.approx([0.5, 0.0, 0.25])
+    assert hits[0] == pytest.approx([0.0, 0.0, 0.0])
+
+def test_holdback_matrix_process_pool_matches_inline():
+    clutch = get_locus_distributions({"Clown": 1, "Pastel": 1}, {"Clown": 1, "Pied": 1})
+    partners = {"a": {"Clown": 2, "Pied": 1}, "b": {"Pied": 2}}
+    node = parse_query("Clown AND Pied:het")
+    inline = compute_holdback_matrix(clutch, partners, node, max_workers=0)
+    pooled = compute_holdback_matrix(clutch, partners, node, max_workers=2, chunk_size=1)
+    assert np.allclose(inline.hits, pooled.hits)
+    # 展开到完整 F1 表: 每行的命中率等于其条件相关基因状态的命中率
+    table = build_full_table(clutch)
+    expanded = expand_to_outcomes(inline, table)
+    assert expanded.shape == (len(table.prob), 3)
+
+# ================= 估价 =================
+def test_parse_phenotype():
+    assert parse_phenotype("Super Pastel + Clown") == {"Pastel": 2, "Clown": 2}
+    assert parse_phenotype("Normal") == {}
+    for bad in ("Het Clown", "Super Clown", "Foo"):
+        with pytest.raises(ValueError):
+            parse_phenotype(bad)
+
+def test_clutch_value_exact():
+    prices = build_price_table([("Clown", 100), ("Normal", 10)])
+    value = evaluate_pairing_value({"Clown": 1}, {"Clown": 1}, prices, clutch_size=4)
+    # Het 看不出, 按原色计: 1/4 × 100 + 3/4 × 10
+    assert value.egg_value == pytest.approx(32.5)
+    assert value.clutch_value == pytest.approx(130)
+    assert value.risk_loss == 0 and value.lethal_prob == 0
+
+def test_clutch_value_lethal_and_risk_discount():
+    prices = build_price_table([("Spider", 50)])
+    value = evaluate_pairing_value({"Spider": 1}, {"Spider": 1}, prices, clutch_size=1, risk_discount=0.5)
+    # Super Spider 致死且不匹配 Spider 价目; Spider (Wobble 风险) 1/2 × 50 按五折计
+    assert value.lethal_prob == pytest.approx(0.25)
+    assert value.egg_value == pytest.approx(12.5)
+    assert value.risk_loss == pytest.approx(0.5 * 50 * 0.5)
+
+def test_price_table_rejects_duplicates():
+    with pytest.raises(ValueError):
+        build_price_table([("Clown", 1), ("clown", 2)])
+
+# ================= 选育规划 =================
+def test_planner_direct_pairing():
+    plans = plan_breeding({"m": ("M", {"Clown": 2}), "f": ("F", {"Clown": 2})}, ["Clown"])
+    assert plans[0].generations == 1 and plans[0].success_prob == pytest.approx(1.0)
+
+def test_planner_needs_a_holdback_generation():
+    plans = plan_breeding({"m": ("M", {"Clown": 2}), "f": ("F", {})}, ["Clown"], horizon=2)
+    assert plans and all(p.generations == 2 for p in plans)
+    assert 0 < plans[0].success_prob <= 1
+    assert plan_breeding({"m": ("M", {"Clown": 2}), "f": ("F", {})}, ["Clown"], horizon=1) == []
+
+# ================= 整窝模拟 =================
+def test_simulation_is_reproducible_and_unbiased():
+    a, b = {"Clown": 1, "Spider": 1}, {"Clown": 1, "Spider": 1}
+    first = simulate_clutches(a, b, clutch_size=6, n_clutches=20000, targets=["Clown"], seed=1)
+    second = simulate_clutches(a, b, clutch_size=6, n_clutches=20000, targets=["Clown"], seed=1)
+    assert first.hits == second.hits
+    # 命中需存活: 1/4 (Visual) × 3/4 (非 Super Spider) × 6
+    assert first.hits["mean"] == pytest.approx(6 * 0.25 * 0.75, rel=0.03)
+    assert first.lethal["mean"] == pytest.approx(6 * 0.25, rel=0.03)
+    assert get_combo_hit_probability(get_locus_distributions(a, b), ["Clown"]) == 0.25
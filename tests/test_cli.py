@@ -0,0 +1,68 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli import evaluate_record, iter_pairings, main, parse_genotype
+
+@pytest.mark.parametrize("value", [
+    {"Pastel": 2.7},
+    {"Clown": 1.5},
+    {"Clown": True},
+    {"Clown": False},
+    {"Clown": "1.5"},
+    {"Clown": "x"},
+    {"Clown": None},
+    {"Clown": 3},
+    {"Clown": -1},
+    "Clown=1.0",
+    "Clown=two",
+    "Clown=",
+])
+def test_parse_genotype_rejects_inexact_scores(value):
+    with pytest.raises(ValueError):
+        parse_genotype(value)
+
+def test_parse_genotype_accepts_exact_scores():
+    assert parse_genotype({"Clown": 2, "Pastel": 1.0, "Pied": "1"}) == {"Clown": 2, "Pastel": 1, "Pied": 1}
+    assert parse_genotype("Clown=2; Pastel = 1") == {"Clown": 2, "Pastel": 1}
+    assert parse_genotype("") == {}
+
+def test_parse_genotype_rejects_unknown_gene():
+    with pytest.raises(ValueError):
+        parse_genotype({"Foo": 1})
+
+def test_evaluate_record_reports_bad_score_in_error_column():
+    row = evaluate_record("p1", {"Clown": 1.5}, {"Clown": 1}, ("Clown",))
+    assert row["id"] == "p1"
+    assert row["错误"] and row["完美成体概率"] is None
+
+def test_iter_pairings_reports_file_line_numbers(tmp_path):
+    path = tmp_path / "pairings.csv"
+    path.write_text("id,parent_a,parent_b\n,Clown=1,Clown=1\nc2,Clown=1,Clown=x\n", encoding="utf-8")
+    rows = [evaluate_record(*record[:3], error=record[3]) for record in iter_pairings(str(path), "csv")]
+    # 无 id 的记录以文件行号为 id: 表头之后的第一条为第 2 行
+    assert [row["id"] for row in rows] == ["2", "c2"]
+    assert rows[0]["错误"] is None and rows[1]["错误"]
+
+def test_iter_pairings_keeps_going_after_bad_jsonl_lines(tmp_path):
+    path = tmp_path / "pairings.jsonl"
+    path.write_text('{"id": "p1", "parent_a": {"Clown": 1}, "parent_b": "Clown=1"}\n{oops\n\n[1, 2]\n'
+                    '{"parent_a": {"Clown": true}, "parent_b": {}}\n', encoding="utf-8")
+    records = list(iter_pairings(str(path), "jsonl"))
+    assert [r[0] for r in records] == ["p1", "2", "4", "5"]
+    assert [r[3] is None for r in records] == [True, False, False, True]
+    rows = [evaluate_record(pair_id, a, b, ("Clown",), 0, error) for pair_id, a, b, error in records]
+    assert rows[0]["完美成体概率"] == 0.25 and rows[0]["错误"] is None
+    assert all(row["错误"] for row in rows[1:])
+
+def test_main_writes_error_rows(tmp_path):
+    src, out = tmp_path / "pairings.jsonl", tmp_path / "results.csv"
+    src.write_text('{"id": "p1", "parent_a": {"Pastel": 2.7}, "parent_b": {}}\n', encoding="utf-8")
+    main([str(src), "-o", str(out)])
+    with open(out, encoding="utf-8") as f:
+        (row,) = csv.DictReader(f)
+    assert row["id"] == "p1" and "Pastel" in row["错误"]
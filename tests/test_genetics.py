@@ -0,0 +1,129 @@
+import os
+import sys
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genetics import (
+    GENE_ORDER, PairingCache, build_full_table, build_top_table, calculate_offspring_exact, code_to_token,
+    decode_genotype, encode_genotype, encode_table_rows, get_lethal_probability, get_locus_distributions,
+    get_pairing_key, get_pairing_result, get_phenotype_scores, get_visual_probability, token_to_code,
+)
+
+def _table_fractions(table):
+    # {((基因, 分值), ...): Fraction}; 表中概率均为 k / 4^n, 转为 Fraction 无误差
+    return {tuple(sorted((g, s) for g, s in zip(table.gene_ids, row) if s)): Fraction(p)
+            for row, p in zip(table.geno.tolist(), table.prob.tolist())}
+
+def _exact(parent_a, parent_b):
+    return {tuple((g, s) for g, s in geno if s): p for geno, p in calculate_offspring_exact(parent_a, parent_b)}
+
+def test_full_table_recessive_het_pair():
+    table = build_full_table(get_locus_distributions({"Clown": 1}, {"Clown": 1}))
+    assert _table_fractions(table) == {(("Clown", 2),): Fraction(1, 4), (("Clown", 1),): Fraction(1, 2), (): Fraction(1, 4)}
+    # 按概率降序
+    assert table.prob.tolist() == sorted(table.prob.tolist(), reverse=True)
+
+def test_full_table_bel_locus():
+    # Mojave 与 Lesser 同属 BEL 位点: 两条亲本各给一个等位基因
+    table = build_full_table(get_locus_distributions({"Mojave": 1}, {"Lesser": 1}))
+    assert _table_fractions(table) == {(("Lesser", 1), ("Mojave", 1)): Fraction(1, 4), (("Mojave", 1),): Fraction(1, 4),
+                                       (("Lesser", 1),): Fraction(1, 4), (): Fraction(1, 4)}
+
+@pytest.mark.parametrize("pair", [
+    ({"Clown": 1, "Pastel": 2}, {"Clown": 2, "Pied": 1}),
+    ({"Mojave": 1, "Spider": 1, "Clown": 1}, {"Lesser": 1, "Woma": 1, "Clown": 1}),
+    ({"Pastel": 1, "Pied": 1, "Enchi": 1, "Albino": 1}, {"Pastel": 1, "Pied": 1, "Enchi": 1, "Albino": 1}),
+])
+def test_full_table_matches_exact_enumeration(pair):
+    table = build_full_table(get_locus_distributions(*pair))
+    assert _table_fractions(table) == _exact(*pair)
+    assert sum(_table_fractions(table).values()) == 1
+
+def test_top_table_is_a_prefix_of_the_full_table():
+    pair = ({"Pastel": 1, "Pied": 1, "Enchi": 1, "Albino": 1}, {"Pastel": 1, "Pied": 1, "Enchi": 1, "Albino": 1})
+    loci = get_locus_distributions(*pair)
+    exact = _exact(*pair)
+    table, other = build_top_table(loci, top_k=5)
+    top = _table_fractions(table)
+    assert len(top) == 5
+    assert all(exact[k] == p for k, p in top.items())
+    assert min(top.values()) >= max(p for k, p in exact.items() if k not in top)
+    assert Fraction(other) == 1 - sum(top.values())
+    # 不截断时与完整表一致, 剩余概率为 0
+    table, other = build_top_table(loci)
+    assert _table_fractions(table) == exact and other == 0
+
+def test_top_table_mass_cutoff():
+    loci = get_locus_distributions({"Clown": 1}, {"Clown": 1})
+    table, other = build_top_table(loci, mass=0.5)
+    assert _table_fractions(table) == {(("Clown", 1),): Fraction(1, 2)} and other == 0.5
+
+def test_phenotype_scores_merge_recessive_het_only():
+    assert get_phenotype_scores(("Clown",), (1,)) == (0,)
+    assert get_phenotype_scores(("Clown",), (2,)) == (2,)
+    assert get_phenotype_scores(("Pastel",), (1,)) == (1,)
+
+def test_lethal_and_visual_probabilities():
+    loci = get_locus_distributions({"Spider": 1}, {"Spider": 1})
+    assert get_lethal_probability(loci) == 0.25
+    assert get_visual_probability(get_locus_distributions({"Clown": 1}, {"Clown": 1})) == 0.25
+
+# ================= 基因型编码 =================
+@pytest.mark.parametrize("genotype", [{}, {"Clown": 1}, {"Clown": 2, "Pastel": 1, "Mojave": 1, "Lesser": 1},
+                                      {GENE_ORDER[-1]: 2, GENE_ORDER[0]: 1}])
+def test_genotype_code_round_trip(genotype):
+    code = encode_genotype(genotype)
+    assert decode_genotype(code) == genotype
+    assert token_to_code(code_to_token(code)) == code
+    # 0 分基因不影响编码
+    assert encode_genotype({**genotype, "Pied": 0}) == code
+
+def test_decode_rejects_out_of_range_codes():
+    with pytest.raises(ValueError):
+        decode_genotype(-1)
+    with pytest.raises(ValueError):
+        decode_genotype(3 ** len(GENE_ORDER))
+
+def test_table_row_codes_match_encode_genotype():
+    table = build_full_table(get_locus_distributions({"Clown": 1, "Pastel": 1}, {"Clown": 1, GENE_ORDER[-1]: 1}))
+    codes = encode_table_rows(table)
+    assert [int(c) for c in codes] == [encode_genotype(dict(zip(table.gene_ids, row))) for row in table.geno.tolist()]
+
+# ================= 配对缓存 =================
+def test_pairing_key_is_symmetric():
+    a, b = {"Clown": 1, "Pastel": 1}, {"Clown": 2}
+    assert get_pairing_key(a, b, ["Clown"]) == get_pairing_key(b, a, ["Clown"])
+    assert get_pairing_key(a, b, ["Clown"]) == get_pairing_key({**a, "Pied": 0}, b, ["Clown"])
+    assert get_pairing_key(a, b, ["Clown"]) != get_pairing_key(a, b, ["Pastel"])
+
+def test_cache_evicts_least_recently_used_by_count():
+    cache = PairingCache(max_entries=2, max_bytes=1000)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.put("c", 3, 10)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["entries"] == 2 and cache.total_bytes == 20
+
+def test_cache_evicts_by_bytes_and_skips_oversized_values():
+    cache = PairingCache(max_entries=10, max_bytes=100)
+    cache.put("a", 1, 60)
+    cache.put("b", 2, 60)
+    assert cache.get("a") is None and cache.get("b") == 2 and cache.total_bytes == 60
+    cache.put("huge", 3, 101)
+    assert cache.get("huge") is None and cache.get("b") == 2
+    cache.put("b", 4, 30)  # 覆盖时按新大小计
+    assert cache.get("b") == 4 and cache.total_bytes == 30
+
+def test_pairing_result_is_shared_between_parent_orders():
+    cache = PairingCache()
+    a, b = {"Clown": 1, "Pastel": 1}, {"Clown": 1}
+    first = get_pairing_result(cache, a, b, ["Clown", "Pastel"])
+    misses = cache.misses
+    second = get_pairing_result(cache, b, a, ["Clown", "Pastel"])
+    assert cache.misses == misses
+    assert second.table is first.table and np.array_equal(second.labels, first.labels)
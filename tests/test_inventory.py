@@ -0,0 +1,55 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import FEMALE, MALE, Animal, Inventory, read_animals_csv
+
+def _read(text):
+    return read_animals_csv(io.StringIO(text))
+
+def test_read_animals_csv():
+    animals = _read("id,sex,Clown,Pastel,sire\nA1,M,1,,\n B2 ,female,2.0,1,A1\n")
+    assert animals == [Animal("A1", MALE, {"Clown": 1}, None, None, None),
+                       Animal("B2", FEMALE, {"Clown": 2, "Pastel": 1}, "A1", None, None)]
+
+def test_read_animals_csv_without_gene_columns():
+    animals = _read("id,sex,clutch\nA1,M,c1\nA2,F,c1\n")
+    assert [(a.id, a.sex, a.genotype, a.clutch) for a in animals] == [("A1", MALE, {}, "c1"), ("A2", FEMALE, {}, "c1")]
+
+@pytest.mark.parametrize("text", [
+    "id,sex,Clown\nA1,M,1\nA1,F,2\n",        # id 重复
+    "id,sex,Clown\nA1,M,1\n,F,2\n",          # id 为空
+    "id,sex,Clown\nA1,M,1.5\n",              # 小数分值
+    "id,sex,Clown\nA1,M,x\n",                # 非数字分值
+    "id,sex,Clown\nA1,M,3\n",                # 超出 0~2
+    "id,Clown\nA1,1\n",                      # 缺少 sex 列
+    "id,sex,Foo\nA1,M,1\n",                  # 未知基因列
+    "id,sex,Clown\nA1,X,1\n",                # 无法识别的性别
+])
+def test_read_animals_csv_rejects_bad_rows(text):
+    with pytest.raises(ValueError):
+        _read(text)
+
+def test_add_animals_rejects_duplicate_ids():
+    inventory = Inventory(":memory:")
+    try:
+        with pytest.raises(ValueError):
+            inventory.add_animals([Animal("A1", MALE, {}, None, None, None)] * 2)
+        assert inventory.count() == 0
+    finally:
+        inventory.close()
+
+def test_find_by_query():
+    inventory = Inventory(":memory:")
+    try:
+        inventory.import_csv(io.StringIO("id,sex,Clown,Pastel\nA1,M,1,\nA2,F,2,1\nA3,F,,1\n"))
+        assert [a.id for a in inventory.find("Clown")] == ["A2"]
+        assert [a.id for a in inventory.find("Clown", mode="loose")] == ["A1", "A2"]
+        assert [a.id for a in inventory.find("NOT Clown")] == ["A3"]
+        assert [a.id for a in inventory.find("Pastel", sex=FEMALE)] == ["A2", "A3"]
+    finally:
+        inventory.close()
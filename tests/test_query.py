@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genetics import build_full_table, calculate_phenotype_for_display, get_locus_distributions
+from query import (
+    MODES, evaluate_query, get_phenotype_tier_probs, get_query_masks, get_query_probability, get_query_tiers, parse_query,
+)
+
+PAIRS = [
+    ({"Clown": 1}, {"Clown": 1}),
+    ({"Clown": 1, "Pastel": 1}, {"Clown": 2, "Mojave": 1}),
+    ({"Pied": 1, "Lesser": 1}, {"Pied": 1, "Mojave": 1}),
+]
+QUERIES = [
+    "NOT Clown",
+    "NOT NOT Clown",
+    "Pastel AND NOT Clown",
+    "NOT (Clown OR Pied)",
+    "any(1, NOT Clown, Pastel)",
+    "any(2, Clown, NOT Pied, Mojave)",
+]
+
+@pytest.mark.parametrize("pair", PAIRS)
+@pytest.mark.parametrize("text", QUERIES)
+def test_strict_hits_are_subset_of_loose(pair, text):
+    node = parse_query(text)
+    loci = get_locus_distributions(*pair)
+    table = build_full_table(loci)
+    strict, loose = get_query_masks(node, table)
+    assert not (strict & ~loose).any()
+
+    # 三层互不重叠且覆盖全部结果
+    tiers = get_query_tiers(node, table)
+    assert set(np.unique(tiers)) <= {1, 2, 3}
+    assert np.array_equal(tiers == 1, strict)
+    assert np.array_equal(tiers == 2, loose & ~strict)
+
+    p_strict, p_loose = (get_query_probability(node, loci, m) for m in MODES)
+    assert p_strict <= p_loose + 1e-12
+
+    # 向量化求值、逐条求值与概率三者一致
+    for mode, mask in zip(MODES, (strict, loose)):
+        rows = [dict(zip(table.gene_ids, map(int, g))) for g in table.geno]
+        assert [evaluate_query(node, g, mode) for g in rows] == mask.tolist()
+        assert get_query_probability(node, loci, mode) == pytest.approx(float(table.prob[mask].sum()))
+
+def test_not_recessive_het_pair():
+    # Clown het × Clown het: 严格模式 NOT Clown = 非 (至少 het), 宽松模式 = 非 (visual)
+    node = parse_query("NOT Clown")
+    loci = get_locus_distributions({"Clown": 1}, {"Clown": 1})
+    assert get_query_probability(node, loci, "strict") == pytest.approx(0.25)
+    assert get_query_probability(node, loci, "loose") == pytest.approx(0.75)
+
+@pytest.mark.parametrize("pair", PAIRS)
+@pytest.mark.parametrize("text", QUERIES + ["Clown:het", "Clown=1 AND Pastel"])
+def test_phenotype_tiers_match_genotype_probabilities(pair, text):
+    # 表现型表把隐性 Het 并入原色; 各组概率之和须与基因型层面的命中概率一致
+    node = parse_query(text)
+    loci, table, other_prob = calculate_phenotype_for_display(*pair)
+    assert other_prob == 0
+    split = get_phenotype_tier_probs(node, loci, table)
+    assert split.sum(axis=1) == pytest.approx(table.prob)
+    p_strict, p_loose = (get_query_probability(node, loci, m) for m in MODES)
+    assert split.sum(axis=0) == pytest.approx([p_strict, p_loose - p_strict, 1 - p_loose])
+
+def test_phenotype_tiers_recessive_het_target():
+    # Clown het × Clown het: 原色表现型中 2/3 为 Clown het, 应计入项目组而非其他组
+    node = parse_query("Clown")
+    loci, table, _ = calculate_phenotype_for_display({"Clown": 1}, {"Clown": 1})
+    split = dict(zip(table.geno[:, table.gene_ids.index("Clown")].tolist(), get_phenotype_tier_probs(node, loci, table).tolist()))
+    assert split[2] == pytest.approx([0.25, 0, 0])
+    assert split[0] == pytest.approx([0, 0.5, 0.25])
+    # NOT 按相反模式求值: 严格组为「不是 Het / Visual」的原色
+    split = dict(zip(table.geno[:, table.gene_ids.index("Clown")].tolist(),
+                     get_phenotype_tier_probs(parse_query("NOT Clown"), loci, table).tolist()))
+    assert split[0] == pytest.approx([0.25, 0.5, 0])
+    assert split[2] == pytest.approx([0, 0, 0.25])
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import MAX_BODY_BYTES, PairingService, RequestError, start_server
+
+def _run(coro_fn):
+    # 每个测试一个事件循环与不用进程池的服务
+    async def main():
+        service = PairingService(workers=0)
+        try:
+            return await coro_fn(service)
+        finally:
+            service.close()
+    return asyncio.run(main())
+
+async def _http(service, data):
+    # 起临时服务, 发送原始字节, 读到连接关闭为止; 返回 [(状态码, 响应体)]
+    server = await start_server(service, port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+    responses = []
+    while raw:
+        head, _, raw = raw.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        length = next(int(l.split(":")[1]) for l in lines if l.lower().startswith("content-length:"))
+        responses.append((int(lines[0].split()[1]), json.loads(raw[:length])))
+        raw = raw[length:]
+    return responses
+
+def _post(path, body):
+    data = json.dumps(body).encode("utf-8")
+    return f"POST {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+
+@pytest.mark.parametrize("parent_a", [{"Clown": 1.5}, {"Clown": True}, {"Pastel": 2.7}, "Clown=x"])
+def test_pair_rejects_inexact_scores(parent_a):
+    async def check(service):
+        with pytest.raises(RequestError):
+            await service.handle_pair({"parent_a": parent_a, "parent_b": {"Clown": 1}})
+    _run(check)
+
+def test_batch_reports_bad_rows_and_evaluates_the_rest():
+    async def check(service):
+        return await service.handle_batch({
+            "pairings": [{"id": "bad", "parent_a": {"Clown": 1.5}, "parent_b": {"Clown": 1}},
+                         {"id": "ok", "parent_a": {"Clown": 1}, "parent_b": {"Clown": 1}}],
+            "targets": ["Clown"], "top": 0,
+        })
+    bad, ok = _run(check)["results"]
+    assert bad["id"] == "bad" and "error" in bad and "probabilities" not in bad
+    assert ok["probabilities"]["perfect"] == 0.25 and "error" not in ok
+
+@pytest.mark.parametrize("top", [True, -1, 1.5, "3"])
+def test_invalid_top_is_rejected(top):
+    async def check(service):
+        with pytest.raises(RequestError):
+            await service.handle_pair({"parent_a": {}, "parent_b": {}, "top": top})
+    _run(check)
+
+def test_http_pair_bad_score_returns_400_and_keeps_connection():
+    responses = _run(lambda s: _http(s, _post("/pair", {"parent_a": {"Clown": 1.5}, "parent_b": {}})
+                                     + b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n"))
+    assert [status for status, _ in responses] == [400, 200]
+    assert responses[1][1] == {"status": "ok"}
+
+@pytest.mark.parametrize("data", [
+    b"GARBAGE\r\n\r\n",
+    b"POST /pair HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+    b"POST /pair HTTP/1.1\r\nContent-Length: %d\r\n\r\n{}" % (MAX_BODY_BYTES + 1),
+])
+def test_http_unreadable_request_returns_400_and_closes(data):
+    # 连接关闭后, 后面拼接的请求不会被当作新请求解析
+    responses = _run(lambda s: _http(s, data + b"GET /health HTTP/1.1\r\n\r\n"))
+    assert [status for status, _ in responses] == [400]